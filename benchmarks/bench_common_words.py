@@ -0,0 +1,87 @@
+import random
+import sys
+
+sys.path.insert(0, '../src')
+import common
+import vocabulary
+
+
+EMAIL_SIZES = [1000, 10000, 100000]
+# Words which aren't common, so a realistic share of tokens survives the filter
+RARE_WORDS = ["robotics", "scheduling", "asynchronous", "caster", "combinatorial", "inventory", "seminar",
+              "ontology", "lemma", "hyponym", "wean", "cimds", "gsia", "steel", "mills"]
+
+
+def synthetic_tokens(count, seed=0):
+    """
+    Generates the tokens of a synthetic email, mostly common words with some rarer ones mixed in.
+    :param count: How many tokens to generate.
+    :param seed: The random seed, so every run filters the same tokens.
+    :return: A list of tokens.
+    """
+    generator = random.Random(seed)
+    common_words = sorted(vocabulary.get_common_words())
+    return [generator.choice(common_words) if generator.random() < 0.7 else generator.choice(RARE_WORDS)
+            for _ in range(count)]
+
+
+def filter_before(tokens, stopwords):
+    """
+    The filtering as it used to be: the common words file re-read for every email (into a list of single
+    characters), and a list scanned for every token.
+    """
+    common_words = []
+    with open(vocabulary.COMMON_WORDS_PATH, "r") as words_file:
+        for line in words_file.read():
+            common_words.append(line)
+    tokens_stopwords_removed = [token for token in tokens if token not in stopwords]
+    return [i for i in tokens_stopwords_removed if i not in common_words]
+
+
+def filter_before_fixed(tokens, stopwords):
+    """
+    The old filtering with just the bug fixed: the file read into a list of words for every email, and a list
+    scanned for every token.
+    """
+    with open(vocabulary.COMMON_WORDS_PATH, "r") as words_file:
+        common_words = [line.strip().lower() for line in words_file if line.strip()]
+    tokens_stopwords_removed = [token for token in tokens if token not in stopwords]
+    return [i for i in tokens_stopwords_removed if i not in common_words]
+
+
+def filter_after(tokens, filter_words):
+    """
+    The filtering now: one set lookup per token against the shared stopword and common word set.
+    """
+    return [token for token in tokens if token not in filter_words]
+
+
+def main(argv=None):
+    """
+    Reports the per-email cost of stopword and common word filtering, before and after the vocabulary service.
+    :param argv: The command line arguments, defaults to sys.argv.
+    """
+    parser = common.argument_parser("Time common word filtering on synthetic emails.",
+                                    "minimum seconds to time each filter for")
+    parser.add_argument("--sizes", type=int, nargs="+", default=EMAIL_SIZES, help="email sizes in tokens")
+    args = parser.parse_args(argv)
+
+    try:
+        stopwords = vocabulary.get_stopwords()
+        filter_words = vocabulary.get_filter_words()
+    except LookupError:
+        print("NLTK stopwords aren't installed, only timing the common words", file=sys.stderr)
+        stopwords = frozenset()
+        filter_words = vocabulary.get_common_words()
+
+    for size in args.sizes:
+        tokens = synthetic_tokens(size)
+        before = common.time_call(lambda: filter_before(tokens, stopwords), args.min_time)
+        before_fixed = common.time_call(lambda: filter_before_fixed(tokens, stopwords), args.min_time)
+        after = common.time_call(lambda: filter_after(tokens, filter_words), args.min_time)
+        print(f'{size} tokens: before {before * 1000:.3f} ms, before (bug fixed) {before_fixed * 1000:.3f} ms, '
+              f'after {after * 1000:.3f} ms per email')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
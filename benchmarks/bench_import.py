@@ -0,0 +1,54 @@
+import argparse
+import statistics
+import subprocess
+import sys
+
+
+SOURCE_PATH = '../src'
+MODULES = ["information_extraction", "ontology_tagging", "tag_emails"]
+
+
+def time_import(module, repeats):
+    """
+    Times importing a module in a fresh interpreter, so nothing is already loaded.
+    :param module: The module to import.
+    :param repeats: How many interpreters to time.
+    :return: A list of import times in seconds.
+    """
+    # Time inside the child so interpreter start up isn't counted
+    code = f'import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)'
+    times = []
+    for _ in range(repeats):
+        output = subprocess.run([sys.executable, "-c", code], cwd=SOURCE_PATH, check=True, capture_output=True,
+                                text=True).stdout
+        times.append(float(output.strip().splitlines()[-1]))
+    return times
+
+
+def main(argv=None):
+    """
+    Reports how long importing each module takes.
+    :param argv: The command line arguments, defaults to sys.argv.
+    :return: The exit code, non-zero if any import went over the budget.
+    """
+    parser = argparse.ArgumentParser(description="Time importing the pipeline modules.")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="the modules to import")
+    parser.add_argument("--repeats", type=int, default=5, help="how many fresh interpreters to time")
+    parser.add_argument("--budget-s", type=float, default=None,
+                        help="fail if the median import time of any module is longer than this")
+    args = parser.parse_args(argv)
+
+    over_budget = False
+    for module in args.modules:
+        times = time_import(module, args.repeats)
+        median = statistics.median(times)
+        print(f'{module}: median {median * 1000:.1f} ms, min {min(times) * 1000:.1f} ms over {len(times)} imports')
+        if args.budget_s is not None and median > args.budget_s:
+            print(f'{module} took {median:.3f} s to import, over the {args.budget_s} s budget', file=sys.stderr)
+            over_budget = True
+
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
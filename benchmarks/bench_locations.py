@@ -0,0 +1,68 @@
+import random
+import sys
+import time
+
+sys.path.insert(0, '../src')
+import common
+import gazetteer
+import synthetic_emails
+import tag_markup
+
+
+LOCATION_COUNTS = [10, 100, 1000, 10000]
+
+
+def synthetic_locations(count, seed=0):
+    """
+    Generates known locations in the style of the training set, e.g. "4623 WEAN HALL".
+    :param count: How many locations to generate.
+    :param seed: The random seed, so every run searches for the same locations.
+    :return: A list of distinct locations.
+    """
+    generator = random.Random(seed)
+    locations = set()
+    while len(locations) < count:
+        building = generator.choice(synthetic_emails.BUILDINGS)
+        locations.add(f'{generator.randint(1000, 8999)} {building}' if generator.random() < 0.8 else building)
+    return sorted(locations)
+
+
+def find_before(text, locations):
+    """
+    The search as it used to be: the text scanned once for every known location.
+    """
+    lower_text = text.lower()
+    return [location for location in locations if location.lower() in lower_text]
+
+
+def main(argv=None):
+    """
+    Reports the cost of looking up the known locations in an email, before and after using a LocationMatcher.
+    :param argv: The command line arguments, defaults to sys.argv.
+    """
+    parser = common.argument_parser("Time finding the known locations in synthetic emails.",
+                                    "minimum seconds to time each search for")
+    parser.add_argument("--counts", type=int, nargs="+", default=LOCATION_COUNTS, help="numbers of known locations")
+    parser.add_argument("--emails", type=int, default=20, help="how many emails to search")
+    parser.add_argument("--size", type=int, default=synthetic_emails.EMAIL_SIZE,
+                        help="the approximate size of each email in characters")
+    args = parser.parse_args(argv)
+
+    emails = [tag_markup.strip(email) for email in synthetic_emails.generate_emails(args.emails, args.size)]
+    for count in args.counts:
+        locations = synthetic_locations(count)
+        start = time.perf_counter()
+        matcher = gazetteer.LocationMatcher(locations)
+        matcher.find("")
+        build = time.perf_counter() - start
+
+        # Each call searches every email, so the time per email is a share of it
+        before = common.time_call(lambda: [find_before(email, locations) for email in emails],
+                                  args.min_time) / len(emails)
+        after = common.time_call(lambda: [matcher.find(email) for email in emails], args.min_time) / len(emails)
+        print(f'{count} locations: before {before * 1000:.3f} ms, matcher {after * 1000:.3f} ms per email '
+              f'(built in {build * 1000:.1f} ms)')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,97 @@
+from os.path import isfile, join
+from os import listdir
+import random
+import sys
+
+sys.path.insert(0, '../src')
+import common
+import patterns
+import tag_markup
+
+
+SAMPLE_PATHS = ['../test/untagged', '../training/tagged']
+SYNTHETIC_SIZE = 100 * 1024
+
+# Words seminar emails are made of, weighted towards the ones the relation patterns look for
+SYNTHETIC_WORDS = ["the", "seminar", "talk", "presentation", "will", "be", "is", "going", "to", "held", "in", "at",
+                   "on", "from", "university", "of", "present", "speak", "lecture", "are", "room", "pm", "am", "3",
+                   "Dr", "Smith", "The", "we", "have", "a", "new", "result", "about", "robots", "and", "learning"]
+
+
+def read_samples():
+    """
+    Reads the sample emails shipped with the repo, with any tags removed.
+    :return: A dictionary from file name to email text.
+    """
+    samples = {}
+    for path in SAMPLE_PATHS:
+        for file in sorted(f for f in listdir(path) if isfile(join(path, f))):
+            with open(join(path, file), "r") as sample_file:
+                samples[file] = tag_markup.strip(sample_file.read())
+    return samples
+
+
+def synthetic_thread(size, seed=0):
+    """
+    Generates a long forwarded thread: many short quoted lines full of the words the patterns look for.
+    :param size: The approximate size of the body in characters.
+    :param seed: The random seed, so every run times the same text.
+    :return: The body.
+    """
+    generator = random.Random(seed)
+    lines = []
+    length = 0
+    while length < size:
+        depth = generator.randint(0, 3)
+        line = "> " * depth + " ".join(generator.choice(SYNTHETIC_WORDS) for _ in range(generator.randint(5, 14)))
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines) + "\n"
+
+
+def synthetic_long_line(size, seed=0):
+    """
+    Generates a body without any line breaks, e.g. an HTML email which has been flattened to text.
+    :param size: The approximate size of the body in characters.
+    :param seed: The random seed, so every run times the same text.
+    :return: The body.
+    """
+    return synthetic_thread(size, seed).replace("\n", " ")
+
+
+def main(argv=None):
+    """
+    Reports the time each pattern takes on the sample emails and on synthetic large bodies.
+    :param argv: The command line arguments, defaults to sys.argv.
+    :return: The exit code, non-zero if any pattern went over the budget.
+    """
+    parser = common.argument_parser("Time the regular expressions in patterns.py which run over whole emails.",
+                                    "minimum seconds to time each pattern for")
+    parser.add_argument("--size", type=int, default=SYNTHETIC_SIZE, help="size of the synthetic bodies in characters")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="fail if any pattern takes longer than this per search on any input")
+    args = parser.parse_args(argv)
+
+    inputs = read_samples()
+    inputs["synthetic thread"] = synthetic_thread(args.size)
+    inputs["synthetic long line"] = synthetic_long_line(args.size)
+
+    over_budget = []
+    # The field patterns only ever see a single header field or token, so timing them on whole bodies means nothing
+    name_width = max(len(name) for name in patterns.BODY_PATTERNS)
+    for input_name, text in inputs.items():
+        print(f'{input_name} ({len(text)} characters)')
+        for pattern_name, pattern in patterns.BODY_PATTERNS.items():
+            milliseconds = common.time_call(lambda: pattern.search(text), args.min_time) * 1000
+            print(f'  {pattern_name:<{name_width}}  {milliseconds:10.3f} ms')
+            if args.budget_ms is not None and milliseconds > args.budget_ms:
+                over_budget.append((input_name, pattern_name, milliseconds))
+
+    for input_name, pattern_name, milliseconds in over_budget:
+        print(f'{pattern_name} took {milliseconds:.3f} ms on {input_name}, over the {args.budget_ms} ms budget',
+              file=sys.stderr)
+    return 1 if over_budget else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
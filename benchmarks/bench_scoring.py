@@ -0,0 +1,89 @@
+import random
+import sys
+
+sys.path.insert(0, '../src')
+import common
+import evaluate_information_extraction
+
+
+SPAN_COUNTS = [100, 1000, 5000]
+WORDS = ["the", "seminar", "will", "be", "held", "in", "wean", "hall", "at", "pm", "robotics", "institute", "talk",
+         "scheduling", "steel", "mills", "problem", "results", "research", "ibm", "summer", "framework", "."]
+
+
+def synthetic_spans(count, seed=0):
+    """
+    Generates the tokenized sentence spans of a long email, and a tagged version which gets most of them right.
+    :param count: How many spans to generate.
+    :param seed: The random seed, so every run scores the same spans.
+    :return: The predicted spans and the gold spans, as (start, end, tokens).
+    """
+    generator = random.Random(seed)
+    gold = []
+    predicted = []
+    position = 0
+    for _ in range(count):
+        tokens = [generator.choice(WORDS) for _ in range(generator.randint(5, 25))]
+        length = sum(len(token) for token in tokens)
+        gold.append((position, position + length, tokens))
+        if generator.random() < 0.8:
+            predicted.append((position, position + length, list(tokens)))
+        else:
+            # A sentence split in the wrong place
+            split = generator.randint(1, len(tokens))
+            predicted.append((position, position + sum(len(token) for token in tokens[:split]), tokens[:split]))
+        position += length
+    return predicted, gold
+
+
+def score_before(predicted, gold):
+    """
+    The scoring as it used to be: every span's tokens looked up in a list of the other version's.
+    """
+    predicted = [span[2] for span in predicted]
+    gold = [span[2] for span in gold]
+    false_positives = [i for i in predicted + gold if i not in gold]
+    false_negatives = [i for i in predicted + gold if i not in predicted]
+    return len(false_positives), len(false_negatives)
+
+
+def score_exact(predicted, gold):
+    """
+    The scoring now, in exact mode.
+    """
+    return (evaluate_information_extraction.count_unmatched(predicted, gold),
+            evaluate_information_extraction.count_unmatched(gold, predicted))
+
+
+def score_overlap(predicted, gold):
+    """
+    The scoring now, in overlap mode.
+    """
+    return (evaluate_information_extraction.count_unmatched(predicted, gold, "overlap"),
+            evaluate_information_extraction.count_unmatched(gold, predicted, "overlap"))
+
+
+def main(argv=None):
+    """
+    Reports the cost of scoring one tag of one email, before and after counting with hashed spans.
+    :param argv: The command line arguments, defaults to sys.argv.
+    """
+    parser = common.argument_parser("Time the span scoring in evaluate on synthetic spans.",
+                                    "minimum seconds to time each scorer for")
+    parser.add_argument("--counts", type=int, nargs="+", default=SPAN_COUNTS, help="numbers of spans per email")
+    args = parser.parse_args(argv)
+
+    for count in args.counts:
+        predicted, gold = synthetic_spans(count)
+        if score_before(predicted, gold) != score_exact(predicted, gold):
+            print(f'{count} spans: exact mode disagrees with the old scoring', file=sys.stderr)
+            return 1
+        before = common.time_call(lambda: score_before(predicted, gold), args.min_time)
+        exact = common.time_call(lambda: score_exact(predicted, gold), args.min_time)
+        overlap = common.time_call(lambda: score_overlap(predicted, gold), args.min_time)
+        print(f'{count} spans: before {before * 1000:.3f} ms, exact {exact * 1000:.3f} ms, '
+              f'overlap {overlap * 1000:.3f} ms')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
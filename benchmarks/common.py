@@ -0,0 +1,35 @@
+import argparse
+import time
+
+
+# The minimum seconds each measurement is repeated for, unless --min-time says otherwise
+MIN_TIME = 0.2
+
+
+def time_call(function, min_time=MIN_TIME):
+    """
+    Times a function, calling it repeatedly until at least min_time seconds have passed.
+    :param function: The function to time, called without arguments.
+    :param min_time: The minimum total time to measure for.
+    :return: The mean time per call in seconds.
+    """
+    repeats = 0
+    start = time.perf_counter()
+    elapsed = 0
+    while elapsed < min_time or repeats == 0:
+        function()
+        repeats += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / repeats
+
+
+def argument_parser(description, min_time_help="minimum seconds to time each measurement for"):
+    """
+    Makes the command line parser of a benchmark, with the --min-time option they all share.
+    :param description: What the benchmark times.
+    :param min_time_help: The help of the --min-time option.
+    :return: The parser, to add the benchmark's own options to.
+    """
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--min-time", type=float, default=MIN_TIME, help=min_time_help)
+    return parser
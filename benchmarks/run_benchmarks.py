@@ -0,0 +1,323 @@
+from os.path import join
+import json
+import os
+import platform
+import statistics
+import sys
+
+sys.path.insert(0, '../src')
+import common
+import synthetic_emails
+import evaluate_information_extraction
+import gazetteer
+import information_extraction
+import ontology_tagging
+import tag_markup
+import wiki_cache
+import word_vectors
+
+
+# A plain script like the other benchmarks, rather than pytest-benchmark or asv, as the repo declares no dependencies
+# to add them to and the benchmarks have to run wherever the pipeline itself does. The baselines play the part of
+# pytest-benchmark's saved runs, recording the corpus, the Python version and the machine they were measured on.
+BASELINES_PATH = 'baselines'
+# How much slower than its baseline a benchmark may get before it counts as a regression
+DEFAULT_TOLERANCE = 0.2
+
+_benchmarks = {}
+
+
+class Skip(Exception):
+    """
+    Raised by a benchmark's setup when it can't run here, e.g. because a resource hasn't been downloaded.
+    """
+
+
+def benchmark(function):
+    """
+    Registers a benchmark. The function sets the benchmark up, and returns the function to time, which processes the
+    whole corpus once.
+    """
+    _benchmarks[function.__name__] = function
+    return function
+
+
+class Corpus:
+    """
+    The synthetic emails, and what each stage of the pipeline needs as input, worked out once for every benchmark.
+    """
+
+    def __init__(self, count, size, seed):
+        self.tagged = synthetic_emails.generate_emails(count, size, seed)
+        self.untagged = [tag_markup.strip(email) for email in self.tagged]
+        self._model = None
+        self._parts = None
+        self._bodies = None
+        self._my_tagged = None
+
+    @property
+    def model(self):
+        """
+        :return: The model trained on the training set.
+        """
+        if self._model is None:
+            self._model = information_extraction.get_default_model()
+        return self._model
+
+    @property
+    def parts(self):
+        """
+        :return: The header and body of each email.
+        """
+        if self._parts is None:
+            self._parts = [information_extraction.format_file(email) for email in self.untagged]
+        return self._parts
+
+    @property
+    def bodies(self):
+        """
+        :return: For each email, the body with the sentences and paragraphs tagged, and the strings to tag in it.
+        """
+        if self._bodies is None:
+            self._bodies = []
+            for email in self.untagged:
+                header, body = information_extraction.format_file(email)
+                tags, locations = information_extraction.check_header(header, set(), set())
+                tags, locations = information_extraction.rel_extract(body, tags, locations)
+                segmented = information_extraction.detokenize(information_extraction.tag_sents_and_paras(
+                    body, self.model.sentence_length_lower_bound, self.model.sentence_length_upper_bound))
+                self._bodies.append((segmented, tags))
+        return self._bodies
+
+    @property
+    def my_tagged(self):
+        """
+        :return: The emails as the pipeline tags them.
+        """
+        if self._my_tagged is None:
+            self._my_tagged = [self.model.tag(email) for email in self.untagged]
+        return self._my_tagged
+
+
+@benchmark
+def tag_email(corpus):
+    """
+    Tags each whole email.
+    """
+    model = corpus.model
+    emails = corpus.untagged
+    return lambda: [information_extraction.tag_email(email, model) for email in emails]
+
+
+@benchmark
+def tag_body(corpus):
+    """
+    Inserts the tags into each segmented body.
+    """
+    bodies = corpus.bodies
+    return lambda: [information_extraction.tag_body(body, tags) for body, tags in bodies]
+
+
+@benchmark
+def tag_sents_and_paras(corpus):
+    """
+    Splits each body into tagged sentences and paragraphs.
+    """
+    model = corpus.model
+    bodies = [information_extraction.format_file(email)[1] for email in corpus.untagged]
+    return lambda: [information_extraction.tag_sents_and_paras(body, model.sentence_length_lower_bound,
+                                                               model.sentence_length_upper_bound) for body in bodies]
+
+
+@benchmark
+def check_header(corpus):
+    """
+    Splits each email into its header and body, and reads the tags out of the header fields.
+    """
+    emails = corpus.untagged
+
+    def run():
+        for email in emails:
+            header, body = information_extraction.format_file(email)
+            information_extraction.check_header(header, set(), set())
+    return run
+
+
+@benchmark
+def rel_extract(corpus):
+    """
+    Runs relation extraction over each body.
+    """
+    bodies = [body for _, body in corpus.parts]
+    return lambda: [information_extraction.rel_extract(body, set(), set()) for body in bodies]
+
+
+@benchmark
+def find_locations(corpus):
+    """
+    Looks up every location found in the headers in each body.
+    """
+    locations = set()
+    for header, _ in corpus.parts:
+        locations = information_extraction.check_header(header, set(), locations)[1]
+    matcher = gazetteer.LocationMatcher(sorted(locations))
+    bodies = [body for _, body in corpus.parts]
+    return lambda: [information_extraction.find_locations(body, set(), matcher) for body in bodies]
+
+
+@benchmark
+def evaluate(corpus):
+    """
+    Scores each tagged email against the generated tags.
+    """
+    pairs = list(zip(corpus.my_tagged, corpus.tagged))
+
+    def run():
+        scores = [{tag: 0 for tag in evaluate_information_extraction.TAGS} for _ in range(3)]
+        for my_tagged, test_tagged in pairs:
+            evaluate_information_extraction.evaluate(my_tagged, test_tagged, *scores)
+        return scores
+    return run
+
+
+@benchmark
+def classify_email(corpus):
+    """
+    Classifies each email against the extended ontology tree.
+    """
+    if word_vectors.WordVectors.load() is None:
+        raise Skip("the word vectors haven't been converted, run word_vectors.py first")
+    try:
+        tree = ontology_tagging.load_extended_tree()
+    except LookupError:
+        raise Skip("the WordNet corpus isn't installed")
+    emails = corpus.untagged
+    return lambda: [ontology_tagging.classify_email(email, tree) for email in emails]
+
+
+def time_benchmark(function, rounds, min_time):
+    """
+    Times a benchmark over several rounds, each repeating the function until at least min_time seconds have passed.
+    :param function: The function to time.
+    :param rounds: How many rounds to time.
+    :param min_time: The minimum seconds per round.
+    :return: The mean seconds per call in each round.
+    """
+    # Once untimed, so nothing loaded lazily is counted
+    function()
+    return [common.time_call(function, min_time) for _ in range(rounds)]
+
+
+def run_benchmarks(names, count, size, seed, rounds, min_time):
+    """
+    Runs the benchmarks on a synthetic corpus.
+    :param names: The benchmarks to run.
+    :param count: How many emails to generate.
+    :param size: The approximate size of each email in characters.
+    :param seed: The random seed of the corpus.
+    :param rounds: How many rounds to time each benchmark for.
+    :param min_time: The minimum seconds per round.
+    :return: The results, with the corpus parameters and the per email times of each benchmark.
+    """
+    corpus = Corpus(count, size, seed)
+    results = {}
+    for name in names:
+        try:
+            function = _benchmarks[name](corpus)
+            times = [seconds / count for seconds in time_benchmark(function, rounds, min_time)]
+        except Skip as reason:
+            print(f'{name}: skipped, {reason}', file=sys.stderr)
+            continue
+        except LookupError:
+            print(f"{name}: skipped, the NLTK data it needs isn't installed", file=sys.stderr)
+            continue
+        results[name] = {"median_seconds": statistics.median(times), "min_seconds": min(times), "rounds": times}
+        print(f'{name}: median {results[name]["median_seconds"] * 1000:.3f} ms per email, '
+              f'min {results[name]["min_seconds"] * 1000:.3f} ms')
+    return {
+        "corpus": {"count": count, "size": size, "seed": seed},
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "benchmarks": results
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compares the median times against a baseline.
+    :param results: The results from run_benchmarks.
+    :param baseline: The results saved as the baseline.
+    :param tolerance: How much slower, as a fraction, a benchmark may be before it counts as a regression.
+    :return: The names of the benchmarks which regressed.
+    """
+    for key, what in (("python", "Python version"), ("machine", "machine")):
+        if baseline.get(key) != results[key]:
+            print(f'The baseline was measured on a different {what}, {baseline.get(key)} rather than {results[key]}, '
+                  f'so the times may not be comparable', file=sys.stderr)
+
+    regressed = []
+    for name, stats in results["benchmarks"].items():
+        if name not in baseline["benchmarks"]:
+            print(f'{name}: not in the baseline')
+            continue
+        ratio = stats["median_seconds"] / baseline["benchmarks"][name]["median_seconds"]
+        verdict = "ok"
+        if ratio > 1 + tolerance:
+            verdict = "REGRESSED"
+            regressed.append(name)
+        elif ratio < 1 / (1 + tolerance):
+            verdict = "improved"
+        print(f'{name}: {ratio:.2f}x the baseline, {verdict}')
+    return regressed
+
+
+def main(argv=None):
+    """
+    Runs the benchmarks, and saves the results as a baseline or compares them against one.
+    :param argv: The command line arguments, defaults to sys.argv.
+    :return: The exit code, non-zero if any benchmark regressed.
+    """
+    parser = common.argument_parser("Benchmark the pipeline on synthetic seminar emails.", "minimum seconds per round")
+    parser.add_argument("benchmarks", nargs="*", default=list(_benchmarks), help="the benchmarks to run (default: "
+                                                                                 "all of them)")
+    parser.add_argument("--count", type=int, default=synthetic_emails.EMAIL_COUNT, help="how many emails to generate")
+    parser.add_argument("--size", type=int, default=synthetic_emails.EMAIL_SIZE,
+                        help="the approximate size of each email in characters")
+    parser.add_argument("--seed", type=int, default=0, help="the random seed of the corpus")
+    parser.add_argument("--rounds", type=int, default=5, help="how many rounds to time each benchmark for")
+    parser.add_argument("--save", metavar="NAME", default=None, help="save the results as baselines/NAME.json")
+    parser.add_argument("--compare", metavar="NAME", default=None,
+                        help="compare the results against baselines/NAME.json")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="how much slower, as a fraction, a benchmark may be than its baseline")
+    args = parser.parse_args(argv)
+
+    unknown = [name for name in args.benchmarks if name not in _benchmarks]
+    if unknown:
+        parser.error(f'unknown benchmarks {unknown}, expected some of {list(_benchmarks)}')
+
+    baseline = None
+    if args.compare is not None:
+        with open(join(BASELINES_PATH, args.compare + ".json"), "r") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    # Network round trips aren't reproducible, so Wikipedia is only answered from the cache
+    wiki_cache.set_offline(True)
+    results = run_benchmarks(args.benchmarks, args.count, args.size, args.seed, args.rounds, args.min_time)
+
+    if args.save is not None:
+        os.makedirs(BASELINES_PATH, exist_ok=True)
+        with open(join(BASELINES_PATH, args.save + ".json"), "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+
+    if baseline is not None:
+        if baseline["corpus"] != results["corpus"]:
+            print(f'The baseline was measured on a different corpus: {baseline["corpus"]}', file=sys.stderr)
+            return 1
+        if compare(results, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,165 @@
+from os.path import join
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, '../src')
+import tag_markup
+
+
+EMAIL_COUNT = 50
+# The approximate size of each email in characters
+EMAIL_SIZE = 3000
+
+FIRST_NAMES = ["Ramesh", "Michelle", "Norman", "Joyce", "Takeo", "Manuela", "Herbert", "Raj", "Katia", "Tom"]
+LAST_NAMES = ["Bollapragada", "Agie", "Sadeh", "Kanade", "Veloso", "Simon", "Reddy", "Sycara", "Mitchell", "Moore"]
+DEPARTMENTS = ["GSIA/Robotics Program", "Robotics Institute", "School of Computer Science", "CIMDS",
+               "Department of Mathematics", "Department of Psychology"]
+TITLES = ["Graduate student", "Professor", "Associate Professor", "Research Scientist", "Visiting Researcher"]
+TYPES = ["cmu.cs.robotics", "cmu.cs.scs", "cmu.andrew.academic.math", "cmu.cs.proj.mt"]
+BUILDINGS = ["WEAN HALL", "Doherty Hall", "Baker Hall", "Hamerschlag Hall", "Porter Hall", "Newell Simon Hall"]
+TOPIC_WORDS = ["asynchronous", "team", "solutions", "scheduling", "steel", "plants", "learning", "robots",
+               "planning", "uncertainty", "vision", "translation", "constraint", "search", "markets", "agents"]
+FILLER_WORDS = ["the", "problem", "of", "direct", "hot", "charge", "scheduling", "rolling", "mills", "in", "primary",
+                "area", "work", "involved", "a", "huge", "order", "book", "with", "objective", "minimizing",
+                "operating", "costs", "and", "inventory", "this", "is", "combinatorial", "due", "to", "complex",
+                "constraints", "we", "proposed", "an", "approach", "for", "domain", "results", "show", "significant",
+                "improvements", "evaluation", "framework", "research", "was", "carried", "out", "summer"]
+DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"]
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+
+def random_time(generator):
+    """
+    :param generator: The random number generator.
+    :return: A start time as the headers write it, e.g. "3:30 PM", and the hour it is in.
+    """
+    hour = generator.randint(9, 17)
+    minutes = generator.choice(["00", "15", "30", "45"])
+    return f'{(hour - 1) % 12 + 1}:{minutes} {"PM" if hour >= 12 else "AM"}', hour
+
+
+def filler_sentence(generator):
+    """
+    :param generator: The random number generator.
+    :return: A sentence without its final full stop, which none of the patterns match.
+    """
+    words = [generator.choice(FILLER_WORDS) for _ in range(generator.randint(8, 25))]
+    return " ".join(words).capitalize()
+
+
+def tagged_paragraph(sentences):
+    """
+    Tags a paragraph the way the tagged emails do: each sentence without its full stop, which follows the closing
+    tag.
+    :param sentences: The sentences, without their full stops.
+    :return: The tagged paragraph.
+    """
+    return "<paragraph>" + " ".join(f'<sentence>{sentence}</sentence>.' for sentence in sentences) + "</paragraph>"
+
+
+def synthetic_email(generator, size=EMAIL_SIZE):
+    """
+    Generates a tagged seminar announcement, with the header fields check_header reads and the sentences rel_extract
+    looks for in the body, padded with filler paragraphs.
+    :param generator: The random number generator.
+    :param size: The approximate size of the email in characters.
+    :return: The tagged email.
+    """
+    first_name = generator.choice(FIRST_NAMES)
+    last_name = generator.choice(LAST_NAMES)
+    speaker = f'{first_name} {last_name}'
+    poster = f'{generator.choice(FIRST_NAMES)} {generator.choice(LAST_NAMES)}'
+    room = f'{generator.randint(1000, 8999)} {generator.choice(BUILDINGS)}'
+    start_time, hour = random_time(generator)
+    end_time = f'{hour % 12 + 1}:00 {"PM" if hour + 1 >= 12 else "AM"}'
+    topic = " ".join(generator.choice(TOPIC_WORDS) for _ in range(generator.randint(3, 7)))
+    day = generator.randint(1, 28)
+    month = generator.choice(MONTHS)
+    weekday = generator.choice(DAYS)
+
+    if generator.random() < 0.5:
+        time_field = f'<stime>{start_time}</stime> - <etime>{end_time}</etime>'
+    else:
+        time_field = f'<stime>{start_time}</stime>'
+    header = "\n".join([
+        f'<0.{generator.randint(1, 30)}.{day}.94.{generator.randint(10, 23)}.{generator.randint(10, 59)}.'
+        f'{generator.randint(10, 59)}.maa+@ISL1.RI.CMU.EDU ({poster})>',
+        f'Type:     {generator.choice(TYPES)}',
+        f'Who:      <speaker>{speaker}</speaker>, {generator.choice(TITLES)}, {generator.choice(DEPARTMENTS)}',
+        f'Topic:    {topic.upper()}',
+        f'Dates:    {day}-{month}-94',
+        f'Time:     {time_field}',
+        f'Place:    <location>{room}</location>',
+        f'Host:     {poster}, {generator.choice(DEPARTMENTS)}',
+        f'PostedBy: maa+ on {day}-{month}-94 at {generator.randint(10, 23)}:{generator.randint(10, 59)} from '
+        f'ISL1.RI.CMU.EDU ({poster})',
+        "Abstract: "
+    ])
+
+    paragraphs = [
+        tagged_paragraph([
+            f'<speaker>{speaker}</speaker> will present on {topic}',
+            f'The seminar will be held in <location>{room}</location> at <stime>{start_time.lower()}</stime> '
+            f'on {weekday}'
+        ])
+    ]
+    length = len(header) + len(paragraphs[0])
+    while length < size:
+        paragraph = tagged_paragraph([filler_sentence(generator) for _ in range(generator.randint(2, 5))])
+        paragraphs.append(paragraph)
+        length += len(paragraph) + 2
+    # The announcement sentences somewhere among the filler, rather than always first
+    generator.shuffle(paragraphs)
+
+    return header + "\n\n" + "\n\n".join(paragraphs) + "\n\n-- \n"
+
+
+def generate_emails(count=EMAIL_COUNT, size=EMAIL_SIZE, seed=0):
+    """
+    Generates a corpus of tagged emails. The same arguments always give the same emails.
+    :param count: How many emails to generate.
+    :param size: The approximate size of each email in characters.
+    :param seed: The random seed.
+    :return: A list of the tagged emails.
+    """
+    generator = random.Random(seed)
+    return [synthetic_email(generator, size) for _ in range(count)]
+
+
+def write_emails(emails, output_path):
+    """
+    Writes the emails the way the test set is laid out, tagged and untagged.
+    :param emails: The tagged emails.
+    :param output_path: The directory to write the tagged and untagged directories to.
+    """
+    for directory in ("tagged", "untagged"):
+        os.makedirs(join(output_path, directory), exist_ok=True)
+    for index, email in enumerate(emails):
+        file_name = f'synthetic_{index:05d}.txt'
+        with open(join(output_path, "tagged", file_name), "w") as tagged_file:
+            tagged_file.write(email)
+        with open(join(output_path, "untagged", file_name), "w") as untagged_file:
+            untagged_file.write(tag_markup.strip(email))
+
+
+def main(argv=None):
+    """
+    Writes a synthetic corpus, e.g. to evaluate on with evaluate_information_extraction.py --test-path.
+    :param argv: The command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Generate synthetic tagged seminar emails.")
+    parser.add_argument("output", help="the directory to write the tagged and untagged emails to")
+    parser.add_argument("--count", type=int, default=EMAIL_COUNT, help="how many emails to generate")
+    parser.add_argument("--size", type=int, default=EMAIL_SIZE, help="the approximate size of each email in "
+                                                                     "characters")
+    parser.add_argument("--seed", type=int, default=0, help="the random seed")
+    args = parser.parse_args(argv)
+
+    write_emails(generate_emails(args.count, args.size, args.seed), args.output)
+    print(f'Wrote {args.count} emails to {args.output}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
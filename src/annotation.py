@@ -0,0 +1,81 @@
+import re
+
+
+def build_matcher(strings):
+    """
+    Compiles a single regex which matches any of the strings.
+    Longer strings are tried first, so at any position the longest string wins.
+    :param strings: The strings to search for.
+    :return: The compiled regex, or None if there is nothing to search for.
+    """
+    strings = sorted(set(strings), key=lambda string: (-len(string), string))
+    if not strings:
+        return None
+    return re.compile("|".join(re.escape(string) for string in strings))
+
+
+def find_spans(text, tags, single_line=False, protected=()):
+    """
+    Finds every occurrence of every tagged string in a single pass over the text.
+    Overlaps are resolved deterministically: the leftmost match wins, and of the matches starting at the same
+    position the longest wins. A string with several tags gets all of them, in alphabetical order.
+    :param text: The text to search.
+    :param tags: The strings and their associated tags to search for. E.g. [('dave', 'speaker')]
+    :param single_line: Whether matches must not cross a line break.
+    :param protected: Sorted, non-overlapping (start, end) ranges which matches must not overlap, e.g. existing markup.
+    :return: A sorted list of non-overlapping (start, end, tag names) spans.
+    """
+    tags_by_string = {}
+    for tag_string, tag_tag in tags:
+        # An empty string would match between every pair of characters
+        if not tag_string or (single_line and "\n" in tag_string):
+            continue
+        tags_by_string.setdefault(tag_string, set()).add(tag_tag)
+
+    matcher = build_matcher(tags_by_string)
+    if matcher is None:
+        return []
+
+    spans = []
+    protected_index = 0
+    for match in matcher.finditer(text):
+        start, end = match.span()
+        # Both the matches and the protected ranges are in order, so a single cursor walks the protected ranges
+        while protected_index < len(protected) and protected[protected_index][1] <= start:
+            protected_index += 1
+        if protected_index < len(protected) and protected[protected_index][0] < end:
+            continue
+        spans.append((start, end, tuple(sorted(tags_by_string[match.group()]))))
+
+    return spans
+
+
+def render(text, spans):
+    """
+    Inserts the tags into the text in one join.
+    :param text: The text to tag.
+    :param spans: Sorted, non-overlapping (start, end, tag names) spans, as returned by find_spans.
+    :return: The tagged text.
+    """
+    pieces = []
+    position = 0
+    for start, end, tag_names in spans:
+        pieces.append(text[position:start])
+        pieces.extend(f'<{tag_name}>' for tag_name in tag_names)
+        pieces.append(text[start:end])
+        pieces.extend(f'</{tag_name}>' for tag_name in reversed(tag_names))
+        position = end
+    pieces.append(text[position:])
+    return "".join(pieces)
+
+
+def annotate(text, tags, single_line=False, protected=()):
+    """
+    Tags every occurrence of the tagged strings in the text.
+    :param text: The text to tag.
+    :param tags: The strings and their associated tags to search for.
+    :param single_line: Whether matches must not cross a line break.
+    :param protected: Sorted, non-overlapping (start, end) ranges which must not be tagged inside.
+    :return: The tagged text.
+    """
+    return render(text, find_spans(text, tags, single_line, protected))
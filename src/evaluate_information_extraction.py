@@ -1,12 +1,27 @@
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 from os import listdir
 from os.path import isfile, join
 from nltk import word_tokenize
-import information_extraction
-import re
+import argparse
+import json
 import os
+import re
+import sys
+import time
+import information_extraction
+import instrumentation
+import manifest
+import ner_backend
+import tag_markup
 
 TEST_TAGGED_PATH = '../test/tagged'
 FILE_OUTPUT_PATH = '../tagged/'
+REPORT_PATH = '../evaluation_report.json'
+# The tokenized gold spans of each test email, keyed by the hash of the email
+GOLD_SPANS_CACHE_PATH = '../cache/gold_spans'
+# Bump whenever the layout of the cached spans changes
+GOLD_SPANS_FORMAT_VERSION = 1
 
 TAGS = ["<stime>", "<etime>", "<location>", "<speaker>", "<sentence>", "<paragraph>"]
 STIME_TAG = "<stime>"
@@ -16,8 +31,24 @@ SPEAKER_TAG = "<speaker>"
 PARAGRAPH_TAG = "<paragraph>"
 SENTENCE_TAG = "<sentence>"
 
-TEST_FILES = [f for f in listdir(TEST_TAGGED_PATH) if isfile(join(TEST_TAGGED_PATH, f))]
-NUM_FILES = len(TEST_FILES)
+# exact: a span must have exactly the same tokens as a span in the other version to match it.
+# overlap: a span also matches any span in the other version which overlaps it in the text.
+MATCH_MODES = ["exact", "overlap"]
+
+# Matches everything between each tag and its closing tag, e.g. <etime>...</etime>
+TAG_REGEXES = {tag: re.compile(rf'({tag})([\s\S]*?)({tag[0] + "/" + tag[1:]})') for tag in TAGS}
+
+# The model each worker process loads once, and then uses for every email it is given
+_worker_model = None
+
+
+def list_test_files(test_path=TEST_TAGGED_PATH):
+    """
+    Lists the manually tagged test emails.
+    :param test_path: The directory of tagged test emails.
+    :return: A sorted list of the test file names.
+    """
+    return sorted(f for f in listdir(test_path) if isfile(join(test_path, f)))
 
 
 def remove_tags(text):
@@ -26,24 +57,17 @@ def remove_tags(text):
     :param text: The tagged text.
     :return: The plain text.
     """
-    for tag in TAGS:
-        text = re.sub(tag, "", text)
-        '''
-        Also need to remove the closing tags.
-        E.g.   <  /  etime>
-               0     1:
-        '''
-        text = re.sub(tag[0] + "/" + tag[1:], "", text)
-    return text
+    return tag_markup.strip(text)
 
 
-def write_to_file(text, file_name):
+def write_to_file(text, file_name, output_path=FILE_OUTPUT_PATH):
     """
     Writes text to a file.
     :param text: The text to be written.
     :param file_name: The file to be written to.
+    :param output_path: The directory to write the file in.
     """
-    file = open(FILE_OUTPUT_PATH + file_name, "w")
+    file = open(join(output_path, file_name), "w")
     file.write(text)
     file.close()
 
@@ -100,7 +124,123 @@ def calculate_f_measure(precision, recall):
     return f_measure
 
 
-def evaluate(my_tagged, test_tagged, tags_precision, tags_recall, tags_f_measure):
+def count_visible(text):
+    """
+    Positions are counted in characters other than whitespace, which the program and the test dataset agree on
+    even where they lay the text out differently.
+    :param text: A plain text.
+    :return: The number of visible characters in the text.
+    """
+    return len("".join(text.split()))
+
+
+def tokenize_spans(tagged):
+    """
+    Pulls out the text inside each kind of tag, and tokenizes it.
+    :param tagged: A tagged email.
+    :return: A dictionary from each tag to a list of the (start, end, tokens) of the text it was around, where
+    start and end are positions in visible characters of the plain text, see count_visible.
+    """
+    plain, offsets = tag_markup.strip_with_offsets(tagged)
+    spans = {}
+    for tag in TAGS:
+        tag_spans = []
+        position = 0
+        counted = 0
+        for match in TAG_REGEXES[tag].finditer(tagged):
+            start = offsets.to_plain(match.start(2))
+            end = offsets.to_plain(match.end(2))
+            # Only count the text since the previous span, so the plain text is only counted once per tag
+            position += count_visible(plain[counted:start])
+            counted = start
+            text = plain[start:end]
+            tag_spans.append((position, position + count_visible(text), word_tokenize(text)))
+        spans[tag] = tag_spans
+    return spans
+
+
+def load_gold_spans(test_tagged, cache_path=GOLD_SPANS_CACHE_PATH):
+    """
+    Tokenizes the spans of a manually tagged email, or loads them if the email has been tokenized before.
+    :param test_tagged: The tagged email from the test dataset.
+    :param cache_path: The directory the tokenized spans are cached in.
+    :return: The tokenized spans, as returned by tokenize_spans.
+    """
+    spans_path = join(cache_path, f'{manifest.hash_text(test_tagged)}.v{GOLD_SPANS_FORMAT_VERSION}.json')
+    try:
+        with open(spans_path, "r") as spans_file:
+            return json.load(spans_file)
+    except (OSError, ValueError):
+        pass
+
+    spans = tokenize_spans(test_tagged)
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        temp_path = f'{spans_path}.{os.getpid()}.tmp'
+        with open(temp_path, "w") as spans_file:
+            json.dump(spans, spans_file)
+        os.replace(temp_path, spans_path)
+    except OSError:
+        # Not being able to cache just means tokenizing again next time
+        pass
+    return spans
+
+
+def count_unmatched(spans, other_spans, mode="exact"):
+    """
+    Counts the spans which don't match any span in the other version.
+    Spans are hashed by their tokens, so each span is looked up in a set rather than compared against every span
+    in the other version.
+    :param spans: The (start, end, tokens) of the spans to count.
+    :param other_spans: The (start, end, tokens) of the spans in the other version.
+    :param mode: How spans are matched, one of MATCH_MODES.
+    :return: The number of spans without a match, counting repeated spans each time.
+    """
+    other_tokens = set(tuple(span[2]) for span in other_spans)
+    unmatched = [span for span in spans if tuple(span[2]) not in other_tokens]
+    if mode == "exact" or not unmatched:
+        return len(unmatched)
+
+    # Sort the other spans by where they start, and keep the furthest any of them reaches so far. A span overlaps
+    # one of them if, of those which start before it ends, one ends after it starts.
+    other_positions = sorted((span[0], span[1]) for span in other_spans)
+    starts = [start for start, end in other_positions]
+    furthest_ends = []
+    furthest_end = 0
+    for start, end in other_positions:
+        furthest_end = max(furthest_end, end)
+        furthest_ends.append(furthest_end)
+
+    count = 0
+    for start, end, tokens in unmatched:
+        starting_before_end = bisect_left(starts, end)
+        if starting_before_end == 0 or furthest_ends[starting_before_end - 1] <= start:
+            count += 1
+    return count
+
+
+def score_tag(my_spans, test_spans, mode="exact"):
+    """
+    Scores the spans of one tag against the test dataset.
+    :param my_spans: The (start, end, tokens) of the spans tagged by information_extraction.py.
+    :param test_spans: The (start, end, tokens) of the spans in the test dataset.
+    :param mode: How spans are matched, one of MATCH_MODES.
+    :return: The precision, recall and f-measure of the tag.
+    """
+    # things I tagged which shouldn't be tagged
+    num_false_positives = count_unmatched(my_spans, test_spans, mode)
+    # things I haven't tagged which should be tagged
+    num_false_negatives = count_unmatched(test_spans, my_spans, mode)
+    num_tags = len(my_spans)
+
+    precision = calculate_precision(num_false_positives, num_tags)
+    recall = calculate_recall(num_tags, num_false_positives, num_false_negatives)
+    f_measure = calculate_f_measure(precision, recall)
+
+    return precision, recall, f_measure
+
+
+def evaluate(my_tagged, test_tagged, tags_precision, tags_recall, tags_f_measure, test_spans=None, mode="exact"):
     """
     Compares the version tagged by information_extraction.py against the test dataset.
     :param my_tagged: The email tagged by information_extraction.py
@@ -108,44 +248,16 @@ def evaluate(my_tagged, test_tagged, tags_precision, tags_recall, tags_f_measure
     :param tags_precision: Accumulated precision scores for each tag over the set of emails.
     :param tags_recall: Accumulated recall scores for each tag over the set of emails.
     :param tags_f_measure: Accumulated f-measure scores for each tag over the set of emails.
+    :param test_spans: The tokenized spans of the test email, if they have already been worked out.
+    :param mode: How spans are matched, one of MATCH_MODES.
     :return: The updated precision, recall, and f-measure cumulative scores.
     """
+    my_spans = tokenize_spans(my_tagged)
+    if test_spans is None:
+        test_spans = tokenize_spans(test_tagged)
 
     for tag in TAGS:
-        '''
-        Construct the closing tag.
-        E.g.   <  /  etime>
-               0     1:
-        '''
-        end_tag = tag[0] + "/" + tag[1:]
-        tag_regex = re.compile(rf'({tag})([\s\S]*?)({end_tag})')
-        my_data = tag_regex.findall(my_tagged)
-        test_data = tag_regex.findall(test_tagged)
-
-        my_data_tags_removed = []
-        for item in my_data:
-            tags_removed = remove_tags(item[1])
-            tokenized = word_tokenize(tags_removed)
-            my_data_tags_removed.append(tokenized)
-
-        test_data_tags_removed = []
-        for item in test_data:
-            tags_removed = remove_tags(item[1])
-            tokenized = word_tokenize(tags_removed)
-            test_data_tags_removed.append(tokenized)
-
-        # things I tagged which shouldn't be tagged
-        false_positives = [i for i in my_data_tags_removed + test_data_tags_removed if i not in test_data_tags_removed]
-        # things I haven't tagged which should be tagged
-        false_negatives = [i for i in my_data_tags_removed + test_data_tags_removed if i not in my_data_tags_removed]
-
-        num_false_positives = len(false_positives)
-        num_false_negatives = len(false_negatives)
-        num_tags = len(my_data)
-
-        precision = calculate_precision(num_false_positives, num_tags)
-        recall = calculate_recall(num_tags, num_false_positives, num_false_negatives)
-        f_measure = calculate_f_measure(precision, recall)
+        precision, recall, f_measure = score_tag(my_spans[tag], test_spans[tag], mode)
 
         tags_precision[tag] += precision
         tags_recall[tag] += recall
@@ -154,49 +266,197 @@ def evaluate(my_tagged, test_tagged, tags_precision, tags_recall, tags_f_measure
     return tags_precision, tags_recall, tags_f_measure
 
 
-tags_precision = {STIME_TAG: 0,
-                  ETIME_TAG: 0,
-                  LOCATION_TAG: 0,
-                  SPEAKER_TAG: 0,
-                  PARAGRAPH_TAG: 0,
-                  SENTENCE_TAG: 0}
-tags_recall = {STIME_TAG: 0,
-               ETIME_TAG: 0,
-               LOCATION_TAG: 0,
-               SPEAKER_TAG: 0,
-               PARAGRAPH_TAG: 0,
-               SENTENCE_TAG: 0}
-
-tags_f_measure = {STIME_TAG: 0,
-                  ETIME_TAG: 0,
-                  LOCATION_TAG: 0,
-                  SPEAKER_TAG: 0,
-                  PARAGRAPH_TAG: 0,
-                  SENTENCE_TAG: 0}
-
-for file in TEST_FILES:
-    print(file)
-
-    file_path = os.path.join(TEST_TAGGED_PATH, file)
-    with open(file_path) as email_file:
-        file_text = email_file.read()
-        detagged = remove_tags(file_text)
-        my_tagged = information_extraction.tag_email(detagged)
-        write_to_file(my_tagged, file)
-
-        '''
-        Response from evaluation:
-        (tags_precision, tags_recall, tags_f_measure)
-        '''
-        evaluation = evaluate(my_tagged, file_text, tags_precision, tags_recall, tags_f_measure)
-        tags_precision = evaluation[0]
-        tags_recall = evaluation[1]
-        tags_f_measure = evaluation[2]
-
-
-# print average results across all files
-for tag in TAGS:
-    print(tag)
-    print("Precision: " + str(round(tags_precision[tag] / NUM_FILES, 2)))
-    print("Recall: " + str(round(tags_recall[tag] / NUM_FILES, 2)))
-    print("F-Measure: " + str(round(tags_f_measure[tag] / NUM_FILES, 2)))
+def init_worker(profiler=None, profile_path=instrumentation.PROFILE_PATH, ner_server=None):
+    """
+    Loads the model once per worker process.
+    :param profiler: The profiler to profile each email with, one of instrumentation.PROFILERS, or None.
+    :param profile_path: The directory the profiles are written to.
+    :param ner_server: The NER server shared by the parent, see ner_backend.share_server, or None to start one when
+    needed.
+    """
+    global _worker_model
+    ner_backend.connect_to_server(ner_server)
+    instrumentation.set_profiler(profiler, profile_path)
+    _worker_model = information_extraction.get_default_model()
+
+
+def tag_test_email(item):
+    """
+    Tags a test email, timing each stage of the pipeline.
+    :param item: The (file name, untagged text) of the email.
+    :return: The file name, the tagged email, and the stage times and counters.
+    """
+    file, detagged = item
+    with instrumentation.capture(file, enabled=True) as captured:
+        my_tagged = _worker_model.tag(detagged)
+    return file, my_tagged, captured.stats
+
+
+def tag_test_emails(items, workers):
+    """
+    Tags test emails over a pool of worker processes.
+    :param items: The (file name, untagged text) of each email.
+    :param workers: How many worker processes to use, 1 tags in this process.
+    :return: A generator of the file name, tagged email, and stage times and counters of each email.
+    """
+    # Worker processes don't necessarily inherit the profiler, so it is passed on explicitly
+    initargs = (instrumentation.get_profiler(), instrumentation.get_profile_path())
+    if workers <= 1 or len(items) <= 1:
+        init_worker(*initargs)
+        yield from map(tag_test_email, items)
+        return
+
+    # One NER server for every worker, rather than a JVM with its own copy of the classifier in each of them. It is
+    # only started once a worker needs NER, so a batch whose speakers are all found by regex never starts a JVM.
+    ner_server = ner_backend.share_server()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=initargs + (ner_server,)) as executor:
+            yield from executor.map(tag_test_email, items)
+    finally:
+        ner_backend.close_ner_backend()
+
+
+def evaluate_files(test_path=TEST_TAGGED_PATH, output_path=FILE_OUTPUT_PATH, workers=None, mode="exact",
+                   wiki_prefetch=True):
+    """
+    Tags the test emails and scores them against the manually tagged versions.
+    Emails whose text and model haven't changed since the last run are read back rather than tagged again.
+    :param test_path: The directory of tagged test emails.
+    :param output_path: The directory the emails tagged by the program are written to.
+    :param workers: How many worker processes to tag with. Defaults to the number of CPUs.
+    :param mode: How spans are matched, one of MATCH_MODES.
+    :param wiki_prefetch: Whether to look up the Wikipedia candidates of every email concurrently before tagging.
+    :return: The report, with the average score of each tag and the time spent in each stage.
+    """
+    if workers is None:
+        workers = os.cpu_count()
+    start = time.perf_counter()
+
+    # Train (or validate the cached model) once up front, so the workers only have to load it
+    model = information_extraction.get_default_model()
+    output_manifest = manifest.Manifest.for_directory(output_path)
+
+    test_files = list_test_files(test_path)
+    test_texts = {}
+    content_hashes = {}
+    my_tagged = {}
+    pending = []
+    for file in test_files:
+        with open(join(test_path, file)) as email_file:
+            test_texts[file] = email_file.read()
+        detagged = remove_tags(test_texts[file])
+        content_hashes[file] = manifest.hash_text(detagged)
+        tagged_path = join(output_path, file)
+        if output_manifest.status(tagged_path, content_hashes[file], model.fingerprint) == "current":
+            with open(tagged_path) as tagged_file:
+                my_tagged[file] = tagged_file.read()
+        else:
+            pending.append((file, detagged))
+
+    tagging_start = time.perf_counter()
+    timer = instrumentation.StageTimer()
+    prefetched = 0
+    if wiki_prefetch and pending:
+        # Counts the prefetch requests along with the tagging
+        instrumentation.set_timer(timer)
+        try:
+            prefetched = information_extraction.prefetch_wikipedia(detagged for _, detagged in pending)
+        finally:
+            instrumentation.set_timer(None)
+    for file, tagged, stats in tag_test_emails(pending, workers):
+        my_tagged[file] = tagged
+        timer.merge(stats)
+        write_to_file(tagged, file, output_path)
+        output_manifest.record(join(output_path, file), join(test_path, file), content_hashes[file],
+                               model.fingerprint)
+    output_manifest.close()
+    tagging_seconds = time.perf_counter() - tagging_start
+
+    scoring_start = time.perf_counter()
+    tags_precision = {tag: 0 for tag in TAGS}
+    tags_recall = {tag: 0 for tag in TAGS}
+    tags_f_measure = {tag: 0 for tag in TAGS}
+    for file in test_files:
+        print(file)
+        evaluate(my_tagged[file], test_texts[file], tags_precision, tags_recall, tags_f_measure,
+                 load_gold_spans(test_texts[file]), mode)
+    scoring_seconds = time.perf_counter() - scoring_start
+
+    num_files = max(len(test_files), 1)
+    stats = timer.as_dict()
+    return {
+        "files": len(test_files),
+        "tagged": len(pending),
+        "reused": len(test_files) - len(pending),
+        "wiki_prefetched": prefetched,
+        "workers": workers,
+        "model_fingerprint": model.fingerprint,
+        "match": mode,
+        "tags": {tag.strip("<>"): {"precision": tags_precision[tag] / num_files,
+                                   "recall": tags_recall[tag] / num_files,
+                                   "f_measure": tags_f_measure[tag] / num_files} for tag in TAGS},
+        # Summed over the worker processes, so they can add up to more than the tagging wall time
+        "stages": stats["stages"],
+        "counters": stats["counters"],
+        "wall_seconds": {
+            "tagging": tagging_seconds,
+            "scoring": scoring_seconds,
+            "total": time.perf_counter() - start
+        }
+    }
+
+
+def main(argv=None):
+    """
+    Evaluates the information extraction against the test emails, prints the average scores and writes a report.
+    :param argv: The command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Evaluate the information extraction against tagged test emails.")
+    parser.add_argument("--test-path", default=TEST_TAGGED_PATH, help="the directory of tagged test emails")
+    parser.add_argument("--output-path", default=FILE_OUTPUT_PATH,
+                        help="the directory to write the emails tagged by the program to")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--match", choices=MATCH_MODES, default="exact",
+                        help="exact: spans must have the same tokens to match, overlap: spans which overlap in the "
+                             "text match too (default: exact)")
+    parser.add_argument("--report", default=REPORT_PATH, help="where to write the JSON report")
+    parser.add_argument("--no-wiki-prefetch", action="store_true",
+                        help="look up each email's Wikipedia candidates while tagging it, instead of all of them "
+                             "concurrently up front")
+    parser.add_argument("--stats", default=None,
+                        help="also write the stage times and counters to this file, in the Prometheus text format "
+                             "if it ends in .prom or .txt, otherwise as JSON")
+    parser.add_argument("--profile", choices=instrumentation.PROFILERS, default=instrumentation.get_profiler(),
+                        help="profile each email, writing the profiles to --profile-path")
+    parser.add_argument("--profile-path", default=instrumentation.PROFILE_PATH,
+                        help="the directory to write the profiles to")
+    args = parser.parse_args(argv)
+
+    try:
+        instrumentation.set_profiler(args.profile, args.profile_path)
+    except ValueError as error:
+        parser.error(str(error))
+
+    report = evaluate_files(args.test_path, args.output_path, args.workers, args.match, not args.no_wiki_prefetch)
+
+    # print average results across all files
+    for tag in TAGS:
+        scores = report["tags"][tag.strip("<>")]
+        print(tag)
+        print("Precision: " + str(round(scores["precision"], 2)))
+        print("Recall: " + str(round(scores["recall"], 2)))
+        print("F-Measure: " + str(round(scores["f_measure"], 2)))
+
+    for stage, stage_stats in report["stages"].items():
+        print(f'{stage}: {stage_stats["seconds"]:.3f} s over {stage_stats["calls"]} calls', file=sys.stderr)
+
+    with open(args.report, "w") as report_file:
+        json.dump(report, report_file, indent=2)
+    if args.stats is not None:
+        instrumentation.write_stats({"stages": report["stages"], "counters": report["counters"]}, args.stats)
+
+
+if __name__ == '__main__':
+    main()
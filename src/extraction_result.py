@@ -0,0 +1,159 @@
+from collections import namedtuple
+import json
+import tag_markup
+
+try:
+    import orjson
+except ImportError:
+    # orjson is optional, the standard library serializer is used without it
+    orjson = None
+
+
+# A tagged piece of the email. start and end are character offsets into the plain (untagged) text.
+Entity = namedtuple("Entity", ["tag", "start", "end", "text"])
+
+
+def dumps(data):
+    """
+    Serializes data to JSON, with orjson if it is installed.
+    :param data: The JSON-compatible data.
+    :return: The JSON text.
+    """
+    if orjson is not None:
+        return orjson.dumps(data).decode("utf-8")
+    return json.dumps(data, ensure_ascii=False)
+
+
+class ExtractionResult:
+    """
+    What the information extraction found in an email: the plain text of the email, and the tags at character
+    offsets into it. The inline-tagged email is rendered from this, and the entities can be used directly without
+    parsing the tags back out.
+    """
+
+    def __init__(self, text, markup):
+        """
+        :param text: The plain text of the email, without any tags.
+        :param markup: The tags as (offset, tag) pairs, e.g. (10, "</stime>"), in the order they appear in the
+        tagged email.
+        """
+        self.text = text
+        self.markup = markup
+        self._entities = None
+
+    @classmethod
+    def from_spans(cls, text, spans):
+        """
+        :param text: The plain text.
+        :param spans: Sorted, non-overlapping (start, end, tag names) spans, as returned by annotation.find_spans.
+        :return: The result with the spans tagged.
+        """
+        markup = []
+        for start, end, tag_names in spans:
+            markup.extend((start, f'<{tag_name}>') for tag_name in tag_names)
+            markup.extend((end, f'</{tag_name}>') for tag_name in reversed(tag_names))
+        return cls(text, markup)
+
+    @classmethod
+    def from_markup(cls, tagged):
+        """
+        Separates an inline-tagged text into the plain text and the tags, in a single pass.
+        :param tagged: The tagged text.
+        :return: The result the tagged text renders from.
+        """
+        pieces = []
+        markup = []
+        length = 0
+        position = 0
+        for match in tag_markup.MARKUP.finditer(tagged):
+            piece = tagged[position:match.start()]
+            pieces.append(piece)
+            length += len(piece)
+            markup.append((length, match.group()))
+            position = match.end()
+        pieces.append(tagged[position:])
+        return cls("".join(pieces), markup)
+
+    @classmethod
+    def concatenate(cls, results):
+        """
+        Joins results end to end, e.g. the header and the body of an email.
+        :param results: The results to join.
+        :return: A single result covering all of their text.
+        """
+        texts = []
+        markup = []
+        length = 0
+        for result in results:
+            texts.append(result.text)
+            markup.extend((offset + length, tag) for offset, tag in result.markup)
+            length += len(result.text)
+        return cls("".join(texts), markup)
+
+    @property
+    def entities(self):
+        """
+        Pairs each opening tag with its closing tag. A tag without a partner, which the sentence and paragraph
+        tagging can leave behind, is rendered but isn't an entity.
+        :return: The entities, sorted by where they start.
+        """
+        if self._entities is None:
+            open_tags = {}
+            entities = []
+            for offset, tag in self.markup:
+                match = tag_markup.MARKUP.fullmatch(tag)
+                tag_name = match.group(2)
+                if not match.group(1):
+                    open_tags.setdefault(tag_name, []).append(offset)
+                elif open_tags.get(tag_name):
+                    start = open_tags[tag_name].pop()
+                    entities.append(Entity(tag_name, start, offset, self.text[start:offset]))
+            # Outer entities before the entities nested inside them
+            entities.sort(key=lambda entity: (entity.start, -entity.end))
+            self._entities = entities
+        return self._entities
+
+    def entities_tagged(self, tag_name):
+        """
+        :param tag_name: The tag name, e.g. "speaker".
+        :return: The entities with the tag.
+        """
+        return [entity for entity in self.entities if entity.tag == tag_name]
+
+    def render(self):
+        """
+        Inserts the tags into the plain text in one join.
+        :return: The inline-tagged email.
+        """
+        pieces = []
+        position = 0
+        for offset, tag in self.markup:
+            pieces.append(self.text[position:offset])
+            pieces.append(tag)
+            position = offset
+        pieces.append(self.text[position:])
+        return "".join(pieces)
+
+    def to_dict(self):
+        """
+        :return: The result as JSON-compatible data.
+        """
+        return {
+            "text": self.text,
+            "entities": [entity._asdict() for entity in self.entities],
+            "markup": [list(tag) for tag in self.markup]
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        :param data: The data from to_dict.
+        :return: The result.
+        """
+        return cls(data["text"], [(offset, tag) for offset, tag in data["markup"]])
+
+    def to_json(self):
+        """
+        :return: The result as JSON text.
+        """
+        return dumps(self.to_dict())
@@ -0,0 +1,161 @@
+from collections import deque
+import re
+
+
+def fold(text):
+    """
+    Lowercases text for case-insensitive matching, keeping every character at the same offset.
+    :param text: The text.
+    :return: The lowercased text, the same length as the text.
+    """
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    # A few characters lowercase to more than one, e.g. "İ", these are left as they are
+    return "".join(char.lower() if len(char.lower()) == 1 else char for char in text)
+
+
+def is_word_char(char):
+    """
+    :param char: A single character.
+    :return: Whether the character is part of a word, as for \\w in a regex.
+    """
+    return char.isalnum() or char == "_"
+
+
+class LocationMatcher:
+    """
+    Finds every known location in a text in one scan, with an Aho-Corasick automaton over the lowercased locations.
+    Locations can be added at any time. The failure links are only worked out again the next time a text is searched.
+    """
+
+    def __init__(self, locations=()):
+        """
+        :param locations: The known locations.
+        """
+        # The trie, one entry per node. The root is node 0.
+        self._goto = [{}]
+        # Filled in by _build
+        self._fail = [0]
+        self._first_chars = None
+        # The indices of the locations which end at each node, including through its failure links
+        self._outputs = [()]
+        self._locations = []
+        self._indices = {}
+        self._built = True
+        for location in locations:
+            self.add(location)
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __contains__(self, location):
+        return fold(location) in self._indices
+
+    def add(self, location):
+        """
+        Adds a location. Locations which only differ in case are the same location, and the first one is kept.
+        :param location: The location.
+        :return: Whether the location is new.
+        """
+        key = fold(location)
+        if not key or key in self._indices:
+            return False
+        self._indices[key] = len(self._locations)
+        self._locations.append(location)
+
+        node = 0
+        for char in key:
+            next_node = self._goto[node].get(char)
+            if next_node is None:
+                next_node = len(self._goto)
+                self._goto[node][char] = next_node
+                self._goto.append({})
+            node = next_node
+        self._built = False
+        return True
+
+    def update(self, locations):
+        """
+        :param locations: The locations to add.
+        """
+        for location in locations:
+            self.add(location)
+
+    def _build(self):
+        """
+        Works out the failure links breadth first, so each node's link is to a shallower node which is already done.
+        """
+        own_outputs = [()] * len(self._goto)
+        for index, location in enumerate(self._locations):
+            node = 0
+            for char in fold(location):
+                node = self._goto[node][char]
+            own_outputs[node] = (index,)
+
+        self._fail = [0] * len(self._goto)
+        self._outputs = own_outputs
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # Longer locations first, so the matches ending at a position are in a stable order
+                self._outputs[child] = self._outputs[child] + self._outputs[self._fail[child]]
+                queue.append(child)
+        # From the root, the scan can jump straight to the next character which starts a location
+        self._first_chars = re.compile("[" + "".join(re.escape(char) for char in sorted(self._goto[0])) + "]")
+        self._built = True
+
+    def find(self, text):
+        """
+        Finds every occurrence of every location, ignoring case. A location must start and end on a word boundary,
+        e.g. "Wean" isn't found in "Weaned".
+        :param text: The text to search.
+        :return: A list of (start, end, location) matches in the order they end, where location is as it was added.
+        Overlapping matches are all returned.
+        """
+        if not self._built:
+            self._build()
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        locations = self._locations
+
+        matches = []
+        if not locations:
+            return matches
+        folded = fold(text)
+        length = len(folded)
+        node = 0
+        position = 0
+        while position < length:
+            if node == 0:
+                first = self._first_chars.search(folded, position)
+                if first is None:
+                    break
+                position = first.start()
+            char = folded[position]
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            position += 1
+            for index in outputs[node]:
+                start = position - len(locations[index])
+                if self._on_boundaries(text, start, position):
+                    matches.append((start, position, locations[index]))
+        return matches
+
+    @staticmethod
+    def _on_boundaries(text, start, end):
+        """
+        :return: Whether a match doesn't start or end in the middle of a word.
+        """
+        if start > 0 and is_word_char(text[start]) and is_word_char(text[start - 1]):
+            return False
+        if end < len(text) and is_word_char(text[end - 1]) and is_word_char(text[end]):
+            return False
+        return True
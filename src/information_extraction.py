@@ -1,22 +1,39 @@
-from nltk.tag import DefaultTagger, UnigramTagger, BigramTagger, TrigramTagger, StanfordNERTagger
-from nltk.corpus import treebank, names
+from nltk.corpus import names
 from requests.exceptions import RequestException
-from requests.utils import requote_uri
 from os.path import isfile, join
 from os import listdir
 import nltk.data
-import re
+import hashlib
+import json
+import os
 import string
 import requests
+import annotation
+import extraction_result
+import gazetteer
+import instrumentation
+import ner_backend
+import patterns
+import segmentation
+import tag_markup
+import wiki_cache
+import wiki_client
 
 
 TRAINING_CORPORA_PATH = '../training/tagged'
-STANFORD_TAGGER_PATH = '../resources/stanford-ner.jar'
-STANFORD_TAGGER_DICTIONARY = '../resources/english.all.3class.distsim.crf.ser.gz'
+MODEL_ARTIFACT_PATH = '../cache/extraction_model.json'
+# Bump whenever the layout of the serialized model changes, so stale artifacts are retrained
+MODEL_FORMAT_VERSION = 1
+# Bump whenever the tagging rules change, so emails tagged by older code are re-tagged
+PIPELINE_VERSION = 2
+WIKIPEDIA_API_URL = wiki_client.WIKIPEDIA_API_URL
+WIKIPEDIA_TIMEOUT = wiki_client.WIKIPEDIA_TIMEOUT
 
 TAGS = ["<date>", "</date>", "<stime>", "</stime>", "<etime>", "</etime>", "<location>", "</location>", "<speaker>",
         "</speaker>", "<sentence>", "</sentence>"]
 TITLES = ["mr", "mrs", "mr", "dr", "professor", "prof", "doctor", "md", "phd"]
+# Matches any of the sentence/paragraph markup already in a body, which other tags must not be inserted into
+MARKUP_REGEX = tag_markup.MARKUP
 STIME_TAG = "stime"
 ETIME_TAG = "etime"
 PARAGRAPH_TAG = "paragraph"
@@ -24,12 +41,32 @@ SENTENCE_TAG = "sentence"
 LOCATION_TAG = "location"
 SPEAKER_TAG = "speaker"
 
-TRAIN_SENTS = treebank.tagged_sents()
-UNIGRAM = UnigramTagger(TRAIN_SENTS, backoff=DefaultTagger('NN'))
-BIGRAM = BigramTagger(TRAIN_SENTS, backoff=UNIGRAM)
-TRIGRAM = TrigramTagger(TRAIN_SENTS, backoff=BIGRAM)
-with open("../resources/family.txt") as family_file:
-    NAMES = names.words('male.txt') + names.words('female.txt') + family_file.read().splitlines()
+FAMILY_NAMES_PATH = '../resources/family.txt'
+
+# Heavy resources are loaded the first time they are used rather than at import, see get_names
+_names = None
+
+
+def get_names():
+    """
+    Loads the first names from the NLTK names corpus, and the family names from family.txt, the first time they
+    are needed.
+    :return: A set of known first and family names.
+    """
+    global _names
+    if _names is None:
+        with open(FAMILY_NAMES_PATH) as family_file:
+            _names = frozenset(names.words('male.txt') + names.words('female.txt') + family_file.read().splitlines())
+    return _names
+
+
+def __getattr__(name):
+    """
+    Keeps NAMES available as a module attribute without loading it at import.
+    """
+    if name == "NAMES":
+        return get_names()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def format_file(file):
@@ -61,80 +98,120 @@ def detokenize(tokens):
     :param tokens: A list of tokens.
     :return: The tokens put back into a single string.
     """
-    line = ""
-    count_tokens = 0
-    for token in tokens:
-        if len(token) > 0:
-            if count_tokens > 0:
-                previous_token = tokens[count_tokens - 1]
-                if token == "<sentence>":
-                    '''
-                    Add space after after end of sentence.
-                    e.g. The dog jumped. The lazy fox.
-                                        ^
-                    '''
-                    if previous_token in string.punctuation:
-                        line += " " + token
-                elif token in TAGS:
-                    line += token
-                    '''
-                    No space between word and trailing punctuation.
-                    E.g. The dog jumped.
-                    '''
-                elif token[0] in string.punctuation:
-                    line += token
-                else:
-                    '''
-                    Put space after closing tag.
-                    e.g. </sentence> <sentence>
-                    '''
-                    if previous_token in TAGS and "/" not in previous_token:
-                        line += token
-                    else:
-                        line += " " + token
-            else:
-                line += token
-            count_tokens += 1
-    return line
+    return segmentation.render_tokens(tokens)
+
+
+_wiki_session = None
+
+
+def get_wiki_session():
+    """
+    Creates the HTTP session used for Wikipedia requests, so connections are reused between queries.
+    :return: The shared requests session.
+    """
+    global _wiki_session
+    if _wiki_session is None:
+        _wiki_session = requests.Session()
+    return _wiki_session
 
 
 def wikify(query):
     """
     Performs wikification by sending a query to the Wikipedia API.
+    Responses are cached, and in offline mode only the cache and fixture file are consulted.
     :param query: The query to send to the API.
     :return: The content of the HTTP response.
     """
+    cache = wiki_cache.get_wiki_cache()
+    cached = cache.get(query)
+    if cached is not None:
+        instrumentation.count("wiki_cache_hits")
+        return cached
+    if wiki_cache.is_offline():
+        instrumentation.count("wiki_fixture_lookups")
+        return wiki_cache.lookup_fixture(query)
+
+    instrumentation.count("wiki_requests")
     try:
-        '''
-        Removes any illegal characters in URLs e.g. spaces
-        '''
-        query = requote_uri(query)
-
-        query_parameters = {
-            "action": "query",
-            "list": "search",
-            "format": "json",
-            "srsearch": query
-        }
-        response = requests.get('https://en.wikipedia.org/w/api.php', params=query_parameters)
-
-        # return the response content
-        return response.text
+        response = get_wiki_session().get(WIKIPEDIA_API_URL, params=wiki_client.search_parameters(query),
+                                          timeout=WIKIPEDIA_TIMEOUT)
     except RequestException:
+        instrumentation.count("wiki_errors")
         return None
 
+    # Don't let a transient error page stick around in the cache
+    if response.ok:
+        cache.put(query, response.text)
+
+    # return the response content
+    return response.text
+
+
+def wiki_candidates(body):
+    """
+    Finds the nouns rel_extract will look up on Wikipedia, without tagging anything.
+    :param body: The email body.
+    :return: A list of the queries check_noun will send.
+    """
+    candidates = []
+    for pattern in (patterns.SPEAKER_WITH_TOPIC, patterns.SPEAKER):
+        found = pattern.search(body)
+        if found is not None:
+            candidates.append(found.group(1))
+    return candidates
+
+
+def prefetch_wikipedia(email_texts, client=None):
+    """
+    Looks up the Wikipedia candidates of a batch of emails concurrently before they are tagged, so tagging them only
+    hits the cache instead of waiting on each request in turn.
+    :param email_texts: The emails about to be tagged.
+    :param client: The wiki_client.AsyncWikiClient to use, by default one is made for the call.
+    :return: How many responses were fetched.
+    """
+    queries = []
+    for email_text in email_texts:
+        queries += wiki_candidates(format_file(email_text)[1])
+    return wiki_client.prefetch(queries, client)
+
+
+def list_training_files(training_path=TRAINING_CORPORA_PATH):
+    """
+    Lists the files in the training set, in a stable order.
+    :param training_path: The directory containing the tagged training emails.
+    :return: A sorted list of the training file names.
+    """
+    return sorted(f for f in listdir(training_path) if isfile(join(training_path, f)))
+
 
-def train_para_tagger():
+def fingerprint_training_set(training_path=TRAINING_CORPORA_PATH):
+    """
+    Hashes the names and contents of every file in the training set.
+    Used to detect when a serialized model no longer matches the training data.
+    :param training_path: The directory containing the tagged training emails.
+    :return: A hex digest which changes whenever a training file is added, removed or edited.
+    """
+    digest = hashlib.sha256()
+    for file in list_training_files(training_path):
+        digest.update(file.encode("utf-8") + b"\0")
+        with open(join(training_path, file), "rb") as training_file:
+            digest.update(hashlib.sha256(training_file.read()).digest())
+    return digest.hexdigest()
+
+
+def train_para_tagger(training_path=TRAINING_CORPORA_PATH):
     """
     Trains the paragraph tagger by calculating the average length of a sentence in the training set.
+    :param training_path: The directory containing the tagged training emails.
     :return: The lower and upper bounds for accepted sentence length in a paragraph.
     """
-    training_files = [f for f in listdir(TRAINING_CORPORA_PATH) if isfile(join(TRAINING_CORPORA_PATH, f))]
+    training_files = list_training_files(training_path)
 
     num_sentences = 0
     num_words = 0
     for file in training_files:
-        file_text = open(TRAINING_CORPORA_PATH + "/" + file, "r").read()
+        with open(join(training_path, file), "r") as training_file:
+            file_text = training_file.read()
         removed_first_tag = file_text.split("<paragraph>")
         first_tag_removed = []
         if len(removed_first_tag) > 1:
@@ -151,9 +228,7 @@ def train_para_tagger():
         for paragraph in paragraphs:
             sentences = paragraph.split("<sentence>")
             for sentence in sentences:
-                tag_removed = sentence.replace("</sentence>", "")
-                for tag in TAGS:
-                    tag_removed = tag_removed.replace(tag, "")
+                tag_removed = tag_markup.strip(sentence)
 
                 tokenised_text = nltk.word_tokenize(tag_removed)
                 words = tokenised_text
@@ -175,16 +250,18 @@ def train_para_tagger():
     return sentence_length_lower_bound, sentence_length_upper_bound
 
 
-def train_location_tagger():
+def train_location_tagger(training_path=TRAINING_CORPORA_PATH):
     """
     Pulls all of the locations out of the training set.
+    :param training_path: The directory containing the tagged training emails.
     :return: A list of locations found in the training set.
     """
-    training_files = [f for f in listdir(TRAINING_CORPORA_PATH) if isfile(join(TRAINING_CORPORA_PATH, f))]
+    training_files = list_training_files(training_path)
     locations = set([])
     for file in training_files:
-        file_text = open(TRAINING_CORPORA_PATH + "/" + file, "r").read()
-        file_locations = re.findall(r'(<location>?)(.*)(</location>?)', file_text)
+        with open(join(training_path, file), "r") as training_file:
+            file_text = training_file.read()
+        file_locations = patterns.TRAINING_LOCATION.findall(file_text)
         for location in file_locations:
             location_name = location[1]
             for tag in TAGS:
@@ -203,12 +280,12 @@ def check_header(header, tags, locations):
     :param locations: List of previously found locations.
     :return: The updated tags list, and updated known locations.
     """
-    time = re.search(r'Times?:\s*(.*)\n', header, flags=re.I)
-    place = re.search(r'Places?:\s*(.*)\n|Locations?:\s*(.*)\n', header, flags=re.I)
-    speaker = re.search(r'Who:\s*([^,\n]*)(\n\s*(.*))?|Speakers?:\s*([^,\n]*)(\n\s*(.*))?', header, flags=re.I)
+    time = patterns.HEADER_TIME.search(header)
+    place = patterns.HEADER_PLACE.search(header)
+    speaker = patterns.HEADER_SPEAKER.search(header)
     if time is not None:
         time = time.group(1)
-        start_and_end_time = re.search(r'(.*?)\s?([-,;]|until|up\sto)\s?(.*)', time)
+        start_and_end_time = patterns.TIME_RANGE.search(time)
         if start_and_end_time is not None:
             start_time = start_and_end_time.group(1)
             end_time = start_and_end_time.group(3)
@@ -246,11 +323,12 @@ def check_noun(word):
     :param word: The noun to check.
     :return: Whether the noun is a place or person.
     """
-    wiki_results = wikify(word)
+    with instrumentation.stage("wikification"):
+        wiki_results = wikify(word)
     if wiki_results is not None:
         if "born" in wiki_results:
             return "person"
-        elif word in NAMES:
+        elif word in get_names():
             return "person"
         elif "founded" in wiki_results:
             return "place"
@@ -269,27 +347,17 @@ def rel_extract(body, tags, locations):
     :param locations: List of previously found locations.
     :return: The updated list of accumulated tagged strings, and the updated known locations.
     """
-    find_rels = re.search(
-        r'((\w*\s*)?\w*)(\s*from\s*((the)?\s*university\s*of\s*\w*|\w*\s*university))?\s*(will|is\sgoing\sto)\s*('
-        r'present|speak|talk|lecture|deliver\s*a\s*(guest\s*)?(lecture|talk|presentation)?)\s*('
-        r'on\s*the\s*topic|in|about|on)\s*(.*)\.',
-        body, flags=re.I)
+    find_rels = patterns.SPEAKER_WITH_TOPIC.search(body)
     if find_rels is not None:
         speaker = find_rels.group(1)
         if check_noun(speaker) == "person":
             tags.add((speaker, SPEAKER_TAG))
-    find_rels = re.search(
-        r'((\w*\s*)?\w*)(\s*from\s*((the)?\s*university\s*of\s*\w*|\w*\s*university))?\s*(will|is\sgoing\sto)\s*('
-        r'present|speak|talk|lecture|deliver\s*a\s*(guest\s*)?(lecture|talk|presentation)?)',
-        body, flags=re.I)
+    find_rels = patterns.SPEAKER.search(body)
     if find_rels is not None:
         speaker = find_rels.group(1)
         if check_noun(speaker) == "person":
             tags.add((speaker, SPEAKER_TAG))
-    find_rels = re.search(
-        r'.*\sThe\s(seminar|lecture|talk|presentation)\s(will|is going to)\s(be\s(held\s)?in|hosted in)\s(.*)\sat\s('
-        r'.*)\son\s([^!\.]*)',
-        body, flags=re.I)
+    find_rels = patterns.VENUE_AT_ON.search(body)
     if find_rels is not None:
         location = find_rels.group(5)
         time = find_rels.group(6)
@@ -297,10 +365,7 @@ def rel_extract(body, tags, locations):
         locations.add(location)
         tags.add((time, STIME_TAG))
     else:
-        find_rels = re.search(
-            r'.*\sThe\s(seminar|lecture|talk|presentation)\s(will|is going to)\s(be\s(held\s)?in|hosted in)\s('
-            r'.*)\son\s(.*)\sat\s([^!\.]*)',
-            body, flags=re.I)
+        find_rels = patterns.VENUE_ON_AT.search(body)
         if find_rels is not None:
             location = find_rels.group(5)
             time = find_rels.group(7)
@@ -308,20 +373,16 @@ def rel_extract(body, tags, locations):
             locations.add(location)
             tags.add((time, STIME_TAG))
         else:
-            find_rels = re.search(r'.*\sThe\s(seminar|lecture|talk|presentation)\s(will|is going to)\s(be\s('
-                                  r'held\s)?in|hosted in)\s(.*)\.', body, flags=re.I)
+            find_rels = patterns.VENUE.search(body)
             if find_rels is not None:
                 location = find_rels.group(5)
                 tags.add((location, LOCATION_TAG))
                 locations.add(location)
-    find_rels = re.search(
-        r'(seminar|talk|presentation).*(are|will\sbe|is\sgoing\sto\sbe).*at\s(\d*(\D\d*)?(\s(pm|am))?)', body,
-        flags=re.I)
+    find_rels = patterns.SEMINAR_TIME.search(body)
     if find_rels is not None:
         time = find_rels.group(3)
         tags.add((time, STIME_TAG))
-    find_rels = re.search(r'(seminar|talk|presentation).*(are|will\sbe|is\sgoing\sto\sbe).*in\s(\w*(\s\d*))', body,
-                          flags=re.I)
+    find_rels = patterns.SEMINAR_ROOM.search(body)
     if find_rels is not None:
         location = find_rels.group(3)
         tags.add((location, LOCATION_TAG))
@@ -337,51 +398,17 @@ def tag_sents_and_paras(text, sentence_length_lower_bound, sentence_length_upper
     :param sentence_length_upper_bound: Upper bound of accepted sentence length in a paragraph.
     :return: The list of tokens with paragraph and sentence tags added.
     """
-    '''
-    We assume each paragraph is split by an empty line.
-    The last item will probably be empty, as there is often free lines at the end of the file, so it is removed
-    '''
-    paras = text.split("\n\n")[:-1]
-
-    sents_tagged = []
-    count_sents_tagged = 0
-    for para in paras:
-        tokenised = nltk.sent_tokenize(para)
-        para_start_index = count_sents_tagged
-
-        # Loop until enough sentences for the paragraph have been found.
-        all_sents = True
-        for token in tokenised:
-            last_char = token[-1:]
-            sent_length = len(token)
-            if last_char == "." or last_char == "!" or last_char == "?" and sentence_length_lower_bound < sent_length < sentence_length_upper_bound:
-                sents_tagged.append("<sentence>")
-                sents_tagged.append(token[:-1])
-                sents_tagged.append("</sentence>")
-                sents_tagged.append(last_char)
-                count_sents_tagged += 4
-            else:
-                all_sents = False
-                sents_tagged.append(token)
-                sents_tagged.append("\n")
-                count_sents_tagged += 2
-
-        if all_sents:
-            sents_tagged.insert(para_start_index, "<paragraph>")
-            sents_tagged.append("</paragraph>")
-            sents_tagged.append("\n\n")
-            count_sents_tagged += 3
-
-    return sents_tagged
+    paragraphs = segmentation.segment(text, sentence_length_lower_bound, sentence_length_upper_bound)
+    return list(segmentation.segment_tokens(text, paragraphs))
 
 
-def tag_body(text, tags):
+def prepare_tags(tags):
     """
-    Searches the email body for text which has been identified as needing to be tagged, and adds the tags.
-    :param text: The text to be tagged.
+    Cleans up the tagged strings before searching for them.
     :param tags: A list of strings and their associated tags to search for.
-    :return: The tagged text.
+    :return: The cleaned up list of strings and tags.
     """
+    prepared = []
     for tag in tags:
         '''
         The tag is in the following format:
@@ -392,14 +419,22 @@ def tag_body(text, tags):
         # Remove full stops from times as they definitely don't belong
         if (tag_tag == STIME_TAG or tag_tag == ETIME_TAG) and tag_string[-1:] == ".":
             tag_string = tag_string[:-1]
+        prepared.append((tag_string, tag_tag))
 
-        # Find instances of the tagged string and tag it
-        for index in re.finditer(re.escape(tag_string), text):
-            before_substring = text[:index.start()]
-            after_substring = text[index.end():]
-            text = f'{before_substring} <{tag_tag}>{tag_string} </{tag_tag}>{after_substring}'
+    return prepared
 
-    return text
+
+def tag_body(text, tags):
+    """
+    Searches the email body for text which has been identified as needing to be tagged, and adds the tags.
+    All the strings are found in a single pass and the tags inserted in a single join, so one tag can never be
+    inserted inside another, or inside the existing sentence and paragraph markup.
+    :param text: The text to be tagged.
+    :param tags: A list of strings and their associated tags to search for.
+    :return: The tagged text.
+    """
+    markup = [match.span() for match in MARKUP_REGEX.finditer(text)]
+    return annotation.annotate(text, prepare_tags(tags), protected=markup)
 
 
 def tag_header(header, tags):
@@ -409,12 +444,23 @@ def tag_header(header, tags):
     :param tags: A list of strings and their associated tags to search for.
     :return: The tagged header.
     """
+    return extract_header(header, tags).render()
+
+
+def extract_header(header, tags):
+    """
+    Finds where the identified strings are in the email header.
+    :param header: The email header.
+    :param tags: A list of strings and their associated tags to search for.
+    :return: The ExtractionResult for the header.
+    """
     header_lines = header.splitlines()
-    tagged = ""
-    for line in header_lines:
-        info_tagged = tag_body(line, tags)
-        tagged += info_tagged + "\n"
-    return tagged
+    if not header_lines:
+        return extraction_result.ExtractionResult("", [])
+    # Every line ends with a new line, including the last one
+    header = "\n".join(header_lines) + "\n"
+    spans = annotation.find_spans(header, prepare_tags(tags), single_line=True)
+    return extraction_result.ExtractionResult.from_spans(header, spans)
 
 
 def find_names(text, tags):
@@ -424,12 +470,43 @@ def find_names(text, tags):
     :param tags: A list of accumulated strings which have been tagged so far.
     :return: The updated list of accumulated tags.
     """
-    stanford_tagger = StanfordNERTagger(STANFORD_TAGGER_DICTIONARY,
-                                        STANFORD_TAGGER_PATH,
-                                        encoding='utf-8')
-    tokenised = nltk.word_tokenize(text)
-    classified = stanford_tagger.tag(tokenised)
+    return find_names_in_texts([text], tags)
 
+
+def find_names_in_texts(texts, tags):
+    """
+    Finds names in several texts with a single request to the NER backend.
+    For each text, the first line which is just a name is assumed to be a speaker.
+    :param texts: The texts to search, e.g. the body and the header.
+    :param tags: A list of accumulated strings which have been tagged so far.
+    :return: The updated list of accumulated tags.
+    """
+    instrumentation.count("ner_calls")
+    instrumentation.count("ner_texts", len(texts))
+    with instrumentation.stage("ner"):
+        tokenised = [nltk.word_tokenize(text) for text in texts]
+        classified_texts = ner_backend.get_ner_backend().tag_sents(tokenised)
+
+    for text, classified in zip(texts, classified_texts):
+        names = extract_names(classified)
+
+        lines = text.splitlines()
+        for line in lines:
+            stripped_line = line.strip()
+            if stripped_line in names:
+                tags.add((line, SPEAKER_TAG))
+                break
+
+    return tags
+
+
+def extract_names(classified):
+    """
+    Joins up consecutive tokens which look like part of a name.
+    :param classified: The NER tagged tokens, as (token, tag) pairs.
+    :return: A list of the names found.
+    """
+    known_names = get_names()
     names = []
     current_name = ""
     found_name = False
@@ -440,8 +517,8 @@ def find_names(text, tags):
         '''
         token_word = token[0]
         token_tag = token[1]
-        is_shortened_name = re.match("^\w+\.$", token_word)
-        if token_tag == "PERSON" or token_word in NAMES or token_word.lower() in TITLES or is_shortened_name is not None or token_word in string.punctuation:
+        is_shortened_name = patterns.SHORTENED_NAME.match(token_word)
+        if token_tag == "PERSON" or token_word in known_names or token_word.lower() in TITLES or is_shortened_name is not None or token_word in string.punctuation:
             if found_name is True and token_word not in string.punctuation:
                 current_name += " " + token_word
             else:
@@ -452,43 +529,215 @@ def find_names(text, tags):
             current_name = ""
             found_name = False
 
-    lines = text.splitlines()
-    for line in lines:
-        stripped_line = line.strip()
-        if stripped_line in names:
-            tags.add((line, SPEAKER_TAG))
-            break
-
-    return tags
+    return names
 
 
 def find_locations(text, tags, locations):
     """
     Searches the text for previously identified locations, if no other location has been found.
+    The locations are found in one scan, ignoring case and only as whole words, and each is tagged as it is written
+    in the text.
     :param text: The text to search.
     :param tags: A list of accumulated strings which have been tagged so far.
-    :param locations: List of previously found locations.
-    :return: The updated list of accumulated tags, and updated known locations.
+    :param locations: A gazetteer.LocationMatcher of the previously found locations, or a list of them.
+    :return: The updated list of accumulated tags.
     """
-    lower_text = text.lower()
-    for location in locations:
-        if location.lower() in lower_text:
-            tags.add((location, LOCATION_TAG))
+    if not isinstance(locations, gazetteer.LocationMatcher):
+        locations = gazetteer.LocationMatcher(locations)
+    for start, end, _ in locations.find(text):
+        tags.add((text[start:end], LOCATION_TAG))
 
     return tags
 
 
-def tag_email(email_text):
+class ExtractionModel:
+    """
+    Everything tag_email learns from the training set, so it can be trained once and reused for any number of emails.
+    """
+
+    def __init__(self, sentence_length_lower_bound, sentence_length_upper_bound, locations, training_fingerprint=None):
+        """
+        :param sentence_length_lower_bound: Lower bound of accepted sentence length in a paragraph.
+        :param sentence_length_upper_bound: Upper bound of accepted sentence length in a paragraph.
+        :param locations: The locations found in the training set.
+        :param training_fingerprint: Fingerprint of the training set the model was built from.
+        """
+        self.sentence_length_lower_bound = sentence_length_lower_bound
+        self.sentence_length_upper_bound = sentence_length_upper_bound
+        self.locations = frozenset(locations)
+        self.training_fingerprint = training_fingerprint
+        self._location_matcher = None
+
+    @property
+    def location_matcher(self):
+        """
+        Builds the matcher for the known locations the first time it is needed, and then reuses it for every email.
+        :return: The gazetteer.LocationMatcher of the locations.
+        """
+        if self._location_matcher is None:
+            # Sorted, so the same spelling of a location is kept whatever order the set is in
+            self._location_matcher = gazetteer.LocationMatcher(sorted(self.locations))
+        return self._location_matcher
+
+    @property
+    def fingerprint(self):
+        """
+        :return: A hex digest which changes whenever the output of the model could, i.e. when it is retrained or the
+        tagging rules change.
+        """
+        return hashlib.sha256(f'{MODEL_FORMAT_VERSION}\0{PIPELINE_VERSION}\0{self.training_fingerprint}'
+                              .encode("utf-8")).hexdigest()
+
+    @classmethod
+    def train(cls, training_path=TRAINING_CORPORA_PATH):
+        """
+        Trains a model from the tagged training emails.
+        :param training_path: The directory containing the tagged training emails.
+        :return: The trained model.
+        """
+        sentence_length_lower_bound, sentence_length_upper_bound = train_para_tagger(training_path)
+        locations = train_location_tagger(training_path)
+        return cls(sentence_length_lower_bound, sentence_length_upper_bound, locations,
+                   fingerprint_training_set(training_path))
+
+    def save(self, artifact_path=MODEL_ARTIFACT_PATH):
+        """
+        Serializes the model to disk. The file is written to a temporary name first so readers never see half of it.
+        :param artifact_path: Where to store the model.
+        """
+        artifact = {
+            "format_version": MODEL_FORMAT_VERSION,
+            "training_fingerprint": self.training_fingerprint,
+            "sentence_length_lower_bound": self.sentence_length_lower_bound,
+            "sentence_length_upper_bound": self.sentence_length_upper_bound,
+            "locations": sorted(self.locations)
+        }
+        artifact_dir = os.path.dirname(artifact_path)
+        if artifact_dir:
+            os.makedirs(artifact_dir, exist_ok=True)
+        temp_path = f'{artifact_path}.{os.getpid()}.tmp'
+        with open(temp_path, "w") as artifact_file:
+            json.dump(artifact, artifact_file)
+        os.replace(temp_path, artifact_path)
+
+    @classmethod
+    def load(cls, artifact_path=MODEL_ARTIFACT_PATH):
+        """
+        Loads a serialized model.
+        :param artifact_path: Where the model is stored.
+        :return: The model, or None if there is no usable artifact at the path.
+        """
+        try:
+            with open(artifact_path, "r") as artifact_file:
+                artifact = json.load(artifact_file)
+        except (OSError, ValueError):
+            return None
+
+        if artifact.get("format_version") != MODEL_FORMAT_VERSION:
+            return None
+        return cls(artifact["sentence_length_lower_bound"],
+                   artifact["sentence_length_upper_bound"],
+                   artifact["locations"],
+                   artifact["training_fingerprint"])
+
+    @classmethod
+    def load_or_train(cls, training_path=TRAINING_CORPORA_PATH, artifact_path=MODEL_ARTIFACT_PATH):
+        """
+        Loads the serialized model if it was built from the current training set, otherwise retrains and saves it.
+        :param training_path: The directory containing the tagged training emails.
+        :param artifact_path: Where the model is stored.
+        :return: A model matching the current training set.
+        """
+        model = cls.load(artifact_path)
+        if model is not None and model.training_fingerprint == fingerprint_training_set(training_path):
+            return model
+
+        model = cls.train(training_path)
+        try:
+            model.save(artifact_path)
+        except OSError:
+            # A read-only cache shouldn't stop us tagging, it just means we retrain next time
+            pass
+        return model
+
+    def tag(self, email_text):
+        """
+        Performs information extraction on an email and adds tags.
+        :param email_text: The email to tag.
+        :return: The tagged email.
+        """
+        return tag_email(email_text, self)
+
+    def tag_parts(self, header, body):
+        """
+        Performs information extraction on an email which has already been split into its header and body.
+        :param header: The email header.
+        :param body: The email body.
+        :return: The tagged email.
+        """
+        return tag_email_parts(header, body, self)
+
+    def extract(self, email_text):
+        """
+        Performs information extraction on an email.
+        :param email_text: The email.
+        :return: The ExtractionResult.
+        """
+        return extract_email(email_text, self)
+
+    def extract_parts(self, header, body):
+        """
+        Performs information extraction on an email which has already been split into its header and body.
+        :param header: The email header.
+        :param body: The email body.
+        :return: The ExtractionResult.
+        """
+        return extract_email_parts(header, body, self)
+
+
+_default_model = None
+
+
+def get_default_model():
+    """
+    Loads the model for the default training set the first time it is needed.
+    :return: The shared model.
+    """
+    global _default_model
+    if _default_model is None:
+        _default_model = ExtractionModel.load_or_train()
+    return _default_model
+
+
+def tag_email(email_text, model=None):
     """
     Performs information extraction on an email and adds tags.
     :param email_text: The email to tag.
+    :param model: The trained ExtractionModel to use. Defaults to the model for the default training set.
     :return: The tagged email.
     """
+    return extract_email(email_text, model).render()
 
-    sentence_length_lower_bound, sentence_length_upper_bound = train_para_tagger()
 
-    locations = train_location_tagger()
+def tag_email_parts(header, body, model=None):
+    """
+    Performs information extraction on an email which has already been split into its header and body, e.g. by
+    the email parser, and adds tags.
+    :param header: The email header, one field per line.
+    :param body: The email body.
+    :param model: The trained ExtractionModel to use. Defaults to the model for the default training set.
+    :return: The tagged email.
+    """
+    return extract_email_parts(header, body, model).render()
 
+
+def extract_email(email_text, model=None):
+    """
+    Performs information extraction on an email.
+    :param email_text: The email.
+    :param model: The trained ExtractionModel to use. Defaults to the model for the default training set.
+    :return: The ExtractionResult, with the entities found and their spans in the email's plain text.
+    """
     '''
     Split the email into header and body.
     return value is: (header, body)
@@ -497,15 +746,41 @@ def tag_email(email_text):
     header = formatted[0]
     body = formatted[1]
 
+    return extract_email_parts(header, body, model)
+
+
+def extract_email_parts(header, body, model=None):
+    """
+    Performs information extraction on an email which has already been split into its header and body.
+    :param header: The email header, one field per line.
+    :param body: The email body.
+    :param model: The trained ExtractionModel to use. Defaults to the model for the default training set.
+    :return: The ExtractionResult, with the entities found and their spans in the email's plain text.
+    """
+    if model is None:
+        model = get_default_model()
+
+    sentence_length_lower_bound = model.sentence_length_lower_bound
+    sentence_length_upper_bound = model.sentence_length_upper_bound
+
+    # Locations found in this email must not leak into the model used for the next one
+    locations = set()
+
     tags = set([])
-    tags, locations = check_header(header, tags, locations)
+    with instrumentation.stage("header_regex"):
+        tags, locations = check_header(header, tags, locations)
 
-    # A lot of emails have nested headers
-    tags, locations = check_header(body, tags, locations)
+        # A lot of emails have nested headers
+        tags, locations = check_header(body, tags, locations)
+    instrumentation.count("header_regex_matches", len(tags))
 
-    sent_and_para_tagged = tag_sents_and_paras(body, sentence_length_lower_bound, sentence_length_upper_bound)
+    with instrumentation.stage("segmentation"):
+        sent_and_para_tagged = segmentation.render(body, sentence_length_lower_bound, sentence_length_upper_bound)
 
-    tags, locations = rel_extract(body, tags, locations)
+    header_matches = len(tags)
+    with instrumentation.stage("relation_extraction"):
+        tags, locations = rel_extract(body, tags, locations)
+    instrumentation.count("relation_matches", len(tags) - header_matches)
 
     # if we haven't found either a speaker or a location we can fall back on the backup-methods
     speaker_tagged = False
@@ -522,46 +797,24 @@ def tag_email(email_text):
             location_tagged = True
 
     if not speaker_tagged:
-        tags = find_names(body, tags)
-        tags = find_names(header, tags)
+        tags = find_names_in_texts([body, header], tags)
     if not location_tagged:
-        tags = find_locations(body, tags, locations)
-        tags = find_locations(header, tags, locations)
-
-    # tag all the information
-    info_tagged = tag_body(detokenize(sent_and_para_tagged), tags)
-
-    # put the tagged body back together
-    detokenised = ""
-    para_tokens = 0
-    count_tokens = 0
-    for token in info_tagged:
-        if token == "<sentence>":
-            previous_char = info_tagged[count_tokens - 1]
-            if previous_char == "." or previous_char == "!" or previous_char == "?":
-                detokenised += " " + token
-            else:
-                detokenised += "<paragraph>"
-                detokenised += token
-        elif token == "</sentence>":
-            if info_tagged[count_tokens + 2] == "<sentence>":
-                detokenised += token
-            else:
-                detokenised += token
-                detokenised += info_tagged[count_tokens + 1]
-                detokenised += "</paragraph>"
-                detokenised += "\n\n"
-                para_tokens = 2
-        elif para_tokens > 0:
-            detokenised += token
-            para_tokens -= 1
-        else:
-            detokenised += token
-        count_tokens += 1
+        found = len(tags)
+        '''
+        The header regexes and the relation extraction only learn a location when they tag it, so no location was
+        learned from this email, and the model's matcher already knows every location to look for.
+        '''
+        with instrumentation.stage("location_lookup"):
+            tags = find_locations(body, tags, model.location_matcher)
+            tags = find_locations(header, tags, model.location_matcher)
+        instrumentation.count("location_matches", len(tags) - found)
 
-    tagged_header = tag_header(header, tags)
+    with instrumentation.stage("insertion"):
+        # tag all the information
+        info_tagged = tag_body(sent_and_para_tagged, tags)
 
-    # put the email back together
-    together = tagged_header + detokenised
+        header_result = extract_header(header, tags)
+        body_result = extraction_result.ExtractionResult.from_markup(info_tagged)
 
-    return together
+        # put the email back together
+        return extraction_result.ExtractionResult.concatenate([header_result, body_result])
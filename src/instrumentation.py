@@ -0,0 +1,339 @@
+from collections import Counter
+from os.path import join
+import cProfile
+import hashlib
+import json
+import os
+import re
+import time
+
+try:
+    import pyinstrument
+except ImportError:
+    # pyinstrument is optional, only the cProfile profiler is available without it
+    pyinstrument = None
+
+
+# Set PIPELINE_STATS=1 to collect the stage times and counters, and PIPELINE_PROFILE to "cprofile" or "pyinstrument"
+# to also profile each email
+STATS_ENV_VAR = 'PIPELINE_STATS'
+PROFILE_ENV_VAR = 'PIPELINE_PROFILE'
+PROFILE_PATH = '../profiles'
+# How many hex digits of the hash of an email's path go in its profile's name
+PROFILE_HASH_LENGTH = 8
+PROFILERS = ["cprofile", "pyinstrument"]
+# The prefix of the metric names in the Prometheus text format
+METRIC_PREFIX = 'email_pipeline'
+PROMETHEUS_EXTENSIONS = ('.prom', '.txt')
+
+
+class StageTimer:
+    """
+    Accumulates the wall time spent in each stage of the pipeline, and counts of events such as cache hits.
+    Stages can be nested, e.g. wikification inside relation extraction. Each stage is only charged for its own
+    time, excluding the stages nested inside it, so the stage times add up to the total.
+    """
+
+    def __init__(self):
+        self.seconds = Counter()
+        self.calls = Counter()
+        self.counters = Counter()
+        # The running stages, innermost last, as [name, start time, time spent in nested stages]
+        self._running = []
+
+    def start(self, name):
+        """
+        :param name: The stage which is starting.
+        """
+        self._running.append([name, time.perf_counter(), 0.0])
+
+    def stop(self):
+        """
+        Stops the innermost running stage.
+        """
+        name, start, nested = self._running.pop()
+        elapsed = time.perf_counter() - start
+        self.seconds[name] += elapsed - nested
+        self.calls[name] += 1
+        if self._running:
+            self._running[-1][2] += elapsed
+
+    def count(self, name, amount=1):
+        """
+        :param name: The counter, e.g. "wiki_cache_hits".
+        :param amount: How much to add to it.
+        """
+        self.counters[name] += amount
+
+    def merge(self, stats):
+        """
+        Adds the stage times and counters from another timer, e.g. one from a worker process.
+        :param stats: The other timer's as_dict.
+        """
+        for name, stage_stats in stats["stages"].items():
+            self.seconds[name] += stage_stats["seconds"]
+            self.calls[name] += stage_stats["calls"]
+        self.counters.update(stats["counters"])
+
+    def as_dict(self):
+        """
+        :return: The seconds spent in, and number of calls to, each stage, and the value of each counter.
+        """
+        return {
+            "stages": {name: {"seconds": self.seconds[name], "calls": self.calls[name]}
+                       for name in sorted(self.seconds)},
+            "counters": {name: self.counters[name] for name in sorted(self.counters)}
+        }
+
+
+class _Stage:
+    """
+    Times a stage for the duration of a with block.
+    """
+
+    __slots__ = ("timer", "name")
+
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.timer.start(self.name)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.timer.stop()
+        return False
+
+
+class _NoStage:
+    """
+    Stands in for a stage when nothing is being timed.
+    """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_STAGE = _NoStage()
+
+# The timer the pipeline reports its stages to, None when nothing is being timed
+_timer = None
+_enabled = os.environ.get(STATS_ENV_VAR, "") not in ("", "0")
+_profiler = os.environ.get(PROFILE_ENV_VAR) or None
+_profile_path = PROFILE_PATH
+
+
+def stage(name):
+    """
+    Times a stage of the pipeline, e.g. with instrumentation.stage("ner"): ...
+    When no timer is set this returns a shared object which does nothing, so it costs almost nothing.
+    :param name: The stage name.
+    :return: A context manager.
+    """
+    if _timer is None:
+        return _NO_STAGE
+    return _Stage(_timer, name)
+
+
+def count(name, amount=1):
+    """
+    Adds to a counter, e.g. instrumentation.count("ner_calls"). Does nothing when no timer is set.
+    :param name: The counter.
+    :param amount: How much to add to it.
+    """
+    if _timer is not None:
+        _timer.counters[name] += amount
+
+
+def get_timer():
+    """
+    :return: The StageTimer being reported to, or None.
+    """
+    return _timer
+
+
+def set_timer(timer):
+    """
+    Starts reporting stages to a timer, or stops timing.
+    :param timer: The StageTimer to report to, or None.
+    """
+    global _timer
+    _timer = timer
+
+
+def is_enabled():
+    """
+    :return: Whether the stage times and counters of each email are collected.
+    """
+    return _enabled
+
+
+def set_enabled(enabled):
+    """
+    Turns collecting the stage times and counters of each email on or off, overriding PIPELINE_STATS.
+    :param enabled: Whether to collect them.
+    """
+    global _enabled
+    _enabled = enabled
+
+
+def get_profiler():
+    """
+    :return: The profiler each email is profiled with, one of PROFILERS, or None.
+    """
+    return _profiler
+
+
+def get_profile_path():
+    """
+    :return: The directory the profiles are written to.
+    """
+    return _profile_path
+
+
+def set_profiler(profiler, profile_path=PROFILE_PATH):
+    """
+    Starts or stops profiling each email, overriding PIPELINE_PROFILE.
+    :param profiler: One of PROFILERS, or None to stop profiling.
+    :param profile_path: The directory the profiles are written to.
+    """
+    global _profiler, _profile_path
+    if profiler is not None and profiler not in PROFILERS:
+        raise ValueError(f'Unknown profiler {profiler!r}, expected one of {PROFILERS}')
+    if profiler == "pyinstrument" and pyinstrument is None:
+        raise ValueError("The pyinstrument profiler is not installed")
+    _profiler = profiler
+    _profile_path = profile_path
+
+
+class _Capture:
+    """
+    Collects the stats of one email, and profiles it if a profiler is set.
+    """
+
+    def __init__(self, name, enabled):
+        self.name = name
+        self.enabled = enabled
+        self.timer = None
+        self._profile = None
+        self._previous_timer = None
+
+    def __enter__(self):
+        if self.enabled:
+            self.timer = StageTimer()
+            self.timer.count("emails")
+            # Put back whatever was being timed before, e.g. the whole batch when tagging in one process
+            self._previous_timer = get_timer()
+            set_timer(self.timer)
+        if _profiler == "pyinstrument":
+            self._profile = pyinstrument.Profiler()
+            self._profile.start()
+        elif _profiler == "cprofile":
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._profile is not None:
+            self._write_profile()
+        if self.enabled:
+            set_timer(self._previous_timer)
+        return False
+
+    def _write_profile(self):
+        """
+        Stops the profiler and writes its profile next to the others, named after the email.
+        """
+        os.makedirs(_profile_path, exist_ok=True)
+        # Emails in different directories can have the same file name, so a short hash of the full path keeps their
+        # profiles apart
+        path_hash = hashlib.sha1(os.path.abspath(str(self.name)).encode("utf-8")).hexdigest()[:PROFILE_HASH_LENGTH]
+        file_name = re.sub(r'[^\w.-]', "_", os.path.basename(str(self.name))) + "-" + path_hash
+        if _profiler == "pyinstrument":
+            self._profile.stop()
+            with open(join(_profile_path, file_name + ".html"), "w") as profile_file:
+                profile_file.write(self._profile.output_html())
+        else:
+            self._profile.disable()
+            self._profile.dump_stats(join(_profile_path, file_name + ".prof"))
+
+    @property
+    def stats(self):
+        """
+        :return: The email's stage times and counters as from StageTimer.as_dict, or None if they weren't collected.
+        """
+        return None if self.timer is None else self.timer.as_dict()
+
+
+def capture(name, enabled=None):
+    """
+    Collects the stats of one email, e.g.
+        with instrumentation.capture(email_path) as captured:
+            ...
+        captured.stats
+    :param name: The email's name, which its profile is named after.
+    :param enabled: Whether to collect the stats, defaults to is_enabled().
+    :return: A context manager, whose stats are available after it exits.
+    """
+    return _Capture(name, _enabled if enabled is None else enabled)
+
+
+def to_json(stats):
+    """
+    :param stats: The stats from StageTimer.as_dict.
+    :return: The stats as JSON text.
+    """
+    return json.dumps(stats, indent=2)
+
+
+def _label(value):
+    """
+    :param value: A label value.
+    :return: The value escaped for the Prometheus text format.
+    """
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def to_prometheus(stats, prefix=METRIC_PREFIX):
+    """
+    Formats the stats in the Prometheus text exposition format, e.g. for the node exporter's textfile collector.
+    :param stats: The stats from StageTimer.as_dict.
+    :param prefix: The prefix of the metric names.
+    :return: The stats as Prometheus text.
+    """
+    lines = [
+        f'# HELP {prefix}_stage_seconds_total Time spent in each stage, excluding the stages nested inside it.',
+        f'# TYPE {prefix}_stage_seconds_total counter'
+    ]
+    for name, stage_stats in stats["stages"].items():
+        lines.append(f'{prefix}_stage_seconds_total{{stage="{_label(name)}"}} {stage_stats["seconds"]!r}')
+    lines += [
+        f'# HELP {prefix}_stage_calls_total Number of times each stage ran.',
+        f'# TYPE {prefix}_stage_calls_total counter'
+    ]
+    for name, stage_stats in stats["stages"].items():
+        lines.append(f'{prefix}_stage_calls_total{{stage="{_label(name)}"}} {stage_stats["calls"]}')
+    lines += [
+        f'# HELP {prefix}_events_total Number of times each counted event happened.',
+        f'# TYPE {prefix}_events_total counter'
+    ]
+    for name, value in stats["counters"].items():
+        lines.append(f'{prefix}_events_total{{event="{_label(name)}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+def write_stats(stats, path):
+    """
+    Writes the stats in the Prometheus text format if the path ends in .prom or .txt, otherwise as JSON.
+    :param stats: The stats from StageTimer.as_dict.
+    :param path: The file to write.
+    """
+    text = to_prometheus(stats) if path.endswith(PROMETHEUS_EXTENSIONS) else to_json(stats)
+    with open(path, "w") as stats_file:
+        stats_file.write(text)
@@ -0,0 +1,175 @@
+from email import policy
+from email.message import EmailMessage
+from email.parser import BytesParser
+from os.path import basename, dirname, isdir, isfile, join
+import argparse
+import mailbox
+import os
+import sys
+import tempfile
+import extraction_result
+import information_extraction
+
+
+EML_EXTENSION = '.eml'
+# Headers copied from the original message onto the tagged one in a tagged mbox
+KEPT_HEADERS = ["From", "To", "Cc", "Subject", "Date", "Message-ID"]
+
+PARSER = BytesParser(policy=policy.default)
+
+
+def is_maildir(path):
+    """
+    :param path: A directory.
+    :return: Whether the directory is a maildir, i.e. has cur, new and tmp subdirectories.
+    """
+    return all(isdir(join(path, subdirectory)) for subdirectory in ("cur", "new", "tmp"))
+
+
+def iter_messages(path):
+    """
+    Lazily parses the messages in an mbox file, a maildir, a directory of .eml files or a single .eml file.
+    Only one message is held in memory at a time, so archives of any size can be read.
+    :param path: The mailbox to read.
+    :return: A generator of (key, message) pairs, where the key identifies the message within the mailbox.
+    """
+    if isdir(path):
+        if is_maildir(path):
+            box = mailbox.Maildir(path, factory=None, create=False)
+            for key in box.iterkeys():
+                yield key, PARSER.parsebytes(box.get_bytes(key))
+        else:
+            for file in sorted(os.listdir(path)):
+                if file.endswith(EML_EXTENSION) and isfile(join(path, file)):
+                    with open(join(path, file), "rb") as eml_file:
+                        yield file, PARSER.parse(eml_file)
+    elif path.endswith(EML_EXTENSION):
+        with open(path, "rb") as eml_file:
+            yield os.path.basename(path), PARSER.parse(eml_file)
+    else:
+        # Opening an mbox only scans it for where each message starts, the messages are read one by one
+        box = mailbox.mbox(path, factory=None, create=False)
+        try:
+            for key in box.iterkeys():
+                yield key, PARSER.parsebytes(box.get_bytes(key))
+        finally:
+            box.close()
+
+
+def message_header(message):
+    """
+    Formats a message's header fields as text, one field per line, the way the extraction pipeline expects.
+    :param message: The parsed message.
+    :return: The header text.
+    """
+    return "".join(f'{name}: {value}\n' for name, value in message.items())
+
+
+def message_body(message):
+    """
+    Finds the plain text body of a message.
+    :param message: The parsed message.
+    :return: The body text, or an empty string if the message has no text part.
+    """
+    part = message.get_body(preferencelist=("plain", "html"))
+    if part is None:
+        return ""
+    try:
+        return part.get_content()
+    except (LookupError, UnicodeError):
+        # An unknown or wrong charset, fall back to decoding what we can
+        payload = part.get_payload(decode=True) or b""
+        return payload.decode("utf-8", errors="replace")
+
+
+def tag_messages(path, model):
+    """
+    Tags every message in a mailbox, handing the parsed header and body straight to the pipeline.
+    :param path: The mailbox to read.
+    :param model: The trained ExtractionModel to use.
+    :return: A generator of (key, message, ExtractionResult) tuples.
+    """
+    for key, message in iter_messages(path):
+        yield key, message, model.extract_parts(message_header(message), message_body(message))
+
+
+def write_jsonl(results, output):
+    """
+    Writes tagged messages as JSON Lines. Each line has the tagged message, and its plain text and entities.
+    :param results: The (key, message, ExtractionResult) tuples from tag_messages.
+    :param output: The open text file to write to.
+    :return: How many messages were written.
+    """
+    count = 0
+    for key, message, result in results:
+        record = {"id": key, "message_id": message.get("Message-ID"), "tagged": result.render()}
+        record.update(result.to_dict())
+        output.write(extraction_result.dumps(record) + "\n")
+        count += 1
+    return count
+
+
+def write_mbox(results, output_path):
+    """
+    Writes tagged messages to an mbox. Each message keeps the original's main headers, and its body is the
+    tagged email. Messages are added to a temporary mbox in the same directory as they are tagged, which then
+    replaces the output, so running again never appends a second copy of every message to an existing output.
+    :param results: The (key, message, ExtractionResult) tuples from tag_messages.
+    :param output_path: The mbox file to write to.
+    :return: How many messages were written.
+    """
+    count = 0
+    file_descriptor, temp_path = tempfile.mkstemp(dir=dirname(output_path) or ".", prefix="." + basename(output_path),
+                                                  suffix=".tmp")
+    os.close(file_descriptor)
+    try:
+        box = mailbox.mbox(temp_path)
+        try:
+            for key, message, result in results:
+                tagged_message = EmailMessage()
+                for name in KEPT_HEADERS:
+                    if message[name] is not None:
+                        tagged_message[name] = message[name]
+                tagged_message.set_content(result.render())
+                box.add(tagged_message)
+                count += 1
+        finally:
+            box.close()
+        os.replace(temp_path, output_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return count
+
+
+def main(argv=None):
+    """
+    Tags every message in a mailbox, writing a tagged mbox or JSON Lines.
+    :param argv: The command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Tag the seminar emails in an mbox, maildir or .eml files.")
+    parser.add_argument("input", help="an mbox file, a maildir, a directory of .eml files or a single .eml file")
+    parser.add_argument("output", help="the file to write to, or - for stdout")
+    parser.add_argument("--format", choices=["jsonl", "mbox"], default=None,
+                        help="the output format (default: jsonl for stdout and .jsonl files, otherwise mbox)")
+    args = parser.parse_args(argv)
+
+    output_format = args.format
+    if output_format is None:
+        output_format = "jsonl" if args.output == "-" or args.output.endswith(".jsonl") else "mbox"
+
+    model = information_extraction.get_default_model()
+    results = tag_messages(args.input, model)
+    if output_format == "mbox":
+        count = write_mbox(results, args.output)
+    elif args.output == "-":
+        count = write_jsonl(results, sys.stdout)
+    else:
+        with open(args.output, "w") as output:
+            count = write_jsonl(results, output)
+
+    print(f'Tagged {count} messages', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
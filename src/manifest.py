@@ -0,0 +1,93 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+
+# Kept next to the outputs it describes, so moving or deleting the output directory takes the manifest with it
+MANIFEST_NAME = '.manifest.sqlite3'
+
+
+def hash_text(text):
+    """
+    :param text: The contents of an input email.
+    :return: A hex digest of the contents.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class Manifest:
+    """
+    Records which input each output was made from, the hash of the input's contents and the fingerprint of the
+    model which tagged it. A re-run only needs to tag inputs which are new, have changed, or were tagged by a
+    different model.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The SQLite file the manifest is stored in.
+        """
+        self.path = path
+        self.directory = os.path.dirname(path) or "."
+        os.makedirs(self.directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30)
+        self._connection.execute("CREATE TABLE IF NOT EXISTS outputs "
+                                 "(output_path TEXT PRIMARY KEY, input_path TEXT NOT NULL, "
+                                 "content_hash TEXT NOT NULL, model_fingerprint TEXT NOT NULL, tagged REAL NOT NULL)")
+        self._connection.commit()
+
+    @classmethod
+    def for_directory(cls, output_dir):
+        """
+        :param output_dir: The directory the outputs are written to.
+        :return: The manifest for the directory.
+        """
+        return cls(os.path.join(output_dir, MANIFEST_NAME))
+
+    def _key(self, output_path):
+        """
+        Outputs are stored relative to the manifest, so the directory can be moved or reached by another path.
+        """
+        return os.path.relpath(output_path, self.directory)
+
+    def status(self, output_path, content_hash, model_fingerprint):
+        """
+        Decides whether an output needs to be (re)made.
+        :param output_path: Where the output is written.
+        :param content_hash: The hash of the input's current contents.
+        :param model_fingerprint: The fingerprint of the current model.
+        :return: "current" if the output is up to date, otherwise why it isn't: "new", "changed" or "stale" (made
+        by a different model).
+        """
+        row = self._connection.execute("SELECT content_hash, model_fingerprint FROM outputs WHERE output_path = ?",
+                                       (self._key(output_path),)).fetchone()
+        # An output which was deleted has to be made again, whatever the manifest says
+        if row is None or not os.path.isfile(output_path):
+            return "new"
+        if row[0] != content_hash:
+            return "changed"
+        if row[1] != model_fingerprint:
+            return "stale"
+        return "current"
+
+    def record(self, output_path, input_path, content_hash, model_fingerprint):
+        """
+        Records that an output has been made. Call this after the output has been written, so an interrupted run
+        never records an output which doesn't exist.
+        :param output_path: Where the output was written.
+        :param input_path: The input it was made from.
+        :param content_hash: The hash of the contents which were tagged.
+        :param model_fingerprint: The fingerprint of the model which tagged them.
+        """
+        self._connection.execute("INSERT OR REPLACE INTO outputs "
+                                 "(output_path, input_path, content_hash, model_fingerprint, tagged) "
+                                 "VALUES (?, ?, ?, ?, ?)",
+                                 (self._key(output_path), os.path.abspath(input_path), content_hash,
+                                  model_fingerprint, time.time()))
+        self._connection.commit()
+
+    def close(self):
+        """
+        Closes the SQLite store.
+        """
+        self._connection.close()
@@ -0,0 +1,384 @@
+import multiprocessing
+import multiprocessing.util
+import os
+import socket
+import subprocess
+import threading
+import time
+
+
+STANFORD_TAGGER_PATH = '../resources/stanford-ner.jar'
+STANFORD_TAGGER_DICTIONARY = '../resources/english.all.3class.distsim.crf.ser.gz'
+STANFORD_SERVER_CLASS = 'edu.stanford.nlp.ie.NERServer'
+JAVA_OPTIONS = ['-mx1000m']
+SERVER_STARTUP_TIMEOUT = 120
+SERVER_REQUEST_TIMEOUT = 60
+
+# NER_BACKEND picks the backend ("stanford" or "stub"). NER_SERVER=host:port reuses an already running NER server,
+# so e.g. every worker of a batch run can share one JVM.
+BACKEND_ENV_VAR = 'NER_BACKEND'
+SERVER_ENV_VAR = 'NER_SERVER'
+
+OUTSIDE_TAG = 'O'
+PERSON_TAG = 'PERSON'
+
+
+def _find_free_port():
+    """
+    Asks the OS for a port nothing is listening on.
+    :return: The port number.
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(('localhost', 0))
+        return probe.getsockname()[1]
+
+
+def _rechunk(tagged, token_lists):
+    """
+    Splits a flat list of tagged tokens back up to match the token lists that were sent.
+    :param tagged: A list of (token, tag) pairs covering every token list in order.
+    :param token_lists: The token lists that were tagged.
+    :return: One list of (token, tag) pairs per token list.
+    """
+    chunks = []
+    position = 0
+    for tokens in token_lists:
+        chunk = tagged[position:position + len(tokens)]
+        # Fall back to the original tokens if the server split or merged any, so callers always get one tag per token
+        if len(chunk) < len(tokens):
+            chunk = chunk + [(token, OUTSIDE_TAG) for token in tokens[len(chunk):]]
+        chunks.append([(token, tag) for token, (_, tag) in zip(tokens, chunk)])
+        position += len(tokens)
+    return chunks
+
+
+class StanfordNERServerBackend:
+    """
+    Keeps a single Stanford NER server JVM running and sends it batches of token lists over a socket,
+    instead of starting a new JVM for every call.
+    """
+
+    def __init__(self, jar_path=STANFORD_TAGGER_PATH, model_path=STANFORD_TAGGER_DICTIONARY, host='localhost',
+                 port=None, java_options=None, shared_server=None):
+        """
+        :param jar_path: The Stanford NER jar.
+        :param model_path: The serialized CRF classifier.
+        :param host: The host of the server.
+        :param port: The port of an already running server. If None, a server is started on first use.
+        :param java_options: Extra options for the JVM, e.g. the heap size.
+        :param shared_server: A SharedServer to ask for the server on first use, rather than starting one.
+        """
+        self.jar_path = jar_path
+        self.model_path = model_path
+        self.host = host
+        self.port = port
+        self.java_options = JAVA_OPTIONS if java_options is None else java_options
+        self.shared_server = shared_server
+        self._process = None
+        self._owner_pid = None
+
+    def start(self):
+        """
+        Starts the NER server if it isn't running, and waits until it accepts connections.
+        """
+        if self.port is None and self.shared_server is not None:
+            address = self.shared_server.address()
+            # If the process sharing the server couldn't start it, try starting one here instead
+            self.shared_server = None
+            if address is not None:
+                self.host, self.port = parse_address(address)
+                return
+
+        if self.port is not None:
+            # Either an external server, a server started by the parent of a forked worker, or our own live server
+            if self._process is None or self._owner_pid != os.getpid() or self._process.poll() is None:
+                return
+
+        self.port = _find_free_port()
+        command = ['java'] + list(self.java_options) + [
+            '-cp', self.jar_path, STANFORD_SERVER_CLASS,
+            '-loadClassifier', self.model_path,
+            '-port', str(self.port),
+            '-outputFormat', 'slashTags',
+            '-tokenizerFactory', 'edu.stanford.nlp.process.WhitespaceTokenizer',
+            '-tokenizerOptions', 'tokenizeNLs=false'
+        ]
+        self._process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self._owner_pid = os.getpid()
+
+        # Loading the classifier takes a few seconds, so poll until the server is listening
+        deadline = time.monotonic() + SERVER_STARTUP_TIMEOUT
+        while True:
+            if self._process.poll() is not None:
+                raise RuntimeError(f'Stanford NER server exited with code {self._process.returncode}')
+            try:
+                with socket.create_connection((self.host, self.port), timeout=1):
+                    return
+            except OSError:
+                if time.monotonic() > deadline:
+                    self.close()
+                    raise RuntimeError('Timed out waiting for the Stanford NER server to start')
+                time.sleep(0.2)
+
+    def tag_sents(self, token_lists):
+        """
+        Tags many token lists in a single request.
+        :param token_lists: A list of token lists, e.g. one per email.
+        :return: One list of (token, tag) pairs per token list.
+        """
+        token_lists = [[token for token in tokens if token.strip()] for tokens in token_lists]
+        if not any(token_lists):
+            return [[] for _ in token_lists]
+        self.start()
+
+        '''
+        The server classifies one line per connection, so the whole batch is sent as a single line.
+        Tokens never contain whitespace as they come from the word tokenizer.
+        '''
+        request = " ".join(token for tokens in token_lists for token in tokens) + "\n"
+        with socket.create_connection((self.host, self.port), timeout=SERVER_REQUEST_TIMEOUT) as connection:
+            connection.sendall(request.encode('utf-8'))
+            connection.shutdown(socket.SHUT_WR)
+            response = b""
+            while True:
+                received = connection.recv(65536)
+                if not received:
+                    break
+                response += received
+
+        tagged = []
+        for word_and_tag in response.decode('utf-8').split():
+            # slashTags output is word/TAG, and the word itself may contain slashes
+            word, _, tag = word_and_tag.rpartition('/')
+            tagged.append((word, tag))
+
+        return _rechunk(tagged, token_lists)
+
+    def tag(self, tokens):
+        """
+        Tags a single token list.
+        :param tokens: The tokens to tag.
+        :return: A list of (token, tag) pairs.
+        """
+        return self.tag_sents([tokens])[0]
+
+    def close(self):
+        """
+        Stops the server, if this process started it.
+        """
+        if self._process is not None and self._owner_pid == os.getpid():
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._process = None
+
+
+class StubNERBackend:
+    """
+    Pure-Python stand-in for the Stanford tagger, so the pipeline runs without Java.
+    Tags tokens as PERSON if they are in a given list of names.
+    """
+
+    def __init__(self, person_names=()):
+        """
+        :param person_names: Tokens which should be tagged as a person.
+        """
+        self.person_names = frozenset(person_names)
+
+    def tag_sents(self, token_lists):
+        """
+        Tags many token lists.
+        :param token_lists: A list of token lists.
+        :return: One list of (token, tag) pairs per token list.
+        """
+        return [[(token, PERSON_TAG if token in self.person_names else OUTSIDE_TAG) for token in tokens if token.strip()]
+                for tokens in token_lists]
+
+    def tag(self, tokens):
+        """
+        Tags a single token list.
+        :param tokens: The tokens to tag.
+        :return: A list of (token, tag) pairs.
+        """
+        return self.tag_sents([tokens])[0]
+
+    def close(self):
+        """
+        Nothing to release, but keeps the interface the same as the server backend.
+        """
+
+
+class SharedServer:
+    """
+    Starts the shared backend's server in this process the first time a worker process asks for it, rather than up
+    front, so a batch in which every speaker is found without NER never starts a JVM.
+    Pass it to the workers, which connect to it with connect_to_server.
+    """
+
+    def __init__(self, backend):
+        """
+        :param backend: The StanfordNERServerBackend whose server is shared.
+        """
+        self.host = backend.host
+        self._wanted = multiprocessing.Event()
+        self._ready = multiprocessing.Event()
+        # The port of the server once it has started, or -1 if it couldn't be started
+        self._port = multiprocessing.Value('i', 0)
+        self._closing = False
+        self.error = None
+        self._thread = threading.Thread(target=self._serve, args=(backend,), daemon=True)
+        self._thread.start()
+
+    def __getstate__(self):
+        # Only the events and the port are passed on to the workers
+        return {"host": self.host, "_wanted": self._wanted, "_ready": self._ready, "_port": self._port}
+
+    def _serve(self, backend):
+        """
+        Waits in a thread of this process until a worker wants the server, then starts it.
+        """
+        self._wanted.wait()
+        if self._closing:
+            return
+        try:
+            backend.start()
+            self._port.value = backend.port
+        except (OSError, RuntimeError) as error:
+            self.error = error
+            self._port.value = -1
+        self._ready.set()
+
+    def address(self):
+        """
+        Asks for the server, in a worker process, and waits until it has started.
+        :return: The server's address as host:port, or None if it couldn't be started.
+        """
+        self._wanted.set()
+        self._ready.wait()
+        if self._port.value < 0:
+            return None
+        return f'{self.host}:{self._port.value}'
+
+    def close(self):
+        """
+        Stops waiting for the workers, in the process which shares the server. The server itself is stopped along
+        with the backend.
+        """
+        self._closing = True
+        self._wanted.set()
+        self._thread.join()
+
+
+_backend = None
+_shared_server = None
+
+
+def parse_address(address):
+    """
+    :param address: A server address, as host:port.
+    :return: The host and the port.
+    """
+    host, _, port = address.rpartition(':')
+    return host or 'localhost', int(port)
+
+
+def create_ner_backend(name=None):
+    """
+    Creates the NER backend named by the NER_BACKEND environment variable.
+    :param name: The backend to create, overriding the environment variable.
+    :return: The new backend.
+    """
+    if name is None:
+        name = os.environ.get(BACKEND_ENV_VAR, 'stanford')
+
+    if name == 'stub':
+        return StubNERBackend()
+    elif name == 'stanford':
+        server = os.environ.get(SERVER_ENV_VAR)
+        if server:
+            host, port = parse_address(server)
+            return StanfordNERServerBackend(host=host, port=port)
+        return StanfordNERServerBackend()
+    else:
+        raise ValueError(f'Unknown NER backend: {name}')
+
+
+def get_ner_backend():
+    """
+    Creates the shared backend the first time it is needed. The server is stopped when the process exits.
+    :return: The shared NER backend.
+    """
+    global _backend
+    if _backend is None:
+        _backend = create_ner_backend()
+        # Unlike atexit handlers, finalizers also run when a pool worker process exits
+        multiprocessing.util.Finalize(None, _backend.close, exitpriority=10)
+    return _backend
+
+
+def set_ner_backend(backend):
+    """
+    Replaces the shared backend, e.g. with a StubNERBackend.
+    :param backend: The backend to use.
+    """
+    global _backend
+    _backend = backend
+
+
+def start_shared_server():
+    """
+    Starts the shared backend's server in this process, so worker processes can connect to it rather than each
+    starting a JVM of their own, which would load the classifier once per worker.
+    :return: The server's address as host:port, or None if the backend doesn't use a server.
+    """
+    backend = get_ner_backend()
+    if not isinstance(backend, StanfordNERServerBackend):
+        return None
+    backend.start()
+    return f'{backend.host}:{backend.port}'
+
+
+def share_server():
+    """
+    Shares the shared backend's server with worker processes, starting it in this process only once a worker needs
+    it, rather than each worker starting a JVM of their own.
+    :return: What to pass to connect_to_server in the workers: a SharedServer, the address of a server which is
+    already running, or None if the backend doesn't use a server.
+    """
+    global _shared_server
+    backend = get_ner_backend()
+    if not isinstance(backend, StanfordNERServerBackend):
+        return None
+    if backend.port is not None:
+        return f'{backend.host}:{backend.port}'
+    if _shared_server is None:
+        _shared_server = SharedServer(backend)
+    return _shared_server
+
+
+def connect_to_server(server):
+    """
+    Makes the shared backend a client of a server started by another process, e.g. in a pool worker.
+    :param server: The address from start_shared_server, or what share_server returned. None keeps the backend as it
+    is.
+    """
+    if isinstance(server, SharedServer):
+        set_ner_backend(StanfordNERServerBackend(shared_server=server))
+    elif server is not None:
+        host, port = parse_address(server)
+        set_ner_backend(StanfordNERServerBackend(host=host, port=port))
+
+
+def close_ner_backend():
+    """
+    Stops the shared backend's server, if this process started it. The next use starts it again.
+    """
+    global _backend, _shared_server
+    if _shared_server is not None:
+        _shared_server.close()
+        _shared_server = None
+    if _backend is not None:
+        _backend.close()
+        _backend = None
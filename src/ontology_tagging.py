@@ -1,30 +1,36 @@
-from nltk.tag import DefaultTagger, UnigramTagger, BigramTagger, TrigramTagger
-from nltk.corpus import treebank
 from nltk.corpus import wordnet as wn
 from os.path import isfile, join
 from os import listdir
+from concurrent.futures import ProcessPoolExecutor
 from pprint import pprint
-import gensim.downloader as api
+import argparse
+import copy
+import functools
+import itertools
+import json
 import re
+import sys
+import time
 import nltk
+import numpy as np
 import os
+import ontology_tree
+import pos_taggers
+import similarity_cache
+import vocabulary
+import word_vectors
 
 
 TEST_PATH = '../test/untagged'
-COMMON_WORDS_PATH = '../resources/1-1000.txt'
-
-TRAINING_SENTS = treebank.tagged_sents()
-UNIGRAM = UnigramTagger(TRAINING_SENTS, backoff=DefaultTagger('NN'))
-BIGRAM = BigramTagger(TRAINING_SENTS, backoff=UNIGRAM)
-TRIGRAM = TrigramTagger(TRAINING_SENTS, backoff=BIGRAM)
-
-STOPWORDS = set(nltk.corpus.stopwords.words('english'))
-WORD_VECTORS = api.load("glove-wiki-gigaword-100")
-TEST_FILES = [f for f in listdir(TEST_PATH) if isfile(join(TEST_PATH, f))]
+# The emails whose words are kept when converting only a subset of the word vectors
+CORPUS_PATHS = [TEST_PATH, '../training/tagged']
 
 # Manual list of words to be considered "irrelevant"
 IRRELEVANT_WORDS = ["talk", "seminar", "lecture"]
 
+# How many levels of hyponyms the manual tree is extended by (any deeper and the classifications are too specific)
+EXTENSION_DEPTH = 2
+
 # manually created ontology tree, which is later extended
 TREE = {
     "science": {},
@@ -35,65 +41,94 @@ TREE = {
 
 # code to convert POS tags into the right form for lemmatization
 # https://stackoverflow.com/questions/25534214/nltk-wordnet-lemmatizer-shouldnt-it-lemmatize-all-inflections-of-a-word
+# The values are WordNet's ADJ, ADV, NOUN and VERB, written out so WordNet isn't loaded at import
 POS_TO_WORDNET = {
 
-    'JJ': wn.ADJ,
-    'JJR': wn.ADJ,
-    'JJS': wn.ADJ,
-    'RB': wn.ADV,
-    'RBR': wn.ADV,
-    'RBS': wn.ADV,
-    'NN': wn.NOUN,
-    'NNP': wn.NOUN,
-    'NNS': wn.NOUN,
-    'NNPS': wn.NOUN,
-    'VB': wn.VERB,
-    'VBG': wn.VERB,
-    'VBD': wn.VERB,
-    'VBN': wn.VERB,
-    'VBP': wn.VERB,
-    'VBZ': wn.VERB,
+    'JJ': 'a',
+    'JJR': 'a',
+    'JJS': 'a',
+    'RB': 'r',
+    'RBR': 'r',
+    'RBS': 'r',
+    'NN': 'n',
+    'NNP': 'n',
+    'NNS': 'n',
+    'NNPS': 'n',
+    'VB': 'v',
+    'VBG': 'v',
+    'VBD': 'v',
+    'VBN': 'v',
+    'VBP': 'v',
+    'VBZ': 'v',
 
 }
 
+# How many (word, POS) lemmas are remembered. The same pairs repeat across the emails, so almost every lemma is
+# found in the cache.
+LEMMA_CACHE_SIZE = 65536
+DIGIT_REGEX = re.compile(r'\d')
+
+_lemmatizer = None
+
 
 def read_common_words():
     """
-    Reads in the file containing the most common words.
-    :return: A list of the most common English words.
+    Reads in the file containing the most common words. The file is only read once.
+    :return: A set of the most common English words.
     """
-    most_common_words = []
-    with open(COMMON_WORDS_PATH, "r") as words_file:
-        for line in words_file.read():
-            most_common_words.append(line)
-
-    return most_common_words
+    return vocabulary.get_common_words()
 
 
-def retrieve_tags(text, common_words):
+def retrieve_tags(text, common_words=None):
     """
     Pulls all the tagged information from the email.
     :param text: The email text.
-    :param common_words: A list of the most common words.
+    :param common_words: The most common words. Defaults to the shared list, combined with the stopwords into a
+                         single set so each token is checked with one lookup.
     :return: The tagged information, with any of the common words removed.
     """
-    tokens = nltk.word_tokenize(text.lower())
-    tokens_stopwords_removed = [token for token in tokens if token not in STOPWORDS]
+    return retrieve_tags_batch([text], common_words)[0]
+
+
+def retrieve_tags_batch(texts, common_words=None):
+    """
+    Pulls all the tagged information from many emails, POS tagging all of them in one call.
+    :param texts: The email texts.
+    :param common_words: The most common words, as for retrieve_tags.
+    :return: A list of the tagged information of each email, with any of the common words removed.
+    """
+    if common_words is None:
+        filter_words = vocabulary.get_filter_words()
+    else:
+        filter_words = vocabulary.get_stopwords() | frozenset(common_words)
+
+    token_lists = []
+    for text in texts:
+        tokens = nltk.word_tokenize(text.lower())
+        token_lists.append([token for token in tokens if token not in filter_words])
+    return pos_taggers.get_trigram_tagger().tag_sents(token_lists)
 
-    relevant_words = [i for i in tokens_stopwords_removed if i not in common_words]
-    tagged = TRIGRAM.tag(relevant_words)
-    return tagged
+
+def __getattr__(name):
+    """
+    Keeps STOPWORDS available as a module attribute without loading it at import.
+    """
+    if name == "STOPWORDS":
+        return vocabulary.get_stopwords()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 def check_tree(text, current_tree):
     """
     Checks to see if any of the words in the tree are in the email.
     :param text: The email text.
-    :param current_tree: The tree of words to check.
+    :param current_tree: The tree of words to check, either nested dictionaries or an OntologyTree.
     :return: A list of any words which are in the tree and email.
     """
     words_acc = []
     lowered_email_text = text.lower()
+    if isinstance(current_tree, ontology_tree.OntologyTree):
+        return [word for word in current_tree.node_words() if word.lower() in lowered_email_text]
     for key in current_tree:
         if key.lower() in lowered_email_text:
             words_acc.append(key)
@@ -101,48 +136,101 @@ def check_tree(text, current_tree):
     return words_acc
 
 
+def get_lemmatizer():
+    """
+    Makes the lemmatizer the first time it is needed, rather than once per email.
+    :return: The shared WordNet lemmatizer.
+    """
+    global _lemmatizer
+    if _lemmatizer is None:
+        _lemmatizer = nltk.stem.wordnet.WordNetLemmatizer()
+    return _lemmatizer
+
+
+@functools.lru_cache(maxsize=LEMMA_CACHE_SIZE)
+def lemmatize(word, part_of_speech):
+    """
+    Lemmatizes a word, remembering the result.
+    :param word: The word.
+    :param part_of_speech: The WordNet part of speech, one of the values of POS_TO_WORDNET.
+    :return: The lowercase lemma.
+    """
+    return get_lemmatizer().lemmatize(word, pos=part_of_speech).lower()
+
+
 def get_lemmas(words):
     """
     Computes the lemmas of all words pulled from the email.
     :param words: The words (POS tagged) from the email.
     :return: A list of the words' lemmas.
     """
-    digit_regex = re.compile(r'\d')
-
-    lemmatizer = nltk.stem.wordnet.WordNetLemmatizer()
     lemmas = []
     for word in words:
-        try:
-            '''
-            The words have been POS tagged and are a tuple in the following form:
-            (word, POS TAG)
-               0       1
-            '''
-            part_of_speech = POS_TO_WORDNET[word[1]]
-            lemma = lemmatizer.lemmatize(word[0], pos=part_of_speech).lower()
-
-            if lemma not in IRRELEVANT_WORDS and digit_regex.search(lemma) is None:
-                lemmas.append(lemma)
-        except KeyError:
-            pass
+        '''
+        The words have been POS tagged and are a tuple in the following form:
+        (word, POS TAG)
+           0       1
+        '''
+        part_of_speech = POS_TO_WORDNET.get(word[1])
+        if part_of_speech is None:
+            continue
+        lemma = lemmatize(word[0], part_of_speech)
+
+        if lemma not in IRRELEVANT_WORDS and DIGIT_REGEX.search(lemma) is None:
+            lemmas.append(lemma)
 
     return lemmas
 
 
 def get_similarity(email_word, tree_word):
     """
-    Uses FastText to compute the similarity between two words.
+    Uses the pretrained word vectors to compute the similarity between two words.
+    The vectors are loaded the first time this is called.
     :param email_word: The word from the email to compare.
     :param tree_word: The word from the ontology tree to compare.
     :return: The similarity score of the two words.
     """
     try:
-        sim_score = WORD_VECTORS.similarity(email_word, tree_word)
+        sim_score = word_vectors.get_word_vectors().similarity(email_word, tree_word)
         return sim_score
     except KeyError:
         return 0
 
 
+_similarity_cache = None
+# The last tree of nested dictionaries classified against, and its flattened form
+_flattened_tree = None
+
+
+def get_similarity_cache(tree):
+    """
+    Gets the similarity cache for a tree, starting a new one if the tree or the word vectors have changed.
+    :param tree: The OntologyTree being classified against.
+    :return: The shared SimilarityCache.
+    """
+    global _similarity_cache
+    vectors = word_vectors.get_word_vectors()
+    if _similarity_cache is None or _similarity_cache.tree is not tree or _similarity_cache.vectors is not vectors:
+        _similarity_cache = similarity_cache.SimilarityCache(tree, vectors)
+    return _similarity_cache
+
+
+def as_ontology_tree(tree):
+    """
+    Flattens a tree of nested dictionaries, reusing the flattened tree while the same dictionary is passed, so its
+    similarity cache is kept between calls. The dictionary mustn't be changed once it has been classified against.
+    :param tree: Either nested dictionaries or an OntologyTree.
+    :return: The OntologyTree.
+    """
+    global _flattened_tree
+    if isinstance(tree, ontology_tree.OntologyTree):
+        return tree
+    # The dictionary itself is kept, so it can't be freed and another one given its id
+    if _flattened_tree is None or _flattened_tree[0] is not tree:
+        _flattened_tree = (tree, ontology_tree.OntologyTree.from_nested(tree))
+    return _flattened_tree[1]
+
+
 def extend_tree(current_tree, count_depth):
     """
     Finds hyponyms and uses them to extend the ontology tree.
@@ -185,53 +273,115 @@ def extend_tree(current_tree, count_depth):
     return current_tree
 
 
+def wordnet_version():
+    """
+    Identifies the installed WordNet without loading it, as wn.get_version() reads the whole corpus.
+    :return: The NLTK version, with the name, size and modification time of each WordNet data file.
+    """
+    # Looked up the same way as the corpus reader does, which prefers the zip file
+    try:
+        location = nltk.data.find("corpora/wordnet.zip/wordnet/")
+    except LookupError:
+        location = nltk.data.find("corpora/wordnet")
+    if isinstance(location, nltk.data.ZipFilePathPointer):
+        paths = [location.zipfile.filename]
+    else:
+        paths = sorted(join(location.path, file) for file in listdir(location.path))
+    files = []
+    for path in paths:
+        stat = os.stat(path)
+        files.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return json.dumps([nltk.__version__, files])
+
+
+def load_extended_tree(tree=TREE, depth=EXTENSION_DEPTH, path=ontology_tree.ONTOLOGY_TREE_PATH):
+    """
+    Loads the extended tree saved by a previous run, or extends the tree with WordNet and saves it.
+    The saved tree is rebuilt automatically if the manual tree, the depth or the WordNet data changes.
+    :param tree: The manually created tree.
+    :param depth: How many levels to extend the tree by.
+    :param path: Where the extended tree is saved.
+    :return: The extended tree as an OntologyTree.
+    """
+    fingerprint = ontology_tree.fingerprint_tree(tree, depth, wordnet_version())
+    extended = ontology_tree.OntologyTree.load(path, fingerprint)
+    if extended is None:
+        # extend_tree works in place, and the manual tree must stay as it is for the fingerprint
+        extended = ontology_tree.OntologyTree.from_nested(extend_tree(copy.deepcopy(tree), depth), fingerprint)
+        try:
+            extended.save(path)
+        except OSError:
+            # Not being able to save just means extending the tree again next time
+            pass
+    return extended
+
+
 def classify_email(text, tree):
     """
     Classifies an email according to the ontology tree.
     :param text: The email text.
-    :param tree: The tree to be used for classification.
+    :param tree: The tree to be used for classification, either nested dictionaries or an OntologyTree.
     :return: The classification of the email.
     """
-    common_words = read_common_words()
-    words = retrieve_tags(text, common_words)
+    return classify_emails([text], tree)[0]
+
+
+def classify_emails(texts, tree):
+    """
+    Classifies many emails according to the ontology tree, POS tagging all of them in one call.
+    :param texts: The email texts.
+    :param tree: The tree to be used for classification, either nested dictionaries or an OntologyTree.
+    :return: A list of the classification of each email.
+    """
+    tree = as_ontology_tree(tree)
+    texts = list(texts)
+    return [classify_tagged(text, words, tree) for text, words in zip(texts, retrieve_tags_batch(texts))]
+
 
+def classify_tagged(text, words, tree):
+    """
+    Classifies an email whose words have already been POS tagged.
+    :param text: The email text.
+    :param words: The POS tagged words from retrieve_tags.
+    :param tree: The OntologyTree to be used for classification.
+    :return: The classification of the email.
+    """
     lemmas = get_lemmas(words)
     lemmas.extend(check_tree(text, tree))
 
+    # The node vectors are precomputed, and the similarities are memoized across emails
+    cache = get_similarity_cache(tree)
+    lemma_ids, lemma_counts = cache.count_lemmas(lemmas)
+
     # loop until the best tag is found
     classified = False
     tree_acc = []
     saved_sim_score = 0
+    node = ontology_tree.ROOT
     while not classified:
         # get the highest average similarity score of each node in the next level of the tree
-        best_key = ""
+        best_child = None
         highest_sim_score = 0
-        for key in tree:
-            num_lemmas = len(lemmas)
+        children = tree.children(node)
 
-            # Avoid ZeroDivisionError
-            if num_lemmas > 0:
-                sim_acc = 0
-                for lemma in lemmas:
-                    sim_acc += get_similarity(lemma, key)
+        # Avoid ZeroDivisionError
+        if len(lemmas) > 0 and len(children) > 0:
+            sim_avgs = cache.average_similarities(lemma_ids, lemma_counts, node, len(lemmas))
 
-                sim_avg = sim_acc / num_lemmas
-            else:
-                sim_avg = 0
-
-            # if the average of this route is higher, then we plan to follow this route
-            if sim_avg > highest_sim_score:
-                best_key = key
-                highest_sim_score = sim_avg
+            # if the average of a route is higher, then we plan to follow this route. Ties go to the first child.
+            best_index = int(np.argmax(sim_avgs))
+            if sim_avgs[best_index] > highest_sim_score:
+                best_child = children[best_index]
+                highest_sim_score = float(sim_avgs[best_index])
 
         # if the current tag has a higher score then we don't proceed
         if highest_sim_score > saved_sim_score:
-            if best_key != "":
-                tree = tree[best_key]
-                if len(tree) == 0:
+            if best_child is not None:
+                node = best_child
+                if tree.is_leaf(node):
                     classified = True
                 else:
-                    tree_acc.append(best_key)
+                    tree_acc.append(tree.word(node))
                     saved_sim_score = highest_sim_score
             else:
                 classified = True
@@ -241,16 +391,154 @@ def classify_email(text, tree):
     return tree_acc
 
 
-# extend the tree
-extended_tree = extend_tree(TREE, 2)
-pprint(extended_tree)
+def ontology_vocabulary(corpus_paths=CORPUS_PATHS):
+    """
+    Finds every word the classifier could look up a vector for: the words in the extended tree, and the words
+    (and their base forms) in the email corpora.
+    :param corpus_paths: Directories of emails.
+    :return: A set of words.
+    """
+    words = set(load_extended_tree().vocab)
+    for path in corpus_paths:
+        for file in listdir(path):
+            if isfile(join(path, file)):
+                with open(join(path, file), "r") as email_file:
+                    tokens = nltk.word_tokenize(email_file.read().lower())
+                for token in tokens:
+                    words.add(token)
+                    # The classifier lemmatizes with the word's part of speech, so keep the base form for each of
+                    # them. The lemmatizer picks the shortest of WordNet's lemmas where morphy returns the first.
+                    for part_of_speech in (wn.NOUN, wn.VERB, wn.ADJ, wn.ADV):
+                        base_form = wn.morphy(token, part_of_speech)
+                        if base_form is not None:
+                            words.add(base_form)
+                        words.add(lemmatize(token, part_of_speech))
+    return words
+
+
+# The extended tree each worker process loads once, and then uses for every email it is given
+_worker_tree = None
+
+
+def init_classifier_worker(tree=None):
+    """
+    Keeps the extended tree and opens the word vectors once per worker process.
+    The vectors were saved by the parent, so this is just memory-mapping them, and their pages are shared by all the
+    workers through the OS page cache.
+    :param tree: The extended tree loaded by the parent, or None to load it.
+    """
+    global _worker_tree
+    _worker_tree = load_extended_tree() if tree is None else tree
+    word_vectors.get_word_vectors()
+
+
+def classify_chunk(items):
+    """
+    Classifies a chunk of emails in a worker, POS tagging the whole chunk at once.
+    :param items: A list of (id, path, text) tuples, where either the path or the text is None.
+    :return: A list of the results, as dictionaries of each email's id and its classification.
+    """
+    texts = []
+    for email_id, path, text in items:
+        if text is None:
+            with open(path, "r") as email_file:
+                text = email_file.read()
+        texts.append(text)
+    classifications = classify_emails(texts, _worker_tree)
+    return [{"id": item[0], "classification": classification} for item, classification in zip(items, classifications)]
+
+
+def list_items(paths_or_texts):
+    """
+    Turns the input of classify_batch into work items. Only paths are sent to the workers, which read the emails.
+    :param paths_or_texts: Paths of email files or directories of them, or the text of emails.
+    :return: A generator of (id, path, text) tuples.
+    """
+    for index, path_or_text in enumerate(paths_or_texts):
+        if os.path.isdir(path_or_text):
+            for file in sorted(listdir(path_or_text)):
+                if isfile(join(path_or_text, file)):
+                    yield join(path_or_text, file), join(path_or_text, file), None
+        elif isfile(path_or_text):
+            yield path_or_text, path_or_text, None
+        else:
+            yield index, None, path_or_text
+
+
+def chunk_items(items, chunksize):
+    """
+    :param items: The work items.
+    :param chunksize: How many items to put in each chunk.
+    :return: A generator of lists of up to chunksize items.
+    """
+    items = iter(items)
+    chunk = list(itertools.islice(items, chunksize))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(items, chunksize))
+
+
+def classify_batch(paths_or_texts, workers=None, chunksize=8):
+    """
+    Classifies many emails over a pool of worker processes, yielding results in input order as they are ready.
+    :param paths_or_texts: Paths of email files or directories of them, or the text of emails.
+    :param workers: How many worker processes to use. Defaults to the number of CPUs, and 1 classifies in this
+                    process.
+    :param chunksize: How many emails to send to a worker at once, which are POS tagged together.
+    :return: A generator of dictionaries of each email's id and classification.
+    """
+    if workers is None:
+        workers = os.cpu_count()
+
+    # Load the tree and convert the vectors here first, so the workers are given the tree and only map the vectors
+    tree = load_extended_tree()
+    word_vectors.get_word_vectors()
+
+    chunks = chunk_items(list_items(paths_or_texts), chunksize)
+    if workers <= 1:
+        init_classifier_worker(tree)
+        for results in map(classify_chunk, chunks):
+            yield from results
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_classifier_worker, initargs=(tree,)) as executor:
+        for results in executor.map(classify_chunk, chunks):
+            yield from results
+
+
+def main(argv=None):
+    """
+    Classifies emails and writes the results as JSON Lines, reporting the throughput at the end.
+    :param argv: The command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Classify seminar emails against the ontology tree.")
+    parser.add_argument("inputs", nargs="*", default=[TEST_PATH], help="email files or directories of them "
+                                                                       "(default: the test emails)")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("-o", "--output", default=None, help="file to write the results to (default: stdout)")
+    parser.add_argument("--print-tree", action="store_true", help="print the extended tree first")
+    args = parser.parse_args(argv)
+
+    if args.print_tree:
+        # extend the tree, or load it if it has already been extended
+        pprint(load_extended_tree().to_nested(), stream=sys.stderr)
+
+    output = sys.stdout if args.output is None else open(args.output, "w")
+    start = time.perf_counter()
+    count = 0
+    try:
+        for result in classify_batch(args.inputs, args.workers):
+            output.write(json.dumps(result) + "\n")
+            count += 1
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0
+    print(f'Classified {count} emails in {elapsed:.2f} s ({rate:.1f} emails/s)', file=sys.stderr)
 
-# loops though each email and appropriately classifies it
-for file in TEST_FILES:
-    file_path = os.path.join(TEST_PATH, file)
-    with open(file_path) as email_file:
-        file_text = email_file.read()
-        classification = classify_email(file_text, extended_tree)
 
-        print(file)
-        print(str(classification))
+if __name__ == '__main__':
+    main()
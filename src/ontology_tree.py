@@ -0,0 +1,160 @@
+from collections import deque
+import hashlib
+import json
+import os
+import numpy as np
+
+
+ONTOLOGY_TREE_PATH = '../cache/ontology_tree.npz'
+# Bump whenever the on-disk layout changes, so old trees are rebuilt
+FORMAT_VERSION = 1
+ROOT = 0
+
+
+def fingerprint_tree(tree, depth, wordnet_version):
+    """
+    Hashes everything the extended tree is built from.
+    :param tree: The manually created seed tree, before it is extended.
+    :param depth: How many levels the tree is extended by.
+    :param wordnet_version: Identifies the WordNet data the hyponyms come from.
+    :return: A hex digest which changes whenever the extended tree could.
+    """
+    # Key order decides ties when classifying, so it is part of the fingerprint
+    seed = json.dumps(tree, ensure_ascii=False)
+    return hashlib.sha256(f'{FORMAT_VERSION}\0{depth}\0{wordnet_version}\0{seed}'.encode("utf-8")).hexdigest()
+
+
+class OntologyTree:
+    """
+    The ontology tree as a flat node table instead of nested dictionaries.
+    Nodes are numbered breadth first from a root (node 0) which has no word, so the children of every node are
+    numbered consecutively and each level can be scored from one contiguous slice.
+    """
+
+    def __init__(self, vocab, word_ids, parents, first_child, child_count, fingerprint=""):
+        """
+        :param vocab: The distinct words in the tree.
+        :param word_ids: For each node, the index of its word in vocab (-1 for the root).
+        :param parents: For each node, the index of its parent (-1 for the root).
+        :param first_child: For each node, the index of its first child.
+        :param child_count: For each node, how many children it has.
+        :param fingerprint: The fingerprint of what the tree was built from.
+        """
+        self.vocab = list(vocab)
+        self.word_ids = np.asarray(word_ids, dtype=np.int32)
+        self.parents = np.asarray(parents, dtype=np.int32)
+        self.first_child = np.asarray(first_child, dtype=np.int32)
+        self.child_count = np.asarray(child_count, dtype=np.int32)
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_nested(cls, tree, fingerprint=""):
+        """
+        Flattens a tree of nested dictionaries, e.g. {"science": {"chemistry": {}}}.
+        :param tree: The nested tree.
+        :param fingerprint: The fingerprint of what the tree was built from.
+        :return: The flattened tree.
+        """
+        vocab = []
+        vocab_ids = {}
+        word_ids = [-1]
+        parents = [-1]
+        first_child = [0]
+        child_count = [0]
+
+        queue = deque([(ROOT, tree)])
+        while queue:
+            node, subtree = queue.popleft()
+            first_child[node] = len(word_ids)
+            child_count[node] = len(subtree)
+            for word in subtree:
+                if word not in vocab_ids:
+                    vocab_ids[word] = len(vocab)
+                    vocab.append(word)
+                child = len(word_ids)
+                word_ids.append(vocab_ids[word])
+                parents.append(node)
+                first_child.append(0)
+                child_count.append(0)
+                queue.append((child, subtree[word]))
+
+        return cls(vocab, word_ids, parents, first_child, child_count, fingerprint)
+
+    def __len__(self):
+        return len(self.word_ids)
+
+    def word(self, node):
+        """
+        :param node: The node index.
+        :return: The node's word.
+        """
+        return self.vocab[self.word_ids[node]]
+
+    def children(self, node):
+        """
+        :param node: The node index.
+        :return: A range over the indices of the node's children.
+        """
+        start = int(self.first_child[node])
+        return range(start, start + int(self.child_count[node]))
+
+    def is_leaf(self, node):
+        """
+        :param node: The node index.
+        :return: Whether the node has no children.
+        """
+        return self.child_count[node] == 0
+
+    def node_words(self):
+        """
+        :return: The word of every node except the root, in node order.
+        """
+        return [self.vocab[word_id] for word_id in self.word_ids[1:]]
+
+    def to_nested(self, node=ROOT):
+        """
+        Rebuilds the nested dictionary form, e.g. for printing.
+        :param node: The node to start from.
+        :return: The nested tree below the node.
+        """
+        return {self.word(child): self.to_nested(child) for child in self.children(node)}
+
+    def save(self, path=ONTOLOGY_TREE_PATH):
+        """
+        Saves the node table, writing to a temporary file first so other processes never load half of it.
+        :param path: Where to save the tree.
+        """
+        tree_dir = os.path.dirname(path)
+        if tree_dir:
+            os.makedirs(tree_dir, exist_ok=True)
+        temp_path = f'{path}.{os.getpid()}.tmp'
+        with open(temp_path, "wb") as tree_file:
+            np.savez(tree_file,
+                     format_version=np.array(FORMAT_VERSION),
+                     fingerprint=np.array(self.fingerprint),
+                     vocab=np.array(self.vocab, dtype=str),
+                     word_ids=self.word_ids,
+                     parents=self.parents,
+                     first_child=self.first_child,
+                     child_count=self.child_count)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path=ONTOLOGY_TREE_PATH, fingerprint=None):
+        """
+        Loads a saved node table.
+        :param path: Where the tree is saved.
+        :param fingerprint: If given, only load a tree built from matching inputs.
+        :return: The tree, or None if there is no usable tree at the path.
+        """
+        try:
+            with np.load(path) as arrays:
+                if int(arrays["format_version"]) != FORMAT_VERSION:
+                    return None
+                saved_fingerprint = str(arrays["fingerprint"])
+                if fingerprint is not None and saved_fingerprint != fingerprint:
+                    return None
+                return cls(arrays["vocab"].tolist(), arrays["word_ids"], arrays["parents"], arrays["first_child"],
+                           arrays["child_count"], saved_fingerprint)
+        except (OSError, ValueError, KeyError):
+            return None
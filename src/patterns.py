@@ -0,0 +1,135 @@
+import re
+import tag_markup
+
+
+# Every regular expression used by information_extraction, compiled once when the module is imported.
+#
+# The venue patterns used to start with a greedy ".*" and were passed straight to re.search, which retries the match
+# from every character of the body and backtracks over the rest of the line each time, i.e. quadratic in the line
+# length. They are now anchored to the start of a line with "^" and re.M. This finds exactly the same match, because
+# the leftmost place the original could match from is always the start of a line, but each line is only tried once.
+
+# Header fields
+HEADER_TIME = re.compile(r'Times?:\s*(.*)\n', flags=re.I)
+HEADER_PLACE = re.compile(r'Places?:\s*(.*)\n|Locations?:\s*(.*)\n', flags=re.I)
+HEADER_SPEAKER = re.compile(r'Who:\s*([^,\n]*)(\n\s*(.*))?|Speakers?:\s*([^,\n]*)(\n\s*(.*))?', flags=re.I)
+# Splits a time such as "1:00 - 2:00" into the start and end time
+TIME_RANGE = re.compile(r'(.*?)\s?([-,;]|until|up\sto)\s?(.*)')
+
+
+class SpeakerPattern:
+    """
+    Finds a speaker from the verb which follows their name, e.g. "Dr Smith will present".
+    Searching for the whole pattern would try the optional name and university in front of the verb from every
+    position in the body. Instead each occurrence of the verb is found first, and if the rest of the sentence matches
+    from there, the pattern is only tried from the positions close enough before it for the name and university to
+    fit, which are bounded in length.
+    """
+
+    def __init__(self, verb, tail, pattern, lookback, full_stop=False):
+        """
+        :param verb: The compiled pattern of the start of the verb, which every match of the full pattern contains.
+        :param tail: The compiled pattern of the full pattern from the verb on.
+        :param pattern: The full compiled pattern, with bounded repetition in front of the verb.
+        :param lookback: The most characters the full pattern can match in front of the verb.
+        :param full_stop: Whether the pattern ends at the first full stop after the verb.
+        """
+        self.verb = verb
+        self.tail = tail
+        self.pattern = pattern
+        self.lookback = lookback
+        self.full_stop = full_stop
+
+    def search(self, text):
+        """
+        :param text: The text to search.
+        :return: The leftmost match of the full pattern, or None.
+        """
+        end = len(text)
+        full_stop = -1
+        for verb in self.verb.finditer(text):
+            if self.full_stop:
+                # The rest of the match is never tried past the end of the sentence, which is found once per sentence
+                if full_stop < verb.end():
+                    full_stop = text.find(".", verb.end())
+                    if full_stop == -1:
+                        return None
+                end = full_stop + 1
+            if self.tail.match(text, verb.start(), end) is None:
+                continue
+            for start in range(max(0, verb.start() - self.lookback), verb.start() + 1):
+                match = self.pattern.match(text, start, end)
+                if match is not None:
+                    return match
+        return None
+
+
+# Relation extraction on the body, e.g. "Dr Smith will present on ..."
+SPEAKER_VERB = re.compile(r'(will|is\sgoing\sto)\s*(present|speak|talk|lecture|deliver)', flags=re.I)
+# The name is up to two words, optionally followed by the university, e.g. "John Smith from the University of Leeds"
+_WORD = r'\w{0,30}'
+_SPACE = r'\s{0,20}'
+_SPEAKER_NAME = (rf'(({_WORD}{_SPACE})?{_WORD})({_SPACE}from{_SPACE}((the)?{_SPACE}university{_SPACE}of{_SPACE}'
+                 rf'{_WORD}|{_WORD}{_SPACE}university))?{_SPACE}')
+# The longest name and university the bounded repetition allows
+SPEAKER_LOOKBACK = 3 * 30 + 8 * 20 + len("from") + len("the") + len("university") + len("of")
+_SPEAKER_ACTION = (r'(will|is\sgoing\sto)\s*(present|speak|talk|lecture|deliver\s*a\s*(guest\s*)?(lecture|talk|'
+                   r'presentation)?)')
+_SPEAKER_TOPIC = r'\s*(on\s*the\s*topic|in|about|on)\s*([^.\n]*)\.'
+_SPEAKER_RE = re.compile(_SPEAKER_NAME + _SPEAKER_ACTION, flags=re.I)
+_SPEAKER_WITH_TOPIC_RE = re.compile(_SPEAKER_NAME + _SPEAKER_ACTION + _SPEAKER_TOPIC, flags=re.I)
+SPEAKER_WITH_TOPIC = SpeakerPattern(SPEAKER_VERB, re.compile(_SPEAKER_ACTION + _SPEAKER_TOPIC, flags=re.I),
+                                    _SPEAKER_WITH_TOPIC_RE, SPEAKER_LOOKBACK, full_stop=True)
+SPEAKER = SpeakerPattern(SPEAKER_VERB, re.compile(_SPEAKER_ACTION, flags=re.I), _SPEAKER_RE, SPEAKER_LOOKBACK)
+# "The seminar will be held in <location> at <time> on <date>"
+VENUE_AT_ON = re.compile(
+    r'^.*\sThe\s(seminar|lecture|talk|presentation)\s(will|is going to)\s(be\s(held\s)?in|hosted in)\s(.*)\sat\s('
+    r'.*)\son\s([^!\.]*)',
+    flags=re.I | re.M)
+# "The seminar will be held in <location> on <date> at <time>"
+VENUE_ON_AT = re.compile(
+    r'^.*\sThe\s(seminar|lecture|talk|presentation)\s(will|is going to)\s(be\s(held\s)?in|hosted in)\s('
+    r'.*)\son\s(.*)\sat\s([^!\.]*)',
+    flags=re.I | re.M)
+# "The seminar will be held in <location>."
+VENUE = re.compile(
+    r'^.*\sThe\s(seminar|lecture|talk|presentation)\s(will|is going to)\s(be\s('
+    r'held\s)?in|hosted in)\s(.*)\.',
+    flags=re.I | re.M)
+SEMINAR_TIME = re.compile(
+    r'(seminar|talk|presentation).*(are|will\sbe|is\sgoing\sto\sbe).*at\s(\d*(\D\d*)?(\s(pm|am))?)',
+    flags=re.I)
+SEMINAR_ROOM = re.compile(
+    r'(seminar|talk|presentation).*(are|will\sbe|is\sgoing\sto\sbe).*in\s(\w*(\s\d*))',
+    flags=re.I)
+
+# Any of the tags the pipeline inserts, see tag_markup
+MARKUP = tag_markup.MARKUP
+
+# Locations marked up in the tagged training emails
+TRAINING_LOCATION = re.compile(r'(<location>?)(.*)(</location>?)')
+
+# A single word followed by a full stop, e.g. an initial or a shortened title
+SHORTENED_NAME = re.compile(r'^\w+\.$')
+
+# Patterns which are run over whole headers and bodies
+BODY_PATTERNS = {
+    "header_time": HEADER_TIME,
+    "header_place": HEADER_PLACE,
+    "header_speaker": HEADER_SPEAKER,
+    "speaker_with_topic": SPEAKER_WITH_TOPIC,
+    "speaker": SPEAKER,
+    "venue_at_on": VENUE_AT_ON,
+    "venue_on_at": VENUE_ON_AT,
+    "venue": VENUE,
+    "seminar_time": SEMINAR_TIME,
+    "seminar_room": SEMINAR_ROOM,
+    "training_location": TRAINING_LOCATION,
+    "markup": MARKUP
+}
+
+# Patterns which are only run over a single field or token
+FIELD_PATTERNS = {
+    "time_range": TIME_RANGE,
+    "shortened_name": SHORTENED_NAME
+}
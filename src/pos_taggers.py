@@ -0,0 +1,75 @@
+from nltk.tag import DefaultTagger, UnigramTagger, BigramTagger, TrigramTagger
+from nltk.corpus import treebank
+import os
+import pickle
+import nltk
+
+
+TAGGER_CACHE_PATH = '../cache/trigram_tagger.pickle'
+# Bump whenever the way the taggers are trained changes, so stale caches are retrained
+TAGGER_CACHE_VERSION = 1
+
+_trigram = None
+
+
+def train_trigram_tagger():
+    """
+    Trains a trigram POS tagger on the treebank corpus, backing off to bigrams, unigrams and finally nouns.
+    :return: The trained trigram tagger.
+    """
+    train_sents = treebank.tagged_sents()
+    unigram = UnigramTagger(train_sents, backoff=DefaultTagger('NN'))
+    bigram = BigramTagger(train_sents, backoff=unigram)
+    return TrigramTagger(train_sents, backoff=bigram)
+
+
+def load_cached_tagger(cache_path=TAGGER_CACHE_PATH):
+    """
+    Loads a previously trained tagger.
+    :param cache_path: Where the tagger is cached.
+    :return: The tagger, or None if there is no cache, or it was made by a different version.
+    """
+    try:
+        with open(cache_path, "rb") as cache_file:
+            cached = pickle.load(cache_file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+        return None
+
+    if cached.get("version") != TAGGER_CACHE_VERSION or cached.get("nltk_version") != nltk.__version__:
+        return None
+    return cached["tagger"]
+
+
+def save_cached_tagger(tagger, cache_path=TAGGER_CACHE_PATH):
+    """
+    Caches a trained tagger, writing to a temporary file first so other processes never read half of it.
+    :param tagger: The tagger to cache.
+    :param cache_path: Where to cache the tagger.
+    """
+    cache_dir = os.path.dirname(cache_path)
+    if cache_dir:
+        os.makedirs(cache_dir, exist_ok=True)
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(temp_path, "wb") as cache_file:
+        pickle.dump({"version": TAGGER_CACHE_VERSION, "nltk_version": nltk.__version__, "tagger": tagger},
+                    cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temp_path, cache_path)
+
+
+def get_trigram_tagger():
+    """
+    Loads the trigram tagger the first time it is needed, from the cache if possible, otherwise by training it.
+    :return: The shared trigram tagger.
+    """
+    global _trigram
+    if _trigram is None:
+        tagger = load_cached_tagger()
+        if tagger is None:
+            tagger = train_trigram_tagger()
+            try:
+                save_cached_tagger(tagger)
+            except OSError:
+                # Not being able to cache just means training again next time
+                pass
+        _trigram = tagger
+    return _trigram
@@ -0,0 +1,157 @@
+from collections import namedtuple
+import string
+import nltk.data
+import tag_markup
+
+
+PUNKT_LANGUAGE = 'english'
+PARAGRAPH_SEPARATOR = "\n\n"
+# The tags which are written straight after the previous token. The paragraph tags aren't among them, they start
+# with a punctuation character so are written straight after it anyway.
+INLINE_TAGS = frozenset(f'<{closing}{tag_name}>' for tag_name in tag_markup.TAG_NAMES if tag_name != "paragraph"
+                        for closing in ("", "/"))
+
+# start and end are character offsets into the body
+Sentence = namedtuple("Sentence", ["start", "end", "accepted"])
+# complete is whether every sentence in the paragraph was accepted, in which case it is tagged as a paragraph
+Paragraph = namedtuple("Paragraph", ["start", "end", "sentences", "complete"])
+
+_sentence_tokenizer = None
+
+
+def get_sentence_tokenizer():
+    """
+    Loads the Punkt sentence tokenizer the first time it is needed, rather than every time a paragraph is split.
+    :return: The shared Punkt tokenizer.
+    """
+    global _sentence_tokenizer
+    if _sentence_tokenizer is None:
+        try:
+            from nltk.tokenize import PunktTokenizer
+            _sentence_tokenizer = PunktTokenizer(PUNKT_LANGUAGE)
+        except ImportError:
+            # Versions of NLTK before 3.8.2 ship the model as a pickle
+            _sentence_tokenizer = nltk.data.load(f'tokenizers/punkt/{PUNKT_LANGUAGE}.pickle')
+    return _sentence_tokenizer
+
+
+def is_accepted(sentence, sentence_length_lower_bound, sentence_length_upper_bound):
+    """
+    Decides whether a sentence is tagged as one.
+    :param sentence: The text of the sentence.
+    :param sentence_length_lower_bound: Lower bound of accepted sentence length in a paragraph.
+    :param sentence_length_upper_bound: Upper bound of accepted sentence length in a paragraph.
+    :return: Whether the sentence is accepted.
+    """
+    last_char = sentence[-1:]
+    sent_length = len(sentence)
+    '''
+    The "and" binds tighter than the "or"s, so the length bounds only apply to questions.
+    Kept as it is, as the published scores were measured with it.
+    '''
+    return last_char == "." or last_char == "!" or last_char == "?" and sentence_length_lower_bound < sent_length < sentence_length_upper_bound
+
+
+def segment(text, sentence_length_lower_bound, sentence_length_upper_bound):
+    """
+    Splits the body into paragraphs and sentences, one paragraph at a time.
+    :param text: The body.
+    :param sentence_length_lower_bound: Lower bound of accepted sentence length in a paragraph.
+    :param sentence_length_upper_bound: Upper bound of accepted sentence length in a paragraph.
+    :return: A generator of Paragraphs.
+    """
+    tokenizer = get_sentence_tokenizer()
+    '''
+    We assume each paragraph is split by an empty line.
+    The text after the last empty line will probably be empty, as there is often free lines at the end of the file,
+    so it is left out
+    '''
+    para_start = 0
+    para_end = text.find(PARAGRAPH_SEPARATOR)
+    while para_end != -1:
+        para = text[para_start:para_end]
+        sentences = []
+        for start, end in tokenizer.span_tokenize(para):
+            accepted = is_accepted(para[start:end], sentence_length_lower_bound, sentence_length_upper_bound)
+            sentences.append(Sentence(para_start + start, para_start + end, accepted))
+        yield Paragraph(para_start, para_end, sentences, all(sentence.accepted for sentence in sentences))
+
+        para_start = para_end + len(PARAGRAPH_SEPARATOR)
+        para_end = text.find(PARAGRAPH_SEPARATOR, para_start)
+
+
+def segment_tokens(text, paragraphs):
+    """
+    Turns the paragraphs into tokens with the sentence and paragraph tags added.
+    An accepted sentence is tagged without its final punctuation, which follows the closing tag. Any other sentence
+    is followed by a new line.
+    :param text: The body.
+    :param paragraphs: The Paragraphs from segment.
+    :return: A generator of tokens.
+    """
+    for paragraph in paragraphs:
+        if paragraph.complete:
+            yield "<paragraph>"
+        for sentence in paragraph.sentences:
+            if sentence.accepted:
+                yield "<sentence>"
+                yield text[sentence.start:sentence.end - 1]
+                yield "</sentence>"
+                yield text[sentence.end - 1]
+            else:
+                yield text[sentence.start:sentence.end]
+                yield "\n"
+        if paragraph.complete:
+            yield "</paragraph>"
+            yield "\n\n"
+
+
+def render_tokens(tokens):
+    """
+    Puts the tokens back into sentences, in one join.
+    :param tokens: The tokens, e.g. from segment_tokens.
+    :return: The tokens put back into a single string.
+    """
+    pieces = []
+    previous_token = None
+    for token in tokens:
+        if len(token) == 0:
+            continue
+        if previous_token is None:
+            pieces.append(token)
+        elif token == "<sentence>":
+            '''
+            Add space after after end of sentence.
+            e.g. The dog jumped. The lazy fox.
+                                ^
+            A sentence tag which doesn't follow punctuation is left out.
+            '''
+            if previous_token in string.punctuation:
+                pieces.append(" " + token)
+        elif token in INLINE_TAGS:
+            pieces.append(token)
+            '''
+            No space between word and trailing punctuation.
+            E.g. The dog jumped.
+            '''
+        elif token[0] in string.punctuation:
+            pieces.append(token)
+        elif previous_token in INLINE_TAGS and "/" not in previous_token:
+            # No space after an opening tag
+            pieces.append(token)
+        else:
+            pieces.append(" " + token)
+        previous_token = token
+    return "".join(pieces)
+
+
+def render(text, sentence_length_lower_bound, sentence_length_upper_bound):
+    """
+    Tags the sentences and paragraphs in the body.
+    :param text: The body.
+    :param sentence_length_lower_bound: Lower bound of accepted sentence length in a paragraph.
+    :param sentence_length_upper_bound: Upper bound of accepted sentence length in a paragraph.
+    :return: The body with sentence and paragraph tags.
+    """
+    paragraphs = segment(text, sentence_length_lower_bound, sentence_length_upper_bound)
+    return render_tokens(segment_tokens(text, paragraphs))
@@ -0,0 +1,118 @@
+from collections import Counter, OrderedDict
+import numpy as np
+
+
+# How many (lemma, node) entries to keep. Each entry is one row of similarities, so this bounds the memory used.
+SIMILARITY_CACHE_SIZE = 200000
+
+
+def build_node_vectors(tree, vectors):
+    """
+    Precomputes the unit-length vector of every node in the tree.
+    The root, and nodes whose word has no vector, get a row of zeros so their similarity to everything is 0.
+    :param tree: The OntologyTree.
+    :param vectors: The WordVectors to look the node words up in.
+    :return: A len(tree) x dimensions float32 matrix, one row per node.
+    """
+    vocab_rows = np.array([vectors.get_index(word) for word in tree.vocab], dtype=np.int64)
+    node_rows = np.full(len(tree), -1, dtype=np.int64)
+    # The root has no word
+    node_rows[1:] = vocab_rows[tree.word_ids[1:]]
+    known = node_rows >= 0
+
+    node_vectors = np.zeros((len(tree), vectors.vectors.shape[1]), dtype=np.float32)
+    node_vectors[known] = vectors.vectors[node_rows[known]]
+    return node_vectors
+
+
+class SimilarityCache:
+    """
+    Memoizes lemma to tree node similarities across emails, as seminar emails use a small, repetitive vocabulary.
+    An entry is keyed by (lemma id, node id), where the lemma id is the lemma's row in the word vectors, and holds
+    the lemma's similarity to each of the node's children, i.e. everything needed to score that lemma at that level.
+    """
+
+    def __init__(self, tree, vectors, max_entries=SIMILARITY_CACHE_SIZE):
+        """
+        :param tree: The OntologyTree being classified against.
+        :param vectors: The WordVectors the similarities come from.
+        :param max_entries: The most entries to keep, the least recently used are evicted first.
+        """
+        self.tree = tree
+        self.vectors = vectors
+        self.node_vectors = build_node_vectors(tree, vectors)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def count_lemmas(self, lemmas):
+        """
+        Looks the lemmas up in the word vectors and counts how often each occurs.
+        Lemmas without a vector are dropped, as their similarity to every node is 0.
+        :param lemmas: The lemmas from the email.
+        :return: The distinct lemma ids, and an array of how many times each occurs.
+        """
+        counts = Counter(self.vectors.get_index(lemma) for lemma in lemmas)
+        counts.pop(-1, None)
+        lemma_ids = list(counts)
+        return lemma_ids, np.array([counts[lemma_id] for lemma_id in lemma_ids], dtype=np.float64)
+
+    def child_similarities(self, lemma_ids, node):
+        """
+        Finds the similarity of each lemma to each of a node's children, computing any missing entries in one
+        matrix multiply.
+        :param lemma_ids: The distinct lemma ids, from count_lemmas.
+        :param node: The node whose children are being scored.
+        :return: A len(lemma_ids) x number of children matrix of similarities.
+        """
+        children = self.tree.children(node)
+        rows = [None] * len(lemma_ids)
+        missing = []
+        for position, lemma_id in enumerate(lemma_ids):
+            key = (lemma_id, node)
+            row = self._entries.get(key)
+            if row is None:
+                missing.append(position)
+            else:
+                self._entries.move_to_end(key)
+                rows[position] = row
+        self.hits += len(lemma_ids) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            missing_vectors = self.vectors.vectors[[lemma_ids[position] for position in missing]]
+            computed = missing_vectors @ self.node_vectors[children.start:children.stop].T
+            for position, row in zip(missing, computed):
+                rows[position] = row
+                self._entries[(lemma_ids[position], node)] = row
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        if not rows:
+            return np.zeros((0, len(children)), dtype=np.float32)
+        return np.vstack(rows)
+
+    def average_similarities(self, lemma_ids, lemma_counts, node, num_lemmas):
+        """
+        Computes the average similarity of all the email's lemmas to each of a node's children.
+        :param lemma_ids: The distinct lemma ids, from count_lemmas.
+        :param lemma_counts: How many times each lemma occurs, from count_lemmas.
+        :param node: The node whose children are being scored.
+        :param num_lemmas: The total number of lemmas, including those without a vector.
+        :return: An array of the average similarity score of each child.
+        """
+        similarities = self.child_similarities(lemma_ids, node)
+        return lemma_counts @ similarities.astype(np.float64) / num_lemmas
+
+    def stats(self):
+        """
+        :return: The hit and miss counters, and how many entries are cached.
+        """
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "entries": len(self._entries),
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,221 @@
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from os.path import abspath, basename, dirname, isdir, isfile, join, relpath
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import information_extraction
+import instrumentation
+import manifest
+import ner_backend
+
+
+JSON_EXTENSION = '.json'
+
+# The model each worker process loads once, and then uses for every email it is given
+_worker_model = None
+
+
+def find_emails(input_path):
+    """
+    Finds the emails to tag.
+    :param input_path: A directory of emails, or a glob pattern matching them.
+    :return: A sorted list of email paths.
+    """
+    if isdir(input_path):
+        return sorted(join(input_path, f) for f in os.listdir(input_path) if isfile(join(input_path, f)))
+    return sorted(path for path in glob.glob(input_path) if isfile(path))
+
+
+def output_paths(email_paths, output_dir, extension=""):
+    """
+    Works out where the output of each email goes. Emails keep their path relative to the directory they all share,
+    so emails from different directories with the same file name don't overwrite each other.
+    :param email_paths: The emails to tag.
+    :param output_dir: The directory to write the outputs to.
+    :param extension: What to add to the end of each file name.
+    :return: A list of the output path of each email.
+    """
+    if not email_paths:
+        return []
+    root = os.path.commonpath([dirname(abspath(email_path)) for email_path in email_paths])
+    return [join(output_dir, relpath(abspath(email_path), root) + extension) for email_path in email_paths]
+
+
+def read_email(email_path):
+    """
+    :param email_path: The email to read.
+    :return: The text of the email.
+    """
+    with open(email_path, "r") as email_file:
+        return email_file.read()
+
+
+def write_atomically(text, file_path):
+    """
+    Writes text to a file via a temporary file in the same directory, so an interrupted run never leaves a
+    half-written output behind which a resumed run would then skip.
+    :param text: The text to be written.
+    :param file_path: The file to be written to.
+    """
+    directory = os.path.dirname(file_path) or "."
+    file_descriptor, temp_path = tempfile.mkstemp(dir=directory, prefix="." + basename(file_path), suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, "w") as temp_file:
+            temp_file.write(text)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def init_worker(training_path, artifact_path, stats=False, profiler=None,
+                profile_path=instrumentation.PROFILE_PATH, ner_server=None):
+    """
+    Loads the model once per worker process.
+    :param training_path: The directory containing the tagged training emails.
+    :param artifact_path: Where the serialized model is stored.
+    :param stats: Whether to collect the stage times and counters of each email.
+    :param profiler: The profiler to profile each email with, one of instrumentation.PROFILERS, or None.
+    :param profile_path: The directory the profiles are written to.
+    :param ner_server: The NER server shared by the parent, see ner_backend.share_server, or None to start one when
+    needed.
+    """
+    global _worker_model
+    ner_backend.connect_to_server(ner_server)
+    instrumentation.set_enabled(stats)
+    instrumentation.set_profiler(profiler, profile_path)
+    _worker_model = information_extraction.ExtractionModel.load_or_train(training_path, artifact_path)
+
+
+def tag_file(email_path, output_path, structured=False):
+    """
+    Tags a single email and writes the result.
+    :param email_path: The email to tag.
+    :param output_path: Where to write the tagged email.
+    :param structured: Whether to write the extracted entities as JSON rather than the tagged email.
+    :return: The output path, the hash of the contents which were tagged, and the stage times and counters if they
+    were collected.
+    """
+    email_text = read_email(email_path)
+    with instrumentation.capture(email_path) as captured:
+        result = _worker_model.extract(email_text)
+    write_atomically(result.to_json() if structured else result.render(), output_path)
+    return output_path, manifest.hash_text(email_text), captured.stats
+
+
+def main(argv=None):
+    """
+    Tags every email matching the input path, spread over a pool of worker processes.
+    :param argv: The command line arguments, defaults to sys.argv.
+    :return: The exit code, non-zero if any email failed.
+    """
+    parser = argparse.ArgumentParser(prog="tag-emails", description="Tag a directory of seminar emails.")
+    parser.add_argument("input", help="a directory of emails, or a glob pattern such as 'archive/*.txt'")
+    parser.add_argument("output", help="the directory to write the tagged emails to")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count(),
+                        help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--json", action="store_true",
+                        help="write each email's plain text and extracted entities, with their character offsets, "
+                             "to <name>.json instead of the tagged email")
+    parser.add_argument("--force", action="store_true",
+                        help="re-tag every email, even those the manifest says are up to date")
+    parser.add_argument("--no-wiki-prefetch", action="store_true",
+                        help="look up each email's Wikipedia candidates while tagging it, instead of all of them "
+                             "concurrently up front")
+    parser.add_argument("--stats", default=None,
+                        help="collect the stage times and counters across the batch and write them to this file, in "
+                             "the Prometheus text format if it ends in .prom or .txt, otherwise as JSON")
+    parser.add_argument("--profile", choices=instrumentation.PROFILERS, default=instrumentation.get_profiler(),
+                        help="profile each email, writing the profiles to --profile-path")
+    parser.add_argument("--profile-path", default=instrumentation.PROFILE_PATH,
+                        help="the directory to write the profiles to")
+    parser.add_argument("--training-path", default=information_extraction.TRAINING_CORPORA_PATH,
+                        help="the directory of tagged training emails")
+    parser.add_argument("--model-path", default=information_extraction.MODEL_ARTIFACT_PATH,
+                        help="where the trained model is cached")
+    args = parser.parse_args(argv)
+
+    try:
+        instrumentation.set_profiler(args.profile, args.profile_path)
+    except ValueError as error:
+        parser.error(str(error))
+    collect_stats = args.stats is not None or instrumentation.is_enabled()
+    # The workers' stats are merged into this, along with the prefetch's
+    timer = instrumentation.StageTimer() if collect_stats else None
+
+    os.makedirs(args.output, exist_ok=True)
+    emails = find_emails(args.input)
+
+    # Train (or validate the cached model) once up front, so the workers only have to load it
+    model = information_extraction.ExtractionModel.load_or_train(args.training_path, args.model_path)
+
+    # Only emails which are new, have changed or were tagged by a different model need tagging again
+    output_manifest = manifest.Manifest.for_directory(args.output)
+    statuses = Counter()
+    pending = []
+    for email_path, output_path in zip(emails, output_paths(emails, args.output, JSON_EXTENSION if args.json else "")):
+        content_hash = manifest.hash_text(read_email(email_path))
+        status = output_manifest.status(output_path, content_hash, model.fingerprint)
+        statuses[status] += 1
+        if args.force or status != "current":
+            os.makedirs(dirname(output_path), exist_ok=True)
+            pending.append((email_path, output_path))
+    print(f'{statuses["current"]} of {len(emails)} emails up to date, {statuses["new"]} new, {statuses["changed"]} '
+          f'changed, {statuses["stale"]} tagged by a different model', file=sys.stderr)
+    if not pending:
+        output_manifest.close()
+        return 0
+
+    if not args.no_wiki_prefetch:
+        # The workers then find the lookups in the shared cache rather than each waiting on its own requests
+        instrumentation.set_timer(timer)
+        try:
+            fetched = information_extraction.prefetch_wikipedia(read_email(email_path) for email_path, _ in pending)
+        finally:
+            instrumentation.set_timer(None)
+        print(f'Prefetched {fetched} Wikipedia lookups', file=sys.stderr)
+
+    # One NER server for every worker, rather than a JVM with its own copy of the classifier in each of them. It is
+    # only started once a worker needs NER, so a batch whose speakers are all found by regex never starts a JVM.
+    ner_server = ner_backend.share_server()
+
+    failures = 0
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(args.training_path, args.model_path, collect_stats, args.profile,
+                                           args.profile_path, ner_server)) as executor:
+            futures = {executor.submit(tag_file, email_path, output_path, args.json): email_path
+                       for email_path, output_path in pending}
+            for count, future in enumerate(as_completed(futures), 1):
+                email_path = futures[future]
+                try:
+                    output_path, content_hash, stats = future.result()
+                    if stats is not None:
+                        timer.merge(stats)
+                    # Outputs are written atomically before they are recorded, so a recorded output is complete
+                    output_manifest.record(output_path, email_path, content_hash, model.fingerprint)
+                    print(f'[{count}/{len(pending)}] {email_path}', file=sys.stderr)
+                except Exception as error:
+                    failures += 1
+                    print(f'[{count}/{len(pending)}] {email_path} failed: {error}', file=sys.stderr)
+    finally:
+        ner_backend.close_ner_backend()
+
+    output_manifest.close()
+
+    if collect_stats:
+        stats = timer.as_dict()
+        for stage, stage_stats in stats["stages"].items():
+            print(f'{stage}: {stage_stats["seconds"]:.3f} s over {stage_stats["calls"]} calls', file=sys.stderr)
+        for counter, value in stats["counters"].items():
+            print(f'{counter}: {value}', file=sys.stderr)
+        if args.stats is not None:
+            instrumentation.write_stats(stats, args.stats)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+from bisect import bisect_right
+import re
+
+
+# Every tag the pipeline and the tagged datasets use
+TAG_NAMES = ["date", "stime", "etime", "location", "speaker", "sentence", "paragraph"]
+# Any of the tags, with whether it is a closing tag and the tag name as groups. The tags are alternatives of a single
+# compiled regex, so a text is searched for all of them in one pass.
+MARKUP = re.compile(r'<(/?)(' + "|".join(TAG_NAMES) + r')>')
+
+
+def strip(tagged):
+    """
+    Removes every tag in a single pass.
+    :param tagged: The tagged text.
+    :return: The plain text.
+    """
+    return MARKUP.sub("", tagged)
+
+
+def tokenize(tagged):
+    """
+    Splits a tagged text into its text and its tags, in a single pass.
+    E.g. "at <stime>1pm</stime>" gives [("at ", False), ("<stime>", True), ("1pm", False), ("</stime>", True)]
+    :param tagged: The tagged text.
+    :return: A list of (piece, whether it is a tag) pairs. Empty pieces of text are left out.
+    """
+    pieces = []
+    position = 0
+    for match in MARKUP.finditer(tagged):
+        if match.start() > position:
+            pieces.append((tagged[position:match.start()], False))
+        pieces.append((match.group(), True))
+        position = match.end()
+    if position < len(tagged):
+        pieces.append((tagged[position:], False))
+    return pieces
+
+
+class OffsetMap:
+    """
+    Maps between character offsets in a tagged text and in the same text with the tags stripped.
+    """
+
+    def __init__(self, tagged_starts, plain_starts):
+        """
+        :param tagged_starts: Where each run of text between tags starts in the tagged text, in order.
+        :param plain_starts: Where the same runs start in the plain text.
+        """
+        self.tagged_starts = tagged_starts
+        self.plain_starts = plain_starts
+
+    def to_plain(self, tagged_offset):
+        """
+        :param tagged_offset: An offset into the tagged text.
+        :return: The matching offset into the plain text. An offset inside a tag maps to where the tag was.
+        """
+        run = bisect_right(self.tagged_starts, tagged_offset) - 1
+        if run < 0:
+            return 0
+        offset = self.plain_starts[run] + tagged_offset - self.tagged_starts[run]
+        # Past the end of the run means inside the tag which follows it
+        if run + 1 < len(self.plain_starts):
+            offset = min(offset, self.plain_starts[run + 1])
+        return offset
+
+    def to_tagged(self, plain_offset):
+        """
+        :param plain_offset: An offset into the plain text.
+        :return: The matching offset into the tagged text. Where tags were stripped from between two characters,
+        this is after the tags.
+        """
+        run = bisect_right(self.plain_starts, plain_offset) - 1
+        if run < 0:
+            return 0
+        return self.tagged_starts[run] + plain_offset - self.plain_starts[run]
+
+
+def strip_with_offsets(tagged):
+    """
+    Removes every tag in a single pass, remembering where the text came from.
+    :param tagged: The tagged text.
+    :return: The plain text, and the OffsetMap between it and the tagged text.
+    """
+    pieces = []
+    tagged_starts = [0]
+    plain_starts = [0]
+    length = 0
+    position = 0
+    for match in MARKUP.finditer(tagged):
+        piece = tagged[position:match.start()]
+        pieces.append(piece)
+        length += len(piece)
+        position = match.end()
+        tagged_starts.append(position)
+        plain_starts.append(length)
+    pieces.append(tagged[position:])
+    return "".join(pieces), OffsetMap(tagged_starts, plain_starts)
@@ -0,0 +1,51 @@
+import nltk
+
+
+COMMON_WORDS_PATH = '../resources/1-1000.txt'
+
+_common_words = None
+_stopwords = None
+_filter_words = None
+
+
+def read_word_list(path):
+    """
+    Reads a file with one word per line.
+    :param path: The file to read.
+    :return: A set of the lowercased words.
+    """
+    with open(path, "r") as words_file:
+        return frozenset(line.strip().lower() for line in words_file if line.strip())
+
+
+def get_common_words():
+    """
+    Reads the list of the most common English words the first time it is needed.
+    :return: A set of the most common English words.
+    """
+    global _common_words
+    if _common_words is None:
+        _common_words = read_word_list(COMMON_WORDS_PATH)
+    return _common_words
+
+
+def get_stopwords():
+    """
+    Loads the NLTK English stopwords the first time they are needed.
+    :return: A set of stopwords.
+    """
+    global _stopwords
+    if _stopwords is None:
+        _stopwords = frozenset(nltk.corpus.stopwords.words('english'))
+    return _stopwords
+
+
+def get_filter_words():
+    """
+    Combines the stopwords and common words, so filtering a token is a single set lookup.
+    :return: A set of every word which should be filtered out of an email.
+    """
+    global _filter_words
+    if _filter_words is None:
+        _filter_words = get_stopwords() | get_common_words()
+    return _filter_words
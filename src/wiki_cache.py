@@ -0,0 +1,218 @@
+from collections import OrderedDict
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+WIKI_CACHE_PATH = '../cache/wikipedia.sqlite3'
+# Wikipedia search results for a name rarely change, so responses are kept for a month
+WIKI_CACHE_TTL = 30 * 24 * 60 * 60
+WIKI_CACHE_MAX_ENTRIES = 100000
+WIKI_MEMORY_CACHE_SIZE = 4096
+
+# Set WIKI_OFFLINE=1 to only answer from the cache and the fixture file, never from the network
+OFFLINE_ENV_VAR = 'WIKI_OFFLINE'
+FIXTURE_ENV_VAR = 'WIKI_FIXTURE'
+
+
+def normalize_query(query):
+    """
+    Normalizes a query so trivially different spellings share a cache entry.
+    E.g. "Professor  Smith" and "professor smith"
+    :param query: The query sent to the Wikipedia API.
+    :return: The cache key for the query.
+    """
+    return " ".join(query.split()).casefold()
+
+
+def load_fixture(fixture_path):
+    """
+    Reads a fixture file of canned Wikipedia responses.
+    The file is a JSON object mapping queries to the response text the API would return.
+    :param fixture_path: The path of the fixture file.
+    :return: A dictionary from normalized query to response text.
+    """
+    with open(fixture_path, "r") as fixture_file:
+        fixture = json.load(fixture_file)
+    return {normalize_query(query): response for query, response in fixture.items()}
+
+
+class WikiCache:
+    """
+    Two-tier cache of Wikipedia API responses: an in-process LRU in front of an SQLite store shared between runs.
+    """
+
+    def __init__(self, path=WIKI_CACHE_PATH, ttl=WIKI_CACHE_TTL, max_entries=WIKI_CACHE_MAX_ENTRIES,
+                 memory_size=WIKI_MEMORY_CACHE_SIZE):
+        """
+        :param path: The SQLite file backing the cache, or None to only cache in memory.
+        :param ttl: How many seconds a response stays valid for.
+        :param max_entries: The most responses kept on disk, the oldest are evicted first.
+        :param memory_size: The most responses kept in memory.
+        """
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.memory_size = memory_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._connection = None
+        self._connection_pid = None
+        self._puts_since_eviction = 0
+
+    def _connect(self):
+        """
+        Opens the SQLite store, reopening it after a fork as connections can't be shared between processes.
+        :return: The connection, or None if the cache is memory only.
+        """
+        if self.path is None:
+            return None
+        if self._connection is None or self._connection_pid != os.getpid():
+            cache_dir = os.path.dirname(self.path)
+            if cache_dir:
+                os.makedirs(cache_dir, exist_ok=True)
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("CREATE TABLE IF NOT EXISTS responses "
+                                     "(query TEXT PRIMARY KEY, response TEXT NOT NULL, fetched REAL NOT NULL)")
+            self._connection.execute("CREATE INDEX IF NOT EXISTS responses_fetched ON responses (fetched)")
+            self._connection.commit()
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def _remember(self, key, response, fetched):
+        """
+        Puts a response in the in-memory LRU, evicting the least recently used entry if it is full.
+        """
+        self._memory[key] = (response, fetched)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, query):
+        """
+        Looks a query up in memory, then on disk.
+        :param query: The query sent to the Wikipedia API.
+        :return: The cached response text, or None if there is no fresh entry.
+        """
+        key = normalize_query(query)
+        expiry = time.time() - self.ttl
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if entry[1] >= expiry:
+                    self._memory.move_to_end(key)
+                    return entry[0]
+                del self._memory[key]
+
+            connection = self._connect()
+            if connection is None:
+                return None
+            row = connection.execute("SELECT response, fetched FROM responses WHERE query = ?", (key,)).fetchone()
+            if row is None or row[1] < expiry:
+                return None
+            self._remember(key, row[0], row[1])
+            return row[0]
+
+    def put(self, query, response):
+        """
+        Stores a response in both tiers.
+        :param query: The query sent to the Wikipedia API.
+        :param response: The response text.
+        """
+        key = normalize_query(query)
+        fetched = time.time()
+        with self._lock:
+            self._remember(key, response, fetched)
+
+            connection = self._connect()
+            if connection is None:
+                return
+            connection.execute("INSERT OR REPLACE INTO responses (query, response, fetched) VALUES (?, ?, ?)",
+                               (key, response, fetched))
+            self._puts_since_eviction += 1
+            # Counting the table on every write would be wasteful, so only enforce the bounds periodically
+            if self._puts_since_eviction >= max(1, self.max_entries // 100):
+                self._evict(connection)
+            connection.commit()
+
+    def _evict(self, connection):
+        """
+        Removes expired responses, then the oldest responses until the store is within its size bound.
+        """
+        self._puts_since_eviction = 0
+        connection.execute("DELETE FROM responses WHERE fetched < ?", (time.time() - self.ttl,))
+        count = connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        if count > self.max_entries:
+            connection.execute("DELETE FROM responses WHERE query IN "
+                               "(SELECT query FROM responses ORDER BY fetched LIMIT ?)", (count - self.max_entries,))
+
+    def close(self):
+        """
+        Closes the SQLite store.
+        """
+        with self._lock:
+            if self._connection is not None and self._connection_pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+
+
+_cache = None
+_offline = os.environ.get(OFFLINE_ENV_VAR, "") not in ("", "0")
+_fixture = None
+_fixture_path = os.environ.get(FIXTURE_ENV_VAR) or None
+
+
+def get_wiki_cache():
+    """
+    Opens the shared cache the first time it is needed.
+    :return: The shared WikiCache.
+    """
+    global _cache
+    if _cache is None:
+        _cache = WikiCache()
+    return _cache
+
+
+def set_wiki_cache(cache):
+    """
+    Replaces the shared cache, e.g. with one stored somewhere else.
+    :param cache: The WikiCache to use.
+    """
+    global _cache
+    _cache = cache
+
+
+def set_offline(offline, fixture_path=None):
+    """
+    Switches offline mode on or off. In offline mode queries are only answered from the cache or the fixture file,
+    so batch runs are deterministic and don't need network access.
+    :param offline: Whether to stop sending requests to the Wikipedia API.
+    :param fixture_path: Optional fixture file of canned responses, consulted when the cache misses.
+    """
+    global _offline, _fixture, _fixture_path
+    _offline = offline
+    _fixture = None
+    _fixture_path = fixture_path
+
+
+def is_offline():
+    """
+    :return: Whether offline mode is on.
+    """
+    return _offline
+
+
+def lookup_fixture(query):
+    """
+    Looks a query up in the fixture file, if one has been configured.
+    :param query: The query sent to the Wikipedia API.
+    :return: The canned response text, or None.
+    """
+    global _fixture
+    if _fixture_path is None:
+        return None
+    if _fixture is None:
+        _fixture = load_fixture(_fixture_path)
+    return _fixture.get(normalize_query(query))
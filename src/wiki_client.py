@@ -0,0 +1,209 @@
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from requests.exceptions import RequestException
+from requests.utils import requote_uri
+from urllib.parse import urlsplit
+import asyncio
+import os
+import time
+import instrumentation
+import requests
+import wiki_cache
+
+
+# Set WIKI_API_URL to send the queries somewhere else, e.g. a local stand-in server
+API_URL_ENV_VAR = 'WIKI_API_URL'
+WIKIPEDIA_API_URL = os.environ.get(API_URL_ENV_VAR) or 'https://en.wikipedia.org/w/api.php'
+# (connect, read) timeouts in seconds for Wikipedia API requests
+WIKIPEDIA_TIMEOUT = (3.05, 10)
+
+# How many requests may be in flight to one host at once
+MAX_REQUESTS_PER_HOST = 4
+# The token bucket: the sustained requests per second, and how many can be sent in a burst
+REQUESTS_PER_SECOND = 10
+REQUEST_BURST = 10
+MAX_RETRIES = 3
+# Seconds to wait before the first retry, doubling for each retry after it
+RETRY_BACKOFF = 0.5
+# Responses worth retrying, as the server may answer differently a moment later
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def search_parameters(query):
+    """
+    :param query: The query to send to the API.
+    :return: The parameters of a Wikipedia search request for the query.
+    """
+    return {
+        "action": "query",
+        "list": "search",
+        "format": "json",
+        # Removes any illegal characters in URLs e.g. spaces
+        "srsearch": requote_uri(query)
+    }
+
+
+class TokenBucket:
+    """
+    Limits how often requests are sent. Each request takes a token, and tokens are added back at a fixed rate up to
+    the bucket's capacity, which allows short bursts.
+    """
+
+    def __init__(self, rate=REQUESTS_PER_SECOND, capacity=REQUEST_BURST):
+        """
+        :param rate: How many tokens are added per second.
+        :param capacity: The most tokens the bucket can hold.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+
+    async def acquire(self):
+        """
+        Waits until a token is available, and takes it.
+        """
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class AsyncWikiClient:
+    """
+    Sends many Wikipedia searches concurrently. The requests are made with a pooled requests session on a thread
+    pool, limited per host and by a token bucket, and retried with exponential backoff.
+    """
+
+    def __init__(self, api_url=None, max_requests_per_host=MAX_REQUESTS_PER_HOST, rate=REQUESTS_PER_SECOND,
+                 burst=REQUEST_BURST, timeout=WIKIPEDIA_TIMEOUT, retries=MAX_RETRIES, backoff=RETRY_BACKOFF):
+        """
+        :param api_url: The URL of the API. Defaults to Wikipedia, or WIKI_API_URL if it is set.
+        :param max_requests_per_host: How many requests may be in flight to one host at once.
+        :param rate: The sustained requests per second.
+        :param burst: How many requests can be sent at once before the rate applies.
+        :param timeout: The (connect, read) timeouts of each request, in seconds.
+        :param retries: How many times to retry a request which failed or got a retryable response.
+        :param backoff: Seconds to wait before the first retry, doubling for each retry after it.
+        """
+        self.api_url = api_url or os.environ.get(API_URL_ENV_VAR) or WIKIPEDIA_API_URL
+        self.max_requests_per_host = max_requests_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(rate, burst)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_requests_per_host)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = ThreadPoolExecutor(max_workers=max_requests_per_host)
+        self._host_limits = {}
+        self._host_limits_loop = None
+
+    def _host_limit(self, url):
+        """
+        :param url: The URL being requested.
+        :return: The semaphore limiting the requests in flight to the URL's host.
+        """
+        # Semaphores belong to the event loop they were made in, and each prefetch runs its own loop
+        loop = asyncio.get_running_loop()
+        if self._host_limits_loop is not loop:
+            self._host_limits = {}
+            self._host_limits_loop = loop
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.max_requests_per_host)
+        return self._host_limits[host]
+
+    def _get(self, query):
+        """
+        Sends one request, on a thread of the pool.
+        :return: The response.
+        """
+        return self.session.get(self.api_url, params=search_parameters(query), timeout=self.timeout)
+
+    async def fetch(self, query):
+        """
+        Searches Wikipedia for a query.
+        :param query: The query to send to the API.
+        :return: The response text, or None if no successful response was received.
+        """
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            await self.bucket.acquire()
+            async with self._host_limit(self.api_url):
+                instrumentation.count("wiki_requests")
+                # Only bounded by the session's own timeouts, as giving up on the wait wouldn't stop the thread, and
+                # the host could then get more requests at once than the semaphore allows
+                try:
+                    response = await loop.run_in_executor(self._executor, self._get, query)
+                except RequestException:
+                    instrumentation.count("wiki_errors")
+                    continue
+            if response.ok:
+                return response.text
+            if response.status_code not in RETRY_STATUSES:
+                return None
+        return None
+
+    async def fetch_all(self, queries):
+        """
+        Searches Wikipedia for every query concurrently.
+        :param queries: The queries to send to the API.
+        :return: A dictionary from each query to its response text, or None.
+        """
+        queries = list(queries)
+        responses = await asyncio.gather(*(self.fetch(query) for query in queries))
+        return dict(zip(queries, responses))
+
+    def close(self):
+        """
+        Closes the session and the thread pool.
+        """
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+
+def prefetch(queries, client=None):
+    """
+    Resolves the queries which aren't cached yet concurrently, and caches the responses, so that tagging the emails
+    they came from only hits the cache. Does nothing in offline mode.
+    :param queries: The queries which tagging is going to send.
+    :param client: The AsyncWikiClient to use, by default one is made for the call.
+    :return: How many responses were fetched and cached.
+    """
+    if wiki_cache.is_offline():
+        return 0
+
+    cache = wiki_cache.get_wiki_cache()
+    missing = {}
+    for query in queries:
+        # Queries which normalize to the same cache entry are only sent once
+        key = wiki_cache.normalize_query(query)
+        if key not in missing and cache.get(query) is None:
+            missing[key] = query
+    if not missing:
+        return 0
+
+    own_client = client is None
+    if own_client:
+        client = AsyncWikiClient()
+    try:
+        responses = asyncio.run(client.fetch_all(missing.values()))
+    finally:
+        if own_client:
+            client.close()
+
+    fetched = 0
+    for query, response in responses.items():
+        if response is not None:
+            cache.put(query, response)
+            fetched += 1
+    instrumentation.count("wiki_prefetched", fetched)
+    return fetched
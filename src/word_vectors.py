@@ -0,0 +1,191 @@
+import argparse
+import json
+import os
+import sys
+import numpy as np
+
+
+WORD_VECTORS_MODEL = 'glove-wiki-gigaword-100'
+WORD_VECTORS_PATH = '../cache/word_vectors'
+VECTORS_FILE = 'vectors.npy'
+VOCAB_FILE = 'vocab.txt'
+META_FILE = 'meta.json'
+# Bump whenever the on-disk layout changes, so old conversions are redone
+FORMAT_VERSION = 1
+
+_word_vectors = None
+
+
+class WordVectors:
+    """
+    Unit-normalized word vectors stored as a float32 matrix, with a vocabulary mapping each word to its row.
+    Loaded with mmap_mode='r', so processes using the same file share its pages through the OS page cache.
+    """
+
+    def __init__(self, vectors, vocab):
+        """
+        :param vectors: The matrix of unit-length word vectors, one row per word.
+        :param vocab: The words, in the same order as the rows.
+        """
+        self.vectors = vectors
+        self.vocab = vocab
+        self.key_to_index = {word: index for index, word in enumerate(vocab)}
+
+    @classmethod
+    def load(cls, path=WORD_VECTORS_PATH, mmap=True):
+        """
+        Opens converted word vectors.
+        :param path: The directory the vectors were converted into.
+        :param mmap: Whether to memory-map the matrix rather than reading it into memory.
+        :return: The word vectors, or None if there are no vectors in the current format at the path.
+        """
+        try:
+            with open(os.path.join(path, META_FILE), "r") as meta_file:
+                meta = json.load(meta_file)
+            if meta.get("format_version") != FORMAT_VERSION:
+                return None
+            # Only "\n" separates words, a "\r" inside a word mustn't split it and shift the later words' rows
+            with open(os.path.join(path, VOCAB_FILE), "r", encoding="utf-8", newline="") as vocab_file:
+                vocab = vocab_file.read().split("\n")
+            vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode='r' if mmap else None)
+        except (OSError, ValueError):
+            return None
+        if len(vocab) != vectors.shape[0]:
+            # Converted again by get_word_vectors
+            return None
+
+        return cls(vectors, vocab)
+
+    def __contains__(self, word):
+        return word in self.key_to_index
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def get_index(self, word, default=-1):
+        """
+        :param word: The word to look up.
+        :param default: What to return for a word which isn't in the vocabulary.
+        :return: The row of the word's vector.
+        """
+        return self.key_to_index.get(word, default)
+
+    def get_vector(self, word):
+        """
+        :param word: The word to look up.
+        :return: The word's unit-length vector.
+        :raises KeyError: If the word isn't in the vocabulary.
+        """
+        return self.vectors[self.key_to_index[word]]
+
+    def similarity(self, word_1, word_2):
+        """
+        Computes the cosine similarity of two words, like gensim's KeyedVectors.similarity.
+        :param word_1: The first word.
+        :param word_2: The second word.
+        :return: The similarity score of the two words.
+        :raises KeyError: If either word isn't in the vocabulary.
+        """
+        return float(np.dot(self.get_vector(word_1), self.get_vector(word_2)))
+
+
+def _write_atomically(path, write):
+    """
+    Writes a file via a temporary file, so other processes never open half of it.
+    :param path: The file to write.
+    :param write: A function which writes the contents to an open binary file.
+    """
+    temp_path = f'{path}.{os.getpid()}.tmp'
+    with open(temp_path, "wb") as temp_file:
+        write(temp_file)
+    os.replace(temp_path, path)
+
+
+def convert_vectors(output_path=WORD_VECTORS_PATH, model_name=WORD_VECTORS_MODEL, vocabulary=None):
+    """
+    Converts a gensim model into the compact on-disk format: a unit-normalized float32 .npy matrix and a vocabulary
+    file. Only needs to be done once, after which the vectors load without gensim.
+    :param output_path: The directory to write the converted vectors to.
+    :param model_name: The gensim-data model to convert.
+    :param vocabulary: If given, only keep the vectors of these words.
+    :return: The number of words kept.
+    """
+    # gensim is only needed for the one-off conversion, and takes a long time to import
+    import gensim.downloader as api
+
+    keyed_vectors = api.load(model_name)
+    words = keyed_vectors.index_to_key
+    if vocabulary is not None:
+        vocabulary = set(vocabulary)
+        words = [word for word in words if word in vocabulary]
+
+    vectors = np.asarray(keyed_vectors.vectors[[keyed_vectors.key_to_index[word] for word in words]], dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    # A zero vector has no direction, leave it as zero so its similarity to everything is zero
+    norms[norms == 0] = 1
+    vectors /= norms
+
+    os.makedirs(output_path, exist_ok=True)
+    _write_atomically(os.path.join(output_path, VECTORS_FILE), lambda file: np.save(file, vectors))
+    _write_atomically(os.path.join(output_path, VOCAB_FILE), lambda file: file.write("\n".join(words).encode("utf-8")))
+    meta = {
+        "format_version": FORMAT_VERSION,
+        "model": model_name,
+        "words": len(words),
+        "dimensions": int(vectors.shape[1]),
+        "subset": vocabulary is not None
+    }
+    # The meta file is written last, so a conversion which was interrupted is never loaded
+    _write_atomically(os.path.join(output_path, META_FILE), lambda file: file.write(json.dumps(meta).encode("utf-8")))
+    return len(words)
+
+
+def get_word_vectors():
+    """
+    Opens the converted word vectors the first time they are needed, converting the full model first if needed.
+    :return: The shared WordVectors.
+    """
+    global _word_vectors
+    if _word_vectors is None:
+        word_vectors = WordVectors.load()
+        if word_vectors is None:
+            convert_vectors()
+            word_vectors = WordVectors.load()
+        _word_vectors = word_vectors
+    return _word_vectors
+
+
+def set_word_vectors(word_vectors):
+    """
+    Replaces the shared word vectors, e.g. with ones converted somewhere else.
+    :param word_vectors: The WordVectors to use.
+    """
+    global _word_vectors
+    _word_vectors = word_vectors
+
+
+def main(argv=None):
+    """
+    Converts the word vectors, optionally keeping only the words the ontology classifier can reach.
+    :param argv: The command line arguments, defaults to sys.argv.
+    """
+    parser = argparse.ArgumentParser(description="Convert gensim word vectors into a memory-mappable .npy file.")
+    parser.add_argument("--model", default=WORD_VECTORS_MODEL, help="the gensim-data model to convert")
+    parser.add_argument("--output", default=WORD_VECTORS_PATH, help="the directory to write the vectors to")
+    parser.add_argument("--ontology-subset", action="store_true",
+                        help="only keep words in the extended ontology tree and the email corpora. Emails outside "
+                             "the corpora may then have words without vectors, which score zero")
+    args = parser.parse_args(argv)
+
+    vocabulary = None
+    if args.ontology_subset:
+        # Imported here as ontology_tagging uses this module
+        import ontology_tagging
+        vocabulary = ontology_tagging.ontology_vocabulary()
+
+    kept = convert_vectors(args.output, args.model, vocabulary)
+    print(f'Wrote {kept} word vectors to {args.output}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
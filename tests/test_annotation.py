@@ -0,0 +1,119 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import annotation
+import information_extraction
+import tag_markup
+
+
+def reference_spans(text, tags, single_line=False, protected=()):
+    """
+    Finds the spans the slow way, trying every tagged string at every position.
+    :return: The spans find_spans should return.
+    """
+    tags_by_string = {}
+    for tag_string, tag_tag in tags:
+        if tag_string and not (single_line and "\n" in tag_string):
+            tags_by_string.setdefault(tag_string, set()).add(tag_tag)
+
+    spans = []
+    position = 0
+    while position < len(text):
+        matches = [tag_string for tag_string in tags_by_string if text.startswith(tag_string, position)]
+        if not matches:
+            position += 1
+            continue
+        tag_string = max(matches, key=len)
+        end = position + len(tag_string)
+        if not any(start < end and position < stop for start, stop in protected):
+            spans.append((position, end, tuple(sorted(tags_by_string[tag_string]))))
+        # The regex moves on past a match even when it is dropped for overlapping the markup
+        position = end
+    return spans
+
+
+class FindSpansTest(unittest.TestCase):
+    """
+    The single pass over the text, against trying every string at every position.
+    """
+
+    def test_longest_match_wins(self):
+        spans = annotation.find_spans("Dr Raj Reddy spoke", [("Raj", "speaker"), ("Raj Reddy", "speaker")])
+        self.assertEqual(spans, [(3, 12, ("speaker",))])
+
+    def test_leftmost_match_wins(self):
+        spans = annotation.find_spans("Wean Hall 5409", [("Hall 5409", "location"), ("Wean Hall", "location")])
+        self.assertEqual(spans, [(0, 9, ("location",))])
+
+    def test_string_with_several_tags_gets_all_of_them(self):
+        tagged = annotation.annotate("at 3pm", [("3pm", "stime"), ("3pm", "etime")])
+        self.assertEqual(tagged, "at <etime><stime>3pm</stime></etime>")
+
+    def test_empty_and_multiline_strings_are_skipped(self):
+        self.assertEqual(annotation.find_spans("a b", [("", "speaker")]), [])
+        self.assertEqual(annotation.find_spans("a\nb", [("a\nb", "location")], single_line=True), [])
+        self.assertEqual(annotation.find_spans("a\nb", [("a\nb", "location")]), [(0, 3, ("location",))])
+
+    def test_matches_overlapping_protected_ranges_are_dropped(self):
+        text = "<sentence>Raj Reddy</sentence>"
+        tags = [("Raj", "speaker"), ("sentence", "location")]
+        spans = annotation.find_spans(text, tags, protected=[(0, 10), (19, 30)])
+        self.assertEqual(spans, [(10, 13, ("speaker",))])
+
+    def test_matches_trying_every_position(self):
+        generator = random.Random(0)
+        for _ in range(500):
+            text = "".join(generator.choice("ab \n") for _ in range(generator.randint(0, 30)))
+            tags = [("".join(generator.choice("ab \n") for _ in range(generator.randint(0, 4))),
+                     generator.choice(["speaker", "location", "stime"])) for _ in range(generator.randint(0, 6))]
+            protected = []
+            position = 0
+            while position < len(text) and generator.random() < 0.7:
+                start = generator.randint(position, len(text))
+                end = generator.randint(start, min(len(text), start + 5))
+                if end > start:
+                    protected.append((start, end))
+                position = end + 1
+            single_line = generator.random() < 0.5
+            self.assertEqual(annotation.find_spans(text, tags, single_line, protected),
+                             reference_spans(text, tags, single_line, protected), (text, tags, protected))
+
+
+class RenderTest(unittest.TestCase):
+    """
+    Inserting the tags, which stripping must undo.
+    """
+
+    def test_stripping_the_tags_gives_back_the_text(self):
+        generator = random.Random(1)
+        for _ in range(200):
+            text = "".join(generator.choice("ab \n") for _ in range(generator.randint(0, 30)))
+            tags = [("".join(generator.choice("ab ") for _ in range(generator.randint(1, 3))),
+                     generator.choice(tag_markup.TAG_NAMES)) for _ in range(generator.randint(0, 4))]
+            tagged = annotation.annotate(text, tags)
+            self.assertEqual(tag_markup.strip(tagged), text)
+
+    def test_tags_are_not_padded(self):
+        tagged = annotation.annotate("by Raj Reddy.", [("Raj Reddy", "speaker")])
+        self.assertEqual(tagged, "by <speaker>Raj Reddy</speaker>.")
+
+    def test_tag_body_leaves_the_markup_alone(self):
+        text = "<paragraph><sentence>The speaker is Raj Reddy.</sentence></paragraph>"
+        tagged = information_extraction.tag_body(text, [("Raj Reddy", "speaker"), ("sentence", "location"),
+                                                        ("3pm.", "stime")])
+        self.assertEqual(tagged, "<paragraph><sentence>The speaker is <speaker>Raj Reddy</speaker>.</sentence>"
+                                 "</paragraph>")
+
+    def test_tag_header_ends_every_line_with_a_new_line(self):
+        header = "Topic: Robots\nWho: Raj Reddy\r\nPlace: Wean Hall"
+        tagged = information_extraction.tag_header(header, [("Raj Reddy", "speaker"), ("Wean Hall", "location")])
+        self.assertEqual(tagged, "Topic: Robots\nWho: <speaker>Raj Reddy</speaker>\n"
+                                 "Place: <location>Wean Hall</location>\n")
+        self.assertEqual(information_extraction.tag_header("", [("Raj Reddy", "speaker")]), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
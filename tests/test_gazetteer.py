@@ -0,0 +1,127 @@
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import gazetteer
+import information_extraction
+
+
+LOCATION_WORDS = ["Wean", "Hall", "5409", "Doherty", "Room", "A", "a", "Baker", "Hall-", "(NSH)", "İ"]
+TEXT_PIECES = LOCATION_WORDS + [" ", " ", "\n", ".", "ed", "WEAN", "hall", "_", "-"]
+
+
+def find_by_trying_every_position(locations, text):
+    """
+    Finds the matches the slow way, trying every location at every position.
+    :return: The matches LocationMatcher.find should return.
+    """
+    folded = gazetteer.fold(text)
+    kept = {}
+    for location in locations:
+        kept.setdefault(gazetteer.fold(location), location)
+    matches = []
+    for key, location in kept.items():
+        if not key:
+            continue
+        start = folded.find(key)
+        while start != -1:
+            end = start + len(key)
+            if gazetteer.LocationMatcher._on_boundaries(text, start, end):
+                matches.append((start, end, location))
+            start = folded.find(key, start + 1)
+    # In the order they end, the longest first
+    return sorted(matches, key=lambda match: (match[1], match[0]))
+
+
+def old_find_locations(text, tags, locations):
+    """
+    information_extraction.find_locations as it was before the matcher.
+    """
+    text_lower = text.lower()
+    for location in locations:
+        if location.lower() in text_lower:
+            tags.add((location, information_extraction.LOCATION_TAG))
+    return tags
+
+
+def random_phrase(generator, pieces, length):
+    """
+    :return: Up to length random pieces, joined together.
+    """
+    return "".join(generator.choice(pieces) for _ in range(generator.randint(0, length)))
+
+
+class LocationMatcherTest(unittest.TestCase):
+    """
+    The Aho-Corasick matcher, against trying every location at every position.
+    """
+
+    def test_finds_what_trying_every_position_finds(self):
+        generator = random.Random(0)
+        for _ in range(500):
+            locations = [random_phrase(generator, LOCATION_WORDS + [" "], 4) for _ in range(generator.randint(0, 8))]
+            text = random_phrase(generator, TEXT_PIECES, 40)
+            matcher = gazetteer.LocationMatcher(locations)
+            self.assertEqual(matcher.find(text), find_by_trying_every_position(locations, text), (locations, text))
+
+    def test_locations_added_after_a_search_are_found(self):
+        generator = random.Random(1)
+        for _ in range(200):
+            locations = [random_phrase(generator, LOCATION_WORDS + [" "], 4) for _ in range(generator.randint(0, 8))]
+            text = random_phrase(generator, TEXT_PIECES, 40)
+            matcher = gazetteer.LocationMatcher()
+            for index, location in enumerate(locations):
+                matcher.add(location)
+                self.assertEqual(matcher.find(text), find_by_trying_every_position(locations[:index + 1], text))
+
+    def test_ignores_case_and_keeps_the_first_spelling(self):
+        matcher = gazetteer.LocationMatcher(["Wean Hall", "WEAN HALL", ""])
+        self.assertEqual(len(matcher), 1)
+        self.assertIn("wean hall", matcher)
+        self.assertFalse(matcher.add("Wean hall"))
+        self.assertTrue(matcher.add("Baker Hall"))
+        self.assertEqual(matcher.find("In WEAN HALL 5409"), [(3, 12, "Wean Hall")])
+
+    def test_only_finds_whole_words(self):
+        matcher = gazetteer.LocationMatcher(["Wean", "Hall 5409"])
+        self.assertEqual(matcher.find("Weaned in Hall 54090"), [])
+        self.assertEqual(matcher.find("(Wean) Hall 5409."), [(1, 5, "Wean"), (7, 16, "Hall 5409")])
+
+    def test_returns_overlapping_matches_longest_first(self):
+        matcher = gazetteer.LocationMatcher(["Hall", "Wean Hall", "Wean Hall 5409"])
+        self.assertEqual(matcher.find("Wean Hall 5409"),
+                         [(0, 9, "Wean Hall"), (5, 9, "Hall"), (0, 14, "Wean Hall 5409")])
+
+    def test_offsets_survive_characters_which_lowercase_to_several(self):
+        matcher = gazetteer.LocationMatcher(["Baker Hall"])
+        text = "İİ Baker Hall"
+        self.assertEqual(gazetteer.fold(text), "İİ baker hall")
+        self.assertEqual(matcher.find(text), [(3, 13, "Baker Hall")])
+
+
+class FindLocationsTest(unittest.TestCase):
+    """
+    Tagging the known locations in an email, against the substring scan it replaced.
+    """
+
+    def test_tags_like_the_substring_scan_for_whole_words_in_their_known_spelling(self):
+        locations = ["Wean Hall", "Wean Hall 5409", "Doherty Hall", "Room A", "Baker Hall", "NSH"]
+        generator = random.Random(2)
+        for _ in range(200):
+            words = [generator.choice(locations + ["the", "talk", "is", "in", "at", "3pm", "\n"])
+                     for _ in range(generator.randint(0, 20))]
+            text = " ".join(words) + "."
+            self.assertEqual(information_extraction.find_locations(text, set(), locations),
+                             old_find_locations(text, set(), locations), text)
+
+    def test_tags_the_text_as_it_is_written(self):
+        matcher = gazetteer.LocationMatcher(["Wean Hall"])
+        self.assertEqual(information_extraction.find_locations("Meet in WEAN HALL.", set(), matcher),
+                         {("WEAN HALL", information_extraction.LOCATION_TAG)})
+        self.assertEqual(information_extraction.find_locations("Weaned Hall", set(), matcher), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
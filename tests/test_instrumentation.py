@@ -0,0 +1,34 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import instrumentation
+
+
+class ProfileTest(unittest.TestCase):
+    """
+    Writing a profile of each email.
+    """
+
+    def setUp(self):
+        self.profile_path = tempfile.mkdtemp()
+        instrumentation.set_profiler("cprofile", self.profile_path)
+
+    def tearDown(self):
+        instrumentation.set_profiler(None)
+        shutil.rmtree(self.profile_path)
+
+    def test_emails_with_the_same_file_name_get_their_own_profiles(self):
+        for email_path in ["archive/1994/talk.txt", "archive/1995/talk.txt", "archive/1994/talk.txt"]:
+            with instrumentation.capture(email_path, enabled=False):
+                pass
+        profiles = sorted(os.listdir(self.profile_path))
+        self.assertEqual(len(profiles), 2)
+        self.assertTrue(all(profile.startswith("talk.txt-") and profile.endswith(".prof") for profile in profiles))
+
+
+if __name__ == '__main__':
+    unittest.main()
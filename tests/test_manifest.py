@@ -0,0 +1,77 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import manifest
+
+
+class ManifestTest(unittest.TestCase):
+    """
+    Which outputs a re-run has to make again.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.output_dir = os.path.join(self.directory, "out")
+        self.output_path = os.path.join(self.output_dir, "talk.txt")
+        self.input_path = os.path.join(self.directory, "in", "talk.txt")
+        self.manifest = manifest.Manifest.for_directory(self.output_dir)
+        self.content_hash = manifest.hash_text("Who: Raj Reddy\n")
+
+    def tearDown(self):
+        self.manifest.close()
+        shutil.rmtree(self.directory)
+
+    def write_output(self):
+        with open(self.output_path, "w") as output_file:
+            output_file.write("Who: <speaker>Raj Reddy</speaker>\n")
+        self.manifest.record(self.output_path, self.input_path, self.content_hash, "model")
+
+    def test_unrecorded_output_is_new(self):
+        self.assertEqual(self.manifest.status(self.output_path, self.content_hash, "model"), "new")
+
+    def test_recorded_output_is_current(self):
+        self.write_output()
+        self.assertEqual(self.manifest.status(self.output_path, self.content_hash, "model"), "current")
+
+    def test_output_of_changed_input_is_changed(self):
+        self.write_output()
+        changed_hash = manifest.hash_text("Who: Manuela Veloso\n")
+        self.assertEqual(self.manifest.status(self.output_path, changed_hash, "model"), "changed")
+        # A changed input is reported as changed even when the model is different too
+        self.assertEqual(self.manifest.status(self.output_path, changed_hash, "other model"), "changed")
+
+    def test_output_of_another_model_is_stale(self):
+        self.write_output()
+        self.assertEqual(self.manifest.status(self.output_path, self.content_hash, "other model"), "stale")
+
+    def test_deleted_output_is_new(self):
+        self.write_output()
+        os.remove(self.output_path)
+        self.assertEqual(self.manifest.status(self.output_path, self.content_hash, "model"), "new")
+
+    def test_recording_again_replaces_the_entry(self):
+        self.write_output()
+        self.manifest.record(self.output_path, self.input_path, self.content_hash, "other model")
+        self.assertEqual(self.manifest.status(self.output_path, self.content_hash, "other model"), "current")
+        self.assertEqual(self.manifest.status(self.output_path, self.content_hash, "model"), "stale")
+
+    def test_moved_output_directory_keeps_its_manifest(self):
+        self.write_output()
+        self.manifest.close()
+        moved_dir = os.path.join(self.directory, "moved")
+        os.rename(self.output_dir, moved_dir)
+        self.manifest = manifest.Manifest.for_directory(moved_dir)
+        moved_path = os.path.join(moved_dir, "talk.txt")
+        self.assertEqual(self.manifest.status(moved_path, self.content_hash, "model"), "current")
+
+    def test_hash_depends_only_on_the_contents(self):
+        self.assertEqual(manifest.hash_text("Who: Raj Reddy\n"), self.content_hash)
+        self.assertNotEqual(manifest.hash_text("Who: Raj Reddy\r\n"), self.content_hash)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,170 @@
+import multiprocessing
+import os
+import sys
+import unittest
+import nltk
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import information_extraction
+import ner_backend
+
+
+def has_nltk_data(resource):
+    """
+    :param resource: The NLTK resource, e.g. "tokenizers/punkt_tab/english/".
+    :return: Whether it is installed.
+    """
+    try:
+        nltk.data.find(resource)
+    except LookupError:
+        return False
+    return True
+
+
+class CountingStubBackend(ner_backend.StubNERBackend):
+    """
+    A stub which records every request, so the tests can check how the token lists were batched.
+    """
+
+    def __init__(self, person_names=()):
+        super().__init__(person_names)
+        self.requests = []
+
+    def tag_sents(self, token_lists):
+        self.requests.append(token_lists)
+        return super().tag_sents(token_lists)
+
+
+class StubNERBackendTest(unittest.TestCase):
+    """
+    The pure-Python backend, which the pipeline uses instead of the Stanford server when NER_BACKEND=stub.
+    """
+
+    def tearDown(self):
+        ner_backend.close_ner_backend()
+
+    def test_tags_several_token_lists_in_one_request(self):
+        backend = ner_backend.StubNERBackend(["Raj", "Reddy", "Manuela"])
+        tagged = backend.tag_sents([["Raj", "Reddy", "will", "talk"], [], ["by", " ", "Manuela"]])
+        self.assertEqual(tagged, [[("Raj", "PERSON"), ("Reddy", "PERSON"), ("will", "O"), ("talk", "O")], [],
+                                  [("by", "O"), ("Manuela", "PERSON")]])
+        self.assertEqual(backend.tag(["Raj"]), [("Raj", "PERSON")])
+
+    def test_no_server_keeps_the_stub(self):
+        environment = os.environ.get(ner_backend.BACKEND_ENV_VAR)
+        os.environ[ner_backend.BACKEND_ENV_VAR] = "stub"
+        try:
+            ner_backend.close_ner_backend()
+            ner_backend.connect_to_server(None)
+            self.assertIsInstance(ner_backend.get_ner_backend(), ner_backend.StubNERBackend)
+            self.assertIsNone(ner_backend.start_shared_server())
+        finally:
+            if environment is None:
+                del os.environ[ner_backend.BACKEND_ENV_VAR]
+            else:
+                os.environ[ner_backend.BACKEND_ENV_VAR] = environment
+
+    def test_connects_to_a_server_without_starting_one(self):
+        ner_backend.connect_to_server("example.org:9000")
+        backend = ner_backend.get_ner_backend()
+        self.assertIsInstance(backend, ner_backend.StanfordNERServerBackend)
+        self.assertEqual((backend.host, backend.port), ("example.org", 9000))
+        # Nothing was started in this process, so there is nothing to stop
+        backend.close()
+
+
+class StartCountingBackend(ner_backend.StanfordNERServerBackend):
+    """
+    Pretends to start a server, without Java, counting how often it was started.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.starts = 0
+
+    def start(self):
+        if self.port is None:
+            self.starts += 1
+            self.port = 9000
+
+
+def ask_for_server(shared_server, addresses):
+    """
+    Asks for the shared server from a worker process.
+    """
+    addresses.put(shared_server.address())
+
+
+class SharedServerTest(unittest.TestCase):
+    """
+    Sharing one server with the workers, only starting it once one of them needs it.
+    """
+
+    def tearDown(self):
+        ner_backend.close_ner_backend()
+
+    def test_server_nobody_asks_for_is_never_started(self):
+        backend = StartCountingBackend()
+        ner_backend.set_ner_backend(backend)
+        self.assertIsInstance(ner_backend.share_server(), ner_backend.SharedServer)
+        ner_backend.close_ner_backend()
+        self.assertEqual(backend.starts, 0)
+
+    def test_server_is_started_once_for_every_worker(self):
+        backend = StartCountingBackend()
+        ner_backend.set_ner_backend(backend)
+        shared_server = ner_backend.share_server()
+        addresses = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=ask_for_server, args=(shared_server, addresses)) for _ in range(3)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.assertEqual([addresses.get(timeout=10) for _ in workers], ["localhost:9000"] * 3)
+        self.assertEqual(backend.starts, 1)
+
+    def test_worker_connects_on_first_use(self):
+        ner_backend.set_ner_backend(StartCountingBackend())
+        shared_server = ner_backend.share_server()
+        worker_backend = ner_backend.StanfordNERServerBackend(shared_server=shared_server)
+        worker_backend.start()
+        self.assertEqual((worker_backend.host, worker_backend.port), ("localhost", 9000))
+
+    def test_running_server_is_shared_by_its_address(self):
+        ner_backend.connect_to_server("example.org:9000")
+        self.assertEqual(ner_backend.share_server(), "example.org:9000")
+
+
+@unittest.skipUnless(has_nltk_data("tokenizers/punkt_tab/english/"), "the NLTK Punkt tokenizer isn't installed")
+class FindNamesTest(unittest.TestCase):
+    """
+    Finding speakers through the NER backend, with the stub in place of the Stanford server.
+    """
+
+    def setUp(self):
+        self.backend = CountingStubBackend(["Raj", "Reddy", "Manuela", "Veloso"])
+        ner_backend.set_ner_backend(self.backend)
+        # Stands in for the NLTK names corpus
+        self.names = information_extraction._names
+        information_extraction._names = frozenset()
+
+    def tearDown(self):
+        information_extraction._names = self.names
+        ner_backend.set_ner_backend(None)
+
+    def test_finds_a_name_on_its_own_line(self):
+        tags = information_extraction.find_names("Next week's talk is by\nRaj Reddy\nin Wean Hall.\n", set())
+        self.assertEqual(tags, {("Raj Reddy", information_extraction.SPEAKER_TAG)})
+
+    def test_tags_several_texts_in_one_request(self):
+        texts = ["Raj Reddy\nwill talk about robots.\n", "Abstract\nManuela Veloso\nRobotics Institute\n",
+                 "No names here.\n"]
+        tags = information_extraction.find_names_in_texts(texts, set())
+        self.assertEqual(len(self.backend.requests), 1)
+        self.assertEqual(len(self.backend.requests[0]), len(texts))
+        self.assertEqual(tags, {("Raj Reddy", information_extraction.SPEAKER_TAG),
+                                ("Manuela Veloso", information_extraction.SPEAKER_TAG)})
+
+
+if __name__ == '__main__':
+    unittest.main()
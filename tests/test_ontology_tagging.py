@@ -0,0 +1,44 @@
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import ontology_tagging
+import word_vectors
+
+
+class ClassifyNestedTreeTest(unittest.TestCase):
+    """
+    Classifying against a tree of nested dictionaries, the documented input of classify_email.
+    """
+
+    def setUp(self):
+        vocab = ["science", "chemistry", "physics", "art"]
+        word_vectors.set_word_vectors(word_vectors.WordVectors(np.eye(len(vocab), dtype=np.float32), vocab))
+        # Stands in for the POS taggers, which need the NLTK data
+        self.retrieve_tags_batch = ontology_tagging.retrieve_tags_batch
+        ontology_tagging.retrieve_tags_batch = lambda texts, common_words=None: [[] for _ in texts]
+
+    def tearDown(self):
+        ontology_tagging.retrieve_tags_batch = self.retrieve_tags_batch
+        word_vectors.set_word_vectors(None)
+
+    def test_calls_reuse_one_similarity_cache(self):
+        tree = {"science": {"chemistry": {}, "physics": {}}, "art": {}}
+        first = ontology_tagging.classify_email("A seminar on chemistry and science.", tree)
+        cache = ontology_tagging.get_similarity_cache(ontology_tagging.as_ontology_tree(tree))
+        second = ontology_tagging.classify_email("Another seminar on chemistry and science.", tree)
+        self.assertIs(ontology_tagging.get_similarity_cache(ontology_tagging.as_ontology_tree(tree)), cache)
+        self.assertEqual(first, ["science"])
+        self.assertEqual(second, first)
+
+    def test_another_tree_is_flattened_again(self):
+        tree = {"science": {"chemistry": {}, "physics": {}}, "art": {}}
+        flattened = ontology_tagging.as_ontology_tree(tree)
+        self.assertIs(ontology_tagging.as_ontology_tree(tree), flattened)
+        self.assertIsNot(ontology_tagging.as_ontology_tree(dict(tree)), flattened)
+
+
+if __name__ == '__main__':
+    unittest.main()
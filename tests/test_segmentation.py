@@ -0,0 +1,179 @@
+import os
+import random
+import re
+import string
+import sys
+import unittest
+import nltk
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import segmentation
+
+
+TAGS = ["<date>", "</date>", "<stime>", "</stime>", "<etime>", "</etime>", "<location>", "</location>", "<speaker>",
+        "</speaker>", "<sentence>", "</sentence>"]
+# Sentence ends only ever follow a word, so there are no one character sentences, which the old detokenize got wrong
+WORDS = ["The", "talk", "is", "in", "Wean", "Hall", "5409", "at", "3pm", "(ok)", "Dr.", "Reddy", "speaks.", "why?",
+         "now!", "done.", "3:30", "\n", "\n\n", "\n\n\n"]
+SENTENCE_END = re.compile(r'\S.*?(?:[.!?](?=\s)|$)', flags=re.S)
+
+
+def has_nltk_data(resource):
+    """
+    :param resource: The NLTK resource, e.g. "tokenizers/punkt_tab/english/".
+    :return: Whether it is installed.
+    """
+    try:
+        nltk.data.find(resource)
+    except LookupError:
+        return False
+    return True
+
+
+class SentenceEndTokenizer:
+    """
+    Stands in for Punkt, which needs the NLTK data: a sentence ends at a full stop, exclamation or question mark
+    followed by whitespace.
+    """
+
+    def span_tokenize(self, text):
+        for match in SENTENCE_END.finditer(text):
+            yield match.start(), match.start() + len(match.group().rstrip())
+
+    def tokenize(self, text):
+        return [text[start:end] for start, end in self.span_tokenize(text)]
+
+
+def old_tag_sents_and_paras(text, sentence_length_lower_bound, sentence_length_upper_bound, sent_tokenize):
+    """
+    information_extraction.tag_sents_and_paras as it was before the segmentation module.
+    """
+    paras = text.split("\n\n")[:-1]
+
+    sents_tagged = []
+    count_sents_tagged = 0
+    for para in paras:
+        tokenised = sent_tokenize(para)
+        para_start_index = count_sents_tagged
+
+        all_sents = True
+        for token in tokenised:
+            last_char = token[-1:]
+            sent_length = len(token)
+            if last_char == "." or last_char == "!" or last_char == "?" and sentence_length_lower_bound < sent_length < sentence_length_upper_bound:
+                sents_tagged.append("<sentence>")
+                sents_tagged.append(token[:-1])
+                sents_tagged.append("</sentence>")
+                sents_tagged.append(last_char)
+                count_sents_tagged += 4
+            else:
+                all_sents = False
+                sents_tagged.append(token)
+                sents_tagged.append("\n")
+                count_sents_tagged += 2
+
+        if all_sents:
+            sents_tagged.insert(para_start_index, "<paragraph>")
+            sents_tagged.append("</paragraph>")
+            sents_tagged.append("\n\n")
+            count_sents_tagged += 3
+
+    return sents_tagged
+
+
+def old_detokenize(tokens):
+    """
+    information_extraction.detokenize as it was before the segmentation module.
+    """
+    line = ""
+    count_tokens = 0
+    for token in tokens:
+        if len(token) > 0:
+            if count_tokens > 0:
+                previous_token = tokens[count_tokens - 1]
+                if token == "<sentence>":
+                    if previous_token in string.punctuation:
+                        line += " " + token
+                elif token in TAGS:
+                    line += token
+                elif token[0] in string.punctuation:
+                    line += token
+                else:
+                    if previous_token in TAGS and "/" not in previous_token:
+                        line += token
+                    else:
+                        line += " " + token
+            else:
+                line += token
+            count_tokens += 1
+    return line
+
+
+def random_body(generator):
+    """
+    :return: A random email body, made of words, sentence ends and blank lines.
+    """
+    return " ".join(generator.choice(WORDS) for _ in range(generator.randint(0, 60)))
+
+
+class SegmentTest(unittest.TestCase):
+    """
+    The streaming segmenter, against the list based code it replaced, with a stand-in sentence tokenizer.
+    """
+
+    def setUp(self):
+        self.sentence_tokenizer = segmentation._sentence_tokenizer
+        segmentation._sentence_tokenizer = SentenceEndTokenizer()
+
+    def tearDown(self):
+        segmentation._sentence_tokenizer = self.sentence_tokenizer
+
+    def test_renders_like_the_old_code(self):
+        generator = random.Random(0)
+        tokenizer = SentenceEndTokenizer()
+        for _ in range(500):
+            body = random_body(generator)
+            old = old_detokenize(old_tag_sents_and_paras(body, 10, 60, tokenizer.tokenize))
+            self.assertEqual(segmentation.render(body, 10, 60), old, body)
+
+    def test_offsets_point_into_the_body(self):
+        body = "The talk is in Wean Hall. Dr. Reddy speaks\n\nat 3pm!\n\nleft out"
+        paragraphs = list(segmentation.segment(body, 10, 60))
+        self.assertEqual([body[paragraph.start:paragraph.end] for paragraph in paragraphs],
+                         ["The talk is in Wean Hall. Dr. Reddy speaks", "at 3pm!"])
+        self.assertEqual([[body[sentence.start:sentence.end] for sentence in paragraph.sentences]
+                          for paragraph in paragraphs],
+                         [["The talk is in Wean Hall.", "Dr.", "Reddy speaks"], ["at 3pm!"]])
+        self.assertEqual([paragraph.complete for paragraph in paragraphs], [False, True])
+
+    def test_length_bounds_only_apply_to_questions(self):
+        self.assertTrue(segmentation.is_accepted("Hi.", 10, 60))
+        self.assertTrue(segmentation.is_accepted("Hi!", 10, 60))
+        self.assertFalse(segmentation.is_accepted("Why?", 10, 60))
+        self.assertTrue(segmentation.is_accepted("Why is the talk in Wean Hall?", 10, 60))
+        self.assertFalse(segmentation.is_accepted("Hi", 0, 60))
+
+    def test_one_character_sentence_does_not_shift_what_follows(self):
+        # The old detokenize looked back at the wrong token after the empty text of a "." sentence
+        after = segmentation.render("Now done.\n\n", 10, 60)
+        self.assertEqual(after, "<paragraph>Now done</sentence>.</paragraph> \n\n")
+        self.assertEqual(segmentation.render(".\n\nNow done.\n\n", 10, 60),
+                         "<paragraph></sentence>.</paragraph> \n\n" + after)
+
+
+@unittest.skipUnless(has_nltk_data("tokenizers/punkt_tab/english/"), "needs the NLTK punkt_tab data")
+class PunktSegmentTest(unittest.TestCase):
+    """
+    The streaming segmenter against the old code, both with Punkt.
+    """
+
+    def test_renders_like_the_old_code(self):
+        generator = random.Random(1)
+        for _ in range(200):
+            body = random_body(generator)
+            old = old_detokenize(old_tag_sents_and_paras(body, 10, 60, nltk.sent_tokenize))
+            self.assertEqual(segmentation.render(body, 10, 60), old, body)
+
+
+if __name__ == '__main__':
+    unittest.main()
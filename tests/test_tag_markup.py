@@ -0,0 +1,148 @@
+import os
+import random
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import evaluate_information_extraction
+import tag_markup
+
+
+TEST_TAGGED_PATH = os.path.join(os.path.dirname(__file__), '..', 'test', 'tagged')
+WORDS = ["Raj", "Reddy", "Wean", "Hall", "3pm", ".", " ", "  ", "\n", "\n\n", "<", ">", "a<b", "</"]
+
+
+def random_tagged(generator, tag_names=tag_markup.TAG_NAMES):
+    """
+    :return: A random tagged text, with properly nested tags and text that looks a little like markup.
+    """
+    pieces = []
+    open_tags = []
+    for _ in range(generator.randint(0, 40)):
+        choice = generator.random()
+        if choice < 0.2:
+            tag_name = generator.choice(tag_names)
+            pieces.append(f'<{tag_name}>')
+            open_tags.append(tag_name)
+        elif choice < 0.35 and open_tags:
+            pieces.append(f'</{open_tags.pop()}>')
+        else:
+            pieces.append(generator.choice(WORDS))
+    pieces.extend(f'</{tag_name}>' for tag_name in reversed(open_tags))
+    return "".join(pieces)
+
+
+def remove_tags_one_at_a_time(text, tag_names=tag_markup.TAG_NAMES):
+    """
+    Strips the tags the way remove_tags used to, one tag at a time.
+    """
+    for tag_name in tag_names:
+        text = text.replace(f'<{tag_name}>', "").replace(f'</{tag_name}>', "")
+    return text
+
+
+def tokenize_spans_by_stripping_each_span(tagged):
+    """
+    tokenize_spans as it was before the offset map, stripping the text before every span again.
+    """
+    def count_visible(text):
+        return len("".join(remove_tags_one_at_a_time(text).split()))
+
+    spans = {}
+    for tag in evaluate_information_extraction.TAGS:
+        tag_spans = []
+        position = 0
+        counted = 0
+        for match in evaluate_information_extraction.TAG_REGEXES[tag].finditer(tagged):
+            position += count_visible(tagged[counted:match.start(2)])
+            counted = match.start(2)
+            text = remove_tags_one_at_a_time(match.group(2))
+            tag_spans.append((position, position + count_visible(text), text.split()))
+        spans[tag] = tag_spans
+    return spans
+
+
+class StripTest(unittest.TestCase):
+    """
+    Stripping and tokenizing the markup in one pass, against stripping one tag at a time.
+    """
+
+    def test_strips_like_removing_one_tag_at_a_time(self):
+        generator = random.Random(0)
+        for _ in range(500):
+            tagged = random_tagged(generator)
+            self.assertEqual(tag_markup.strip(tagged), remove_tags_one_at_a_time(tagged), tagged)
+
+    def test_strips_the_date_tag(self):
+        self.assertEqual(evaluate_information_extraction.remove_tags("on <date>Monday</date>"), "on Monday")
+
+    def test_leaves_other_angle_brackets_alone(self):
+        self.assertEqual(tag_markup.strip("a <b> <Speaker> </ speaker> <speaker>c</speaker>"),
+                         "a <b> <Speaker> </ speaker> c")
+
+    def test_tokenize_splits_into_text_and_tags(self):
+        self.assertEqual(tag_markup.tokenize("at <stime>1pm</stime>"),
+                         [("at ", False), ("<stime>", True), ("1pm", False), ("</stime>", True)])
+        generator = random.Random(1)
+        for _ in range(500):
+            tagged = random_tagged(generator)
+            pieces = tag_markup.tokenize(tagged)
+            self.assertEqual("".join(piece for piece, _ in pieces), tagged)
+            self.assertEqual("".join(piece for piece, is_tag in pieces if not is_tag), tag_markup.strip(tagged))
+            self.assertTrue(all(piece for piece, _ in pieces))
+            self.assertTrue(all(bool(tag_markup.MARKUP.fullmatch(piece)) == is_tag for piece, is_tag in pieces))
+
+
+class OffsetMapTest(unittest.TestCase):
+    """
+    Mapping offsets between a tagged text and its plain text, both ways.
+    """
+
+    def test_strips_like_strip(self):
+        generator = random.Random(2)
+        for _ in range(500):
+            tagged = random_tagged(generator)
+            plain, _ = tag_markup.strip_with_offsets(tagged)
+            self.assertEqual(plain, tag_markup.strip(tagged))
+
+    def test_every_character_maps_to_itself(self):
+        generator = random.Random(3)
+        for _ in range(500):
+            tagged = random_tagged(generator)
+            plain, offsets = tag_markup.strip_with_offsets(tagged)
+            tagged_offset = 0
+            for piece, is_tag in tag_markup.tokenize(tagged):
+                if not is_tag:
+                    for index in range(len(piece)):
+                        plain_offset = offsets.to_plain(tagged_offset + index)
+                        self.assertEqual(plain[plain_offset], tagged[tagged_offset + index])
+                        self.assertEqual(offsets.to_tagged(plain_offset), tagged_offset + index)
+                tagged_offset += len(piece)
+            self.assertEqual(offsets.to_plain(len(tagged)), len(plain))
+
+    def test_offsets_in_tags_map_to_where_the_tag_was(self):
+        tagged = "at <stime>1pm</stime>."
+        plain, offsets = tag_markup.strip_with_offsets(tagged)
+        self.assertEqual(plain, "at 1pm.")
+        self.assertEqual([offsets.to_plain(offset) for offset in range(3, 11)], [3] * 8)
+        self.assertEqual([offsets.to_plain(offset) for offset in range(13, 22)], [6] * 9)
+        # Between two characters with tags in between, the offset is after the tags
+        self.assertEqual(offsets.to_tagged(3), 10)
+        self.assertEqual(offsets.to_tagged(6), 21)
+
+    def test_tokenize_spans_matches_stripping_each_span(self):
+        generator = random.Random(4)
+        texts = [random_tagged(generator) for _ in range(300)]
+        for file_name in os.listdir(TEST_TAGGED_PATH):
+            with open(os.path.join(TEST_TAGGED_PATH, file_name), "r") as tagged_file:
+                texts.append(tagged_file.read())
+        # word_tokenize needs the NLTK data, and the offsets don't depend on how the spans are tokenized
+        with mock.patch("evaluate_information_extraction.word_tokenize", str.split):
+            for tagged in texts:
+                self.assertEqual(evaluate_information_extraction.tokenize_spans(tagged),
+                                 tokenize_spans_by_stripping_each_span(tagged), tagged)
+
+
+if __name__ == '__main__':
+    unittest.main()
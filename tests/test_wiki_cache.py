@@ -0,0 +1,127 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import information_extraction
+import wiki_cache
+
+
+class WikiCacheTest(unittest.TestCase):
+    """
+    The two tiers of the cache, and how long their entries last.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "cache", "wikipedia.sqlite3")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_trivially_different_queries_share_an_entry(self):
+        cache = wiki_cache.WikiCache(path=None)
+        cache.put("Professor  Smith", "response")
+        self.assertEqual(cache.get("professor smith"), "response")
+        self.assertEqual(cache.get(" PROFESSOR\tSMITH "), "response")
+        self.assertIsNone(cache.get("professor jones"))
+
+    def test_responses_are_shared_between_runs(self):
+        cache = wiki_cache.WikiCache(self.path)
+        cache.put("Raj Reddy", "response")
+        cache.close()
+        reopened = wiki_cache.WikiCache(self.path)
+        self.assertEqual(reopened.get("raj reddy"), "response")
+        reopened.close()
+
+    def test_responses_expire_in_both_tiers(self):
+        cache = wiki_cache.WikiCache(self.path, ttl=60)
+        with mock.patch("wiki_cache.time.time", return_value=1000):
+            cache.put("Raj Reddy", "response")
+        with mock.patch("wiki_cache.time.time", return_value=1060):
+            self.assertEqual(cache.get("Raj Reddy"), "response")
+        with mock.patch("wiki_cache.time.time", return_value=1061):
+            self.assertIsNone(cache.get("Raj Reddy"))
+        cache.close()
+
+        reopened = wiki_cache.WikiCache(self.path, ttl=60)
+        with mock.patch("wiki_cache.time.time", return_value=1061):
+            self.assertIsNone(reopened.get("Raj Reddy"))
+        reopened.close()
+
+    def test_least_recently_used_response_leaves_memory_first(self):
+        cache = wiki_cache.WikiCache(path=None, memory_size=2)
+        cache.put("first", "1")
+        cache.put("second", "2")
+        cache.get("first")
+        cache.put("third", "3")
+        self.assertEqual(cache.get("first"), "1")
+        self.assertIsNone(cache.get("second"))
+        self.assertEqual(cache.get("third"), "3")
+
+    def test_oldest_responses_are_evicted_from_disk(self):
+        cache = wiki_cache.WikiCache(self.path, max_entries=3, memory_size=0)
+        for index in range(5):
+            with mock.patch("wiki_cache.time.time", return_value=1000 + index):
+                cache.put("query %d" % index, str(index))
+        with mock.patch("wiki_cache.time.time", return_value=1005):
+            self.assertEqual([cache.get("query %d" % index) for index in range(5)], [None, None, "2", "3", "4"])
+        cache.close()
+
+
+class OfflineModeTest(unittest.TestCase):
+    """
+    wikify in offline mode, which must answer from the cache or the fixture file without touching the network.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.fixture_path = os.path.join(self.directory.name, "fixture.json")
+        with open(self.fixture_path, "w") as fixture_file:
+            json.dump({"Raj  Reddy": "fixture response"}, fixture_file)
+        self.cache = wiki_cache.get_wiki_cache()
+        self.offline = wiki_cache.is_offline()
+        wiki_cache.set_wiki_cache(wiki_cache.WikiCache(path=None))
+        wiki_cache.set_offline(True, self.fixture_path)
+
+    def tearDown(self):
+        wiki_cache.set_wiki_cache(self.cache)
+        wiki_cache.set_offline(self.offline, os.environ.get(wiki_cache.FIXTURE_ENV_VAR) or None)
+        self.directory.cleanup()
+
+    def test_answers_from_the_cache_then_the_fixture(self):
+        wiki_cache.get_wiki_cache().put("Manuela Veloso", "cached response")
+        with mock.patch("information_extraction.get_wiki_session", side_effect=AssertionError("sent a request")):
+            self.assertEqual(information_extraction.wikify("manuela veloso"), "cached response")
+            self.assertEqual(information_extraction.wikify("raj reddy"), "fixture response")
+            self.assertIsNone(information_extraction.wikify("Herbert Simon"))
+
+    def test_answers_nothing_without_a_fixture(self):
+        wiki_cache.set_offline(True)
+        with mock.patch("information_extraction.get_wiki_session", side_effect=AssertionError("sent a request")):
+            self.assertIsNone(information_extraction.wikify("Raj Reddy"))
+
+    def test_online_responses_are_cached(self):
+        wiki_cache.set_offline(False)
+        session = mock.Mock()
+        session.get.return_value = mock.Mock(ok=True, text="live response")
+        with mock.patch("information_extraction.get_wiki_session", return_value=session):
+            self.assertEqual(information_extraction.wikify("Raj Reddy"), "live response")
+            self.assertEqual(information_extraction.wikify("raj reddy"), "live response")
+        self.assertEqual(session.get.call_count, 1)
+
+    def test_error_responses_are_not_cached(self):
+        wiki_cache.set_offline(False)
+        session = mock.Mock()
+        session.get.return_value = mock.Mock(ok=False, text="error page")
+        with mock.patch("information_extraction.get_wiki_session", return_value=session):
+            self.assertEqual(information_extraction.wikify("Raj Reddy"), "error page")
+            self.assertEqual(information_extraction.wikify("Raj Reddy"), "error page")
+        self.assertEqual(session.get.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
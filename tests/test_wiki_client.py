@@ -0,0 +1,144 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import os
+import sys
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+import wiki_client
+
+
+class StandInWikipedia(BaseHTTPRequestHandler):
+    """
+    Answers searches like the Wikipedia API. The query decides how: "slow" takes longer than the client waits,
+    "flaky" fails with a 429 and then a 503 before it succeeds, and "missing" is a 404.
+    """
+    lock = threading.Lock()
+    requests = []
+    delay = 0.1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)["srsearch"][0]
+        cls = type(self)
+        with cls.lock:
+            cls.requests.append(query)
+            attempts = cls.requests.count(query)
+        time.sleep(1 if query == "slow" else cls.delay)
+        if query == "missing":
+            self.respond(404, "")
+        elif query == "flaky" and attempts < 3:
+            self.respond(429 if attempts == 1 else 503, "")
+        else:
+            self.respond(200, '{"query": {"search": [{"snippet": "%s was born"}]}}' % query)
+
+    def respond(self, status, body):
+        try:
+            self.send_response(status)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+        except OSError:
+            # The client stopped waiting
+            pass
+
+
+class CountingClient(wiki_client.AsyncWikiClient):
+    """
+    Records the most requests its threads were sending at once.
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.most_in_flight = 0
+
+    def _get(self, query):
+        with self.lock:
+            self.in_flight += 1
+            self.most_in_flight = max(self.most_in_flight, self.in_flight)
+        try:
+            return super()._get(query)
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class AsyncWikiClientTest(unittest.TestCase):
+    """
+    The concurrent client, against a stand-in for the Wikipedia API on localhost.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInWikipedia)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.api_url = os.environ.get(wiki_client.API_URL_ENV_VAR)
+        os.environ[wiki_client.API_URL_ENV_VAR] = f'http://127.0.0.1:{cls.server.server_port}/w/api.php'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        if cls.api_url is None:
+            del os.environ[wiki_client.API_URL_ENV_VAR]
+        else:
+            os.environ[wiki_client.API_URL_ENV_VAR] = cls.api_url
+
+    def setUp(self):
+        StandInWikipedia.requests = []
+
+    def fetch_all(self, queries, client=None, **options):
+        client = client or wiki_client.AsyncWikiClient(**options)
+        try:
+            return asyncio.run(client.fetch_all(queries))
+        finally:
+            client.close()
+
+    def test_resolves_queries_concurrently(self):
+        queries = [f'speaker{index}' for index in range(8)]
+        start = time.monotonic()
+        client = CountingClient(max_requests_per_host=4, rate=1000, burst=100)
+        responses = self.fetch_all(queries, client)
+        elapsed = time.monotonic() - start
+        self.assertEqual(responses, {query: '{"query": {"search": [{"snippet": "%s was born"}]}}' % query
+                                     for query in queries})
+        self.assertEqual(client.most_in_flight, 4)
+        # Two rounds of four requests, rather than eight one after another
+        self.assertLess(elapsed, 8 * StandInWikipedia.delay)
+
+    def test_retries_rate_limited_and_failed_responses(self):
+        responses = self.fetch_all(["flaky", "missing"], backoff=0.01)
+        self.assertIn("flaky was born", responses["flaky"])
+        self.assertIsNone(responses["missing"])
+        self.assertEqual(StandInWikipedia.requests.count("flaky"), 3)
+        # A 404 won't be any different next time, so it isn't retried
+        self.assertEqual(StandInWikipedia.requests.count("missing"), 1)
+
+    def test_gives_up_on_requests_which_time_out(self):
+        responses = self.fetch_all(["slow"], timeout=(1, 0.2), retries=1, backoff=0.01)
+        self.assertIsNone(responses["slow"])
+        self.assertEqual(StandInWikipedia.requests.count("slow"), 2)
+
+    def test_requests_which_time_out_hold_their_place_until_they_return(self):
+        client = CountingClient(max_requests_per_host=2, timeout=(1, 0.2), retries=2, backoff=0.01, rate=1000,
+                                burst=100)
+        self.fetch_all(["slow", "slow", "slow"] + [f'query{index}' for index in range(6)], client)
+        self.assertEqual(client.most_in_flight, 2)
+
+    def test_token_bucket_limits_the_rate(self):
+        start = time.monotonic()
+        self.fetch_all([f'query{index}' for index in range(10)], max_requests_per_host=10, rate=20, burst=2)
+        # The burst goes at once, then the other eight at 20 a second
+        self.assertGreaterEqual(time.monotonic() - start, 8 / 20)
+
+
+if __name__ == '__main__':
+    unittest.main()